@@ -0,0 +1,3 @@
+"""
+Benchmarks for the memory subsystem; run with `python -m benchmarks.memory`.
+"""
@@ -0,0 +1,182 @@
+"""
+Memory subsystem benchmark suite.
+
+Measures add_entry, save_memory, _load_memory and get_context_window latency
+and peak RSS for every storage backend and summarizer mode at several
+history sizes, and writes the results as JSON.
+
+Run with:
+    python -m benchmarks.memory
+    python -m benchmarks.memory --sizes 1000 10000 --backends jsonl sqlite
+    python -m benchmarks.memory --output new.json --compare baseline.json
+
+With --compare, mean latencies are checked against a previous results file
+and the command exits with status 1 if any got slower than --threshold.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.memory.workload import (
+    BACKEND_EXTENSIONS,
+    SUMMARIZER_MODES,
+    populate,
+    run_scenario,
+)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _in_subprocess(fn: Any, *args: Any) -> Any:
+    """Runs fn(*args) in a fresh process so peak RSS is measured per scenario."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs every requested scenario and returns the results document."""
+    results: List[Dict[str, Any]] = []
+    workdir = tempfile.mkdtemp(prefix="memory-bench-")
+    try:
+        for backend in args.backends:
+            extension = BACKEND_EXTENSIONS[backend]
+            for size in args.sizes:
+                template = os.path.join(workdir, f"template-{size}{extension}")
+                start = time.perf_counter()
+                _in_subprocess(populate, template, backend, size)
+                print(f"[{backend} {size}] populated in {time.perf_counter() - start:.1f}s")
+                for mode in args.modes:
+                    path = os.path.join(workdir, f"run{extension}")
+                    shutil.copyfile(template, path)
+                    result = _in_subprocess(
+                        run_scenario, path, backend, mode, args.ops, args.max_messages,
+                        args.summarizer_latency,
+                    )
+                    for leftover in os.listdir(workdir):
+                        if leftover.startswith("run"):
+                            os.remove(os.path.join(workdir, leftover))
+                    result.update({"backend": backend, "summarizer": mode, "entries": size})
+                    results.append(result)
+                    _print_result(result)
+                os.remove(template)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ops": args.ops,
+            "max_messages": args.max_messages,
+            "summarizer_latency": args.summarizer_latency,
+        },
+        "results": results,
+    }
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    metrics = result["metrics"]
+    print(
+        f"  {result['backend']:<7} {result['summarizer']:<10} {result['entries']:>7} entries | "
+        f"load {metrics['_load_memory']['mean_ms']:9.2f} ms | "
+        f"add {metrics['add_entry']['mean_ms']:8.2f} ms | "
+        f"window {metrics['get_context_window']['mean_ms']:8.2f} ms | "
+        f"save {metrics['save_memory']['mean_ms']:9.2f} ms | "
+        f"rss {result['peak_rss_mb']:7.1f} MB"
+    )
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Lists mean latencies that regressed against a baseline run.
+
+    Args:
+        current: Results document of this run.
+        baseline: Results document of an earlier run.
+        threshold: Slowdown ratio that counts as a regression (e.g. 1.25).
+
+    Returns:
+        One line per regressed (scenario, operation).
+    """
+    def key(result: Dict[str, Any]) -> Tuple[str, str, int]:
+        return result["backend"], result["summarizer"], result["entries"]
+
+    previous = {key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for operation, stats in result["metrics"].items():
+            old_mean = old["metrics"].get(operation, {}).get("mean_ms")
+            new_mean = stats.get("mean_ms")
+            # Ignore sub-millisecond noise
+            if not old_mean or new_mean is None or new_mean < 1.0:
+                continue
+            if new_mean / old_mean > threshold:
+                regressions.append(
+                    f"{'/'.join(map(str, key(result)))} {operation}: "
+                    f"{old_mean:.2f} ms -> {new_mean:.2f} ms ({new_mean / old_mean:.2f}x)"
+                )
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory", description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="History sizes to test")
+    parser.add_argument(
+        "--backends", nargs="+", choices=sorted(BACKEND_EXTENSIONS), default=sorted(BACKEND_EXTENSIONS)
+    )
+    parser.add_argument("--modes", nargs="+", choices=SUMMARIZER_MODES, default=list(SUMMARIZER_MODES))
+    parser.add_argument("--ops", type=int, default=20, help="add_entry/get_context_window rounds per scenario")
+    parser.add_argument("--max-messages", type=int, default=50, help="Verbatim messages per context window")
+    parser.add_argument(
+        "--summarizer-latency", type=float, default=0.0, help="Seconds each summarizer call sleeps"
+    )
+    parser.add_argument("--output", help="Results file (default: benchmarks/memory/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args)
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold:.2f}x against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
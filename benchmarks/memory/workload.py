@@ -0,0 +1,199 @@
+"""
+Workload generation and single-scenario measurement for the memory benchmarks.
+
+Each scenario runs in its own process (see `__main__`), so the peak RSS it
+reports belongs to that scenario alone.
+"""
+
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from src.memory import MemoryManager, create_backend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# File extension used for each backend
+BACKEND_EXTENSIONS: Dict[str, str] = {"json": ".json", "jsonl": ".jsonl", "sqlite": ".db"}
+
+# "inline" runs the summarizer inside get_context_window, "background" on a worker thread
+SUMMARIZER_MODES = ("inline", "background")
+
+_VOCABULARY = (
+    "deploy service staging production rollback ticket jira sprint latency error "
+    "request response database query index cache token budget summary agent tool "
+    "observation plan execute result failed succeeded retry timeout config user "
+    "customer report revenue stock price analysis forecast email calendar meeting"
+).split()
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    words: List[str] = []
+    length = 0
+    while length < chars:
+        word = rng.choice(_VOCABULARY)
+        if rng.random() < 0.05:
+            word = f"{word.upper()}-{rng.randint(1, 9999)}"
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+def generate_messages(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate a conversation with realistic message sizes.
+
+    User messages are short, assistant replies medium, and roughly a third
+    of the turns carry a tool observation of a few KB (with the occasional
+    multi-KB API dump).
+
+    Args:
+        count: Number of messages.
+        seed: Random seed; the same seed always yields the same conversation.
+
+    Returns:
+        Entries with "role", "content" and "metadata" keys, oldest first.
+    """
+    rng = random.Random(seed)
+    messages: List[Dict[str, Any]] = []
+    while len(messages) < count:
+        messages.append({"role": "user", "content": _text(rng, rng.randint(50, 400)), "metadata": {}})
+        if rng.random() < 0.35:
+            size = rng.randint(20_000, 50_000) if rng.random() < 0.05 else rng.randint(1_000, 8_000)
+            messages.append({"role": "tool", "content": _text(rng, size), "metadata": {}})
+        messages.append({"role": "assistant", "content": _text(rng, rng.randint(200, 1_500)), "metadata": {}})
+    return messages[:count]
+
+
+def populate(path: str, backend: str, entries: int, seed: int = 0) -> None:
+    """
+    Write a memory file holding `entries` generated messages.
+
+    Args:
+        path: Memory file to create.
+        backend: Backend name from BACKEND_EXTENSIONS.
+        entries: Number of messages.
+        seed: Random seed for generate_messages.
+    """
+    store = create_backend(path, backend)
+    store.load()
+    for message in generate_messages(entries, seed):
+        store.append(message)
+    store.save()
+    store.close()
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process in MB (0 where unsupported)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize latency samples.
+
+    Args:
+        samples: Durations in seconds.
+
+    Returns:
+        Sample count and mean/p50/p95/max in milliseconds.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"n": 0}
+
+    def percentile(p: float) -> float:
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000
+
+    return {
+        "n": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _timed(samples: List[float], fn: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    result = fn()
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+def run_scenario(
+    path: str,
+    backend: str,
+    mode: str,
+    ops: int,
+    max_messages: int = 50,
+    summarizer_latency: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Measure one (backend, summarizer mode, history size) combination.
+
+    Args:
+        path: Pre-populated memory file; it is modified by the run.
+        backend: Backend name.
+        mode: One of SUMMARIZER_MODES.
+        ops: Number of add_entry / get_context_window rounds.
+        max_messages: Verbatim history kept in each context window.
+        summarizer_latency: Seconds each summarizer call sleeps to mimic an LLM.
+
+    Returns:
+        Latency stats per operation, peak RSS and the final file size.
+    """
+    def summarizer(old_messages: List[Any], previous_summary: str) -> str:
+        if summarizer_latency:
+            time.sleep(summarizer_latency)
+        # Stand-in for an LLM: the summary stays bounded like a real one
+        return f"{previous_summary} [{len(old_messages)} messages]"[-2_000:]
+
+    samples: Dict[str, List[float]] = {
+        name: [] for name in (
+            "construct", "_load_memory", "first_context_window", "add_entry",
+            "get_context_window", "get_context_window_cached", "save_memory",
+        )
+    }
+    manager = _timed(samples["construct"], lambda: MemoryManager(
+        memory_file=path,
+        backend=backend,
+        background_summary=mode == "background",
+        write_behind=False,
+        recall=False,
+        keyword_recall=False,
+        archive_horizon=0,
+        shared=False,
+    ))
+    for _ in range(3):
+        _timed(samples["_load_memory"], manager._load_memory)
+
+    _timed(samples["first_context_window"], lambda: manager.get_context_window(
+        "SYS", max_messages=max_messages, summarizer=summarizer
+    ))
+    for message in generate_messages(ops, seed=1):
+        _timed(samples["add_entry"], lambda: manager.add_entry(message["role"], message["content"]))
+        _timed(samples["get_context_window"], lambda: manager.get_context_window(
+            "SYS", max_messages=max_messages, summarizer=summarizer
+        ))
+        _timed(samples["get_context_window_cached"], lambda: manager.get_context_window(
+            "SYS", max_messages=max_messages, summarizer=summarizer
+        ))
+    for _ in range(3):
+        _timed(samples["save_memory"], manager.save_memory)
+    manager.close()
+
+    return {
+        "metrics": {name: latency_stats(values) for name, values in samples.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "file_mb": os.path.getsize(path) / (1024 * 1024),
+    }
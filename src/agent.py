@@ -1,12 +1,17 @@
 import json
-import time
 import os
 import sys
 import asyncio
 import inspect
+import itertools
 import importlib.util
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from dataclasses import replace
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
 
 # Ensure project root is on sys.path when running this file directly
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -16,10 +21,58 @@ if str(PROJECT_ROOT) not in sys.path:
 from google import genai
 
 from src.config import settings
-from src.memory import MemoryManager
+from src.memory import MemoryManager, SessionStore
+from src.memory.budget import PromptBudget, TokenBudgetAllocator, model_context_tokens, truncate_to_tokens
+from src.planner import Plan, PlanCache, is_trivial, parse_plan, task_signature
 from src.tools.openai_proxy import call_openai_chat
 
 
+class ToolRegistry(MutableMapping):
+    """
+    Tool name -> callable mapping that counts its changes.
+
+    `version` changes whenever a tool is added, replaced or removed, so
+    anything rendered from the catalog (e.g. the system-prompt prefix) can
+    be cached and rebuilt only when the catalog actually changed. Versions
+    come from one process-wide counter, so two registries never share one.
+    Every mutation, including update(), pop() and |=, goes through
+    __setitem__ or __delitem__.
+    """
+
+    _versions = itertools.count(1)
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        self._tools: Dict[str, Callable[..., Any]] = dict(*args, **kwargs)
+        self._bump()
+
+    def _bump(self) -> None:
+        self.version = next(ToolRegistry._versions)
+
+    def __getitem__(self, name: str) -> Callable[..., Any]:
+        return self._tools[name]
+
+    def __setitem__(self, name: str, fn: Callable[..., Any]) -> None:
+        self._tools[name] = fn
+        self._bump()
+
+    def __delitem__(self, name: str) -> None:
+        del self._tools[name]
+        self._bump()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tools)
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def __ior__(self, other: Any) -> "ToolRegistry":
+        self.update(other)
+        return self
+
+    def __repr__(self) -> str:
+        return f"ToolRegistry({self._tools!r})"
+
+
 class GeminiAgent:
     """
     A production-grade agent wrapper for Gemini 3.
@@ -36,11 +89,24 @@ class GeminiAgent:
     def __init__(self):
         self.settings = settings
         self.memory = MemoryManager()
+        # Per-conversation memories for act(task, session_id=...), loaded lazily
+        self.sessions = SessionStore()
         self.mcp_manager = None  # Will be initialized if MCP is enabled
         self.use_openai_backend = False  # Use OpenAI-compatible backend when configured
+        # Knowledge folder injected into prompts, and (fingerprint, text) of its last load
+        self.context_dir = PROJECT_ROOT / ".context"
+        self._context_cache: Optional[Tuple[Tuple[Any, ...], str]] = None
+        # (registry version, rendered descriptions) and (version, tools budget, prompt prefix)
+        self._tool_descriptions_cache: Optional[Tuple[int, str]] = None
+        self._tool_prompt_cache: Optional[Tuple[int, int, str]] = None
+        # Plans by (task signature, tool registry version); planning calls run on a small pool
+        self.plan_cache = PlanCache(self.settings.PLAN_CACHE_SIZE)
+        self._planner: Optional[ThreadPoolExecutor] = None
+        # Prompt budget of the turn running on each memory, see _turn_budget()
+        self._turn_budgets: Dict[MemoryManager, PromptBudget] = {}
 
         # Dynamically load all tools from src/tools/ directory
-        self.available_tools: Dict[str, Callable[..., Any]] = self._load_tools()
+        self.available_tools: ToolRegistry = ToolRegistry(self._load_tools())
 
         # Initialize MCP integration if enabled
         if self.settings.MCP_ENABLED:
@@ -110,6 +176,16 @@ class GeminiAgent:
 
                 self.client = _DummyClientFallback()
 
+        # Split the model's context window across the sections of each prompt
+        model_name = (
+            self.settings.OPENAI_MODEL
+            if self.use_openai_backend
+            else self.settings.GEMINI_MODEL_NAME
+        )
+        self.budget_allocator = TokenBudgetAllocator(
+            self.settings.CONTEXT_TOKEN_BUDGET or model_context_tokens(model_name)
+        )
+
     def _initialize_mcp(self) -> None:
         """
         Initialize MCP (Model Context Protocol) integration.
@@ -207,20 +283,22 @@ class GeminiAgent:
         custom rules by simply dropping .md files into .context/. The content is
         automatically injected into the agent's system prompt.
 
+        The assembled block is cached and only rebuilt when the fingerprint of
+        the folder (names, sizes and mtimes of its .md files) changes, so an
+        unchanged knowledge folder costs one directory listing per call.
+
         Returns:
             Concatenated content of all .md files in .context/ directory.
         """
-        context_parts = []
+        context_dir = self.context_dir
+        fingerprint = self._context_fingerprint(context_dir)
+        if self._context_cache is not None and self._context_cache[0] == fingerprint:
+            return self._context_cache[1]
 
-        # Get the .context directory path relative to project root
-        # Navigate up from src/ to project root
-        context_dir = Path(__file__).parent.parent / ".context"
-
-        if not context_dir.exists():
-            return ""
-
-        # Load all markdown files
-        for context_file in sorted(context_dir.glob("*.md")):
+        context_parts = []
+        # Load the markdown files the fingerprint covers, so every loaded file is watched
+        for name, _size, _mtime_ns in fingerprint:
+            context_file = context_dir / name
             try:
                 content = context_file.read_text(encoding="utf-8")
                 context_parts.append(f"\n--- {context_file.name} ---\n{content}")
@@ -230,19 +308,86 @@ class GeminiAgent:
         if context_parts:
             print(f"   📚 Loaded context from {len(context_parts)} file(s)")
 
-        return "\n".join(context_parts)
+        context = "\n".join(context_parts)
+        self._context_cache = (fingerprint, context)
+        return context
+
+    @staticmethod
+    def _context_fingerprint(context_dir: Path) -> Tuple[Any, ...]:
+        """
+        Cheap change detector for the knowledge folder: stats only, no reads.
+
+        Returns:
+            Sorted (name, size, mtime_ns) of every .md file, or () if the folder is missing.
+            _load_context() reads exactly these files.
+        """
+        files = []
+        try:
+            with os.scandir(context_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".md") and entry.is_file():
+                        stat = entry.stat()
+                        files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        except (FileNotFoundError, NotADirectoryError):
+            return ()
+        return tuple(sorted(files))
 
     def _get_tool_descriptions(self) -> str:
         """
         Dynamically builds a list of available tools and their docstrings for prompt injection.
+
+        The list is rendered once per version of the tool registry and reused
+        until a tool is added or removed.
         """
+        tools = self._tool_registry()
+        cached = self._tool_descriptions_cache
+        if cached is not None and cached[0] == tools.version:
+            return cached[1]
+
         descriptions: List[str] = []
-        for name, fn in self.available_tools.items():
+        for name, fn in tools.items():
             doc = (fn.__doc__ or "No description provided.").strip().replace("\n", " ")
             descriptions.append(f"- {name}: {doc}")
-        return "\n".join(descriptions)
+        rendered = "\n".join(descriptions)
+        self._tool_descriptions_cache = (tools.version, rendered)
+        return rendered
+
+    def _tool_registry(self) -> ToolRegistry:
+        """Returns available_tools, wrapping a plain dict assigned to it so its changes are counted."""
+        if not isinstance(self.available_tools, ToolRegistry):
+            self.available_tools = ToolRegistry(self.available_tools)
+        return self.available_tools
 
-    def _format_context_messages(self, context_messages: List[Dict[str, Any]]) -> str:
+    def _tool_system_prompt(self, tool_list: str, tools_budget: int) -> str:
+        """
+        Returns the system-prompt prefix that lists the tools.
+
+        The prefix is cached per registry version and tool budget, so it is
+        byte-identical across turns (which lets server-side prompt caching
+        reuse it) and only re-rendered when the catalog changes.
+
+        Args:
+            tool_list: Output of _get_tool_descriptions().
+            tools_budget: Token budget of the tools section.
+        """
+        version = self._tool_registry().version
+        cached = self._tool_prompt_cache
+        if cached is not None and cached[:2] == (version, tools_budget):
+            return cached[2]
+
+        tool_list = truncate_to_tokens(tool_list, tools_budget)
+        prompt = (
+            "You are an expert AI agent following the Think-Act-Reflect loop.\n"
+            "You have access to the following tools:\n"
+            f"{tool_list}\n\n"
+            "If you need a tool, respond ONLY with a JSON object using the schema:\n"
+            '{"action": "<tool_name>", "args": {"param": "value"}}\n'
+            "If no tool is needed, reply directly with the final answer."
+        )
+        self._tool_prompt_cache = (version, tools_budget, prompt)
+        return prompt
+
+    def _format_context_messages(self, context_messages: Sequence[Mapping[str, Any]]) -> str:
         """
         Flattens structured context into a plain-text prompt block.
         """
@@ -267,6 +412,11 @@ class GeminiAgent:
             model=self.settings.GEMINI_MODEL_NAME,
             contents=prompt,
         )
+        return self._response_text(response_obj)
+
+    @staticmethod
+    def _response_text(response_obj: Any) -> str:
+        """Extracts the reply text from a generate_content response."""
         # Safely handle cases where the API or dummy client returns None or a structure without a text attribute
         text = getattr(response_obj, "text", None)
         if text is None:
@@ -344,63 +494,211 @@ class GeminiAgent:
         # Use the centralized wrapper that safely handles missing/None responses
         return self._call_gemini(prompt)
 
-    def think(self, task: str) -> str:
+    def get_memory(self, session_id: Optional[str] = None) -> MemoryManager:
+        """
+        Return the memory of a conversation.
+
+        Args:
+            session_id: Conversation identifier; None selects the default memory.
+
+        Returns:
+            The MemoryManager holding that conversation's history.
         """
-        Simulates the 'Deep Think' process of Gemini 3.
+        if session_id is None:
+            return self.memory
+        return self.sessions.get(session_id)
+
+    @contextmanager
+    def _memory_lease(self, session_id: Optional[str]) -> Iterator[MemoryManager]:
+        """Holds a conversation's memory, pinned so the session LRU cannot close it until the block exits."""
+        if session_id is None:
+            yield self.memory
+            return
+        with self.sessions.lease(session_id) as memory:
+            yield memory
+
+    def think(self, task: str, session_id: Optional[str] = None) -> Plan:
         """
-        # Load context knowledge from .context/ directory
+        Plans the task before act() runs it (the 'Deep Think' stage).
+
+        The model is asked for a short list of steps and the tools they need.
+        Trivial tasks (fewer than PLAN_MIN_TASK_WORDS words) skip the call,
+        plans are reused for tasks with the same normalized wording, and the
+        turn waits at most PLAN_LATENCY_BUDGET seconds for a fresh plan; a
+        plan that arrives later is still cached for the next time.
+
+        Args:
+            task: The user request.
+            session_id: Conversation whose history informs the plan; None uses the default memory.
+
+        Returns:
+            The plan; it has no steps when planning was skipped.
+        """
+        key, plan = self._plan_lookup(task)
+        if plan is not None:
+            return plan
+
+        with self._memory_lease(session_id) as memory:
+            prompt = self._planning_prompt(task, memory)
+        print(f"\n🤔 <thought> Planning task: '{task}'")
+        latency_budget = self.settings.PLAN_LATENCY_BUDGET
+        future = self._plan_executor().submit(self._call_gemini, prompt)
+        try:
+            reply = future.result(timeout=latency_budget)
+        except FutureTimeoutError:
+            print(f"   - No plan within {latency_budget:g}s; acting directly</thought>\n")
+            future.add_done_callback(lambda done: self._cache_plan(key, done))
+            return Plan(skipped="timeout")
+        except Exception as e:
+            print(f"   ⚠️ Planning failed: {e}</thought>\n")
+            return Plan(skipped="error")
+        return self._finish_plan(key, reply)
+
+    def _plan_lookup(self, task: str) -> Tuple[Optional[Tuple[str, int]], Optional[Plan]]:
+        """
+        Resolves a task without a planning call where possible.
+
+        Returns:
+            (cache key, plan); the plan is None when the model has to be asked.
+        """
+        if self.settings.PLAN_LATENCY_BUDGET <= 0:
+            return None, Plan(skipped="disabled")
+        if is_trivial(task, self.settings.PLAN_MIN_TASK_WORDS):
+            return None, Plan(skipped="trivial")
+
+        key = (task_signature(task), self._tool_registry().version)
+        cached = self.plan_cache.get(key)
+        if cached is not None:
+            print(f"\n🤔 <thought> Reusing plan for: '{task}'</thought>\n")
+            return key, replace(cached, cached=True)
+        return key, None
+
+    def _finish_plan(self, key: Tuple[str, int], reply: str) -> Plan:
+        """Parses and caches the model's planning reply."""
+        plan = parse_plan(reply, self.available_tools)
+        if plan.skipped:
+            print("   ⚠️ The reply held no plan steps; acting directly</thought>\n")
+            return plan
+        self.plan_cache.put(key, plan)
+        for line in plan.render().splitlines():
+            print(f"   {line}")
+        print("</thought>\n")
+        return plan
+
+    def _planning_prompt(self, task: str, memory: MemoryManager) -> str:
+        """Builds the planning request from knowledge, tools and conversation history."""
         context_knowledge = self._load_context()
+        tool_list = self._get_tool_descriptions()
+        budget = self._prompt_budget(memory)
+        context_knowledge = truncate_to_tokens(context_knowledge, budget.knowledge)
 
-        # Inject context into system prompt
         system_prompt = (
             f"{context_knowledge}\n\n"
-            "You are a focused agent following the Artifact-First protocol. Stay concise and tactical."
+            "You are a focused agent following the Artifact-First protocol. Stay concise and tactical.\n"
+            "Available tools:\n"
+            f"{truncate_to_tokens(tool_list, budget.tools)}"
         )
-
-        context_window = self.memory.get_context_window(
+        context_window = memory.get_context_window(
             system_prompt=system_prompt,
-            max_messages=10,
+            max_messages=self.settings.CONTEXT_MAX_MESSAGES,
             summarizer=self.summarize_memory,
+            max_tokens=budget.history,
+            summary_tokens=budget.summary,
+            query=task,
+        )
+        return (
+            f"{self._format_context_messages(context_window)}\n\n"
+            f"Task to plan: {task}\n"
+            "Do not carry out the task yet. Respond ONLY with a JSON object using the schema:\n"
+            '{"steps": ["<short step>", ...], "tools": ["<tool_name>", ...]}\n'
+            "Use at most 5 steps and only tools from the list above."
         )
 
-        print(f"\n🤔 <thought> Analyzing task: '{task}'")
-        print(f"   - Loaded context messages: {len(context_window)}")
-        print("   - Checking mission context...")
-        print("   - Identifying necessary tools...")
-        print("   - Formulating execution plan...")
-        print("</thought>\n")
+    def _plan_executor(self) -> ThreadPoolExecutor:
+        if self._planner is None:
+            self._planner = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent-planner")
+        return self._planner
 
-        time.sleep(1)
-        return "Plan formulated."
+    def _cache_plan(self, key: Tuple[str, int], future: Any) -> None:
+        """Caches a plan that finished after its turn stopped waiting for it."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        plan = parse_plan(future.result(), self.available_tools)
+        if not plan.skipped:
+            self.plan_cache.put(key, plan)
 
-    def act(self, task: str) -> str:
+    def act(self, task: str, session_id: Optional[str] = None) -> str:
         """
         Executes the task using available tools and generates a real response.
+
+        The turn runs inside a memory turn scope, so the context windows built by
+        think(), the first call and the follow-up share at most one summarization
+        step (one chunk of history plus the merges it carries). The prompt
+        budget is fixed for the whole turn, so the first call reuses the
+        context window think() built.
+
+        Args:
+            task: The user request.
+            session_id: Conversation to record the turn in; None uses the default memory.
+        """
+        with self._memory_lease(session_id) as memory, memory.turn(), self._turn_budget(memory):
+            return self._act_turn(task, memory, session_id)
+
+    def _prompt_budget(self, memory: MemoryManager) -> PromptBudget:
         """
+        Returns the token budget of the prompts built from memory.
+
+        It is sized for the largest of them, the planning prompt with its
+        .context knowledge block, and inside act() it is the budget fixed
+        when the turn started. think() and act() therefore request context
+        windows with the same history budget, and the second is served
+        from the window cache. The summary section gets its whole cap, since
+        the summary the windows carry can grow after the budget is taken.
+        """
+        budget = self._turn_budgets.get(memory)
+        if budget is None:
+            budget = self.budget_allocator.allocate(
+                knowledge=self._load_context(),
+                tools=self._get_tool_descriptions(),
+                summary=memory.summary,
+                # Building the window may summarize after the budget was taken
+                growing=("summary",),
+            )
+        return budget
+
+    @contextmanager
+    def _turn_budget(
+        self, memory: MemoryManager, budget: Optional[PromptBudget] = None
+    ) -> Iterator[PromptBudget]:
+        """Fixes the prompt budget of memory (computed now unless given) for the duration of a turn."""
+        if budget is None:
+            budget = self._prompt_budget(memory)
+        self._turn_budgets[memory] = budget
+        try:
+            yield budget
+        finally:
+            del self._turn_budgets[memory]
+
+    def _act_turn(self, task: str, memory: MemoryManager, session_id: Optional[str]) -> str:
+        """Runs one Think-Act turn; see act()."""
         # 1) Record user input
-        self.memory.add_entry("user", task)
+        memory.add_entry("user", task)
 
         # 2) Think
-        self.think(task)
+        plan = self.think(task, session_id=session_id)
 
         # 3) Tool dispatch entry point
         print(f"[TOOLS] Executing tools for: {task}")
-        tool_list = self._get_tool_descriptions()
-
-        system_prompt = (
-            "You are an expert AI agent following the Think-Act-Reflect loop.\n"
-            "You have access to the following tools:\n"
-            f"{tool_list}\n\n"
-            "If you need a tool, respond ONLY with a JSON object using the schema:\n"
-            '{"action": "<tool_name>", "args": {"param": "value"}}\n'
-            "If no tool is needed, reply directly with the final answer."
-        )
+        tool_list, budget, system_prompt = self._act_system_prompt(memory, plan)
 
         try:
-            context_messages = self.memory.get_context_window(
+            context_messages = memory.get_context_window(
                 system_prompt=system_prompt,
-                max_messages=10,
+                max_messages=self.settings.CONTEXT_MAX_MESSAGES,
                 summarizer=self.summarize_memory,
+                max_tokens=budget.history,
+                summary_tokens=budget.summary,
+                query=task,
             )
             formatted_context = self._format_context_messages(context_messages)
             initial_prompt = f"{formatted_context}\n\nCurrent Task: {task}"
@@ -412,38 +710,34 @@ class GeminiAgent:
             final_response = first_reply
 
             if tool_name:
-                tool_fn = self.available_tools.get(tool_name)
-                if not tool_fn:
-                    observation = f"Requested tool '{tool_name}' is not registered."
-                else:
-                    try:
-                        observation = tool_fn(**tool_args)
-                    except TypeError as exc:
-                        observation = f"Error executing tool '{tool_name}': {exc}"
-                    except Exception as exc:
-                        observation = f"Unexpected error in tool '{tool_name}': {exc}"
+                observation = self._run_tool(tool_name, tool_args)
 
                 # Record intermediate reasoning and observation
-                self.memory.add_entry("assistant", first_reply)
-                self.memory.add_entry("tool", f"{tool_name} output: {observation}")
+                memory.add_entry("assistant", first_reply)
+                memory.add_entry("tool", f"{tool_name} output: {observation}")
 
                 # Refresh context to include tool feedback before final answer
-                context_messages = self.memory.get_context_window(
+                budget = self.budget_allocator.allocate(
+                    tools=tool_list,
+                    summary=memory.summary,
+                    observation=str(observation),
+                    growing=("summary",),
+                )
+                context_messages = memory.get_context_window(
                     system_prompt=system_prompt,
-                    max_messages=10,
+                    max_messages=self.settings.CONTEXT_MAX_MESSAGES,
                     summarizer=self.summarize_memory,
+                    max_tokens=budget.history,
+                    summary_tokens=budget.summary,
+                    query=task,
                 )
-                formatted_context = self._format_context_messages(context_messages)
-                follow_up_prompt = (
-                    f"{formatted_context}\n\n"
-                    f"Tool '{tool_name}' observation: {observation}\n"
-                    "Use the observation above to craft the final answer for the user. "
-                    "Do not request additional tool calls."
+                follow_up_prompt = self._follow_up_prompt(
+                    context_messages, tool_name, observation, budget.observation
                 )
                 print(f"💬 Sending follow-up with observation from '{tool_name}'...")
                 final_response = self._call_gemini(follow_up_prompt)
 
-            self.memory.add_entry("assistant", final_response)
+            memory.add_entry("assistant", final_response)
             return final_response
 
         except Exception as e:
@@ -451,19 +745,73 @@ class GeminiAgent:
             print(f"❌ API Error: {e}")
             return response
 
-    def reflect(self):
+    def _act_system_prompt(self, memory: MemoryManager, plan: Plan) -> Tuple[str, PromptBudget, str]:
+        """
+        Builds the system prompt of a turn: the cached tool prefix plus the plan.
+
+        Returns:
+            (tool list, prompt budget, system prompt).
+        """
+        tool_list = self._get_tool_descriptions()
+        budget = self._prompt_budget(memory)
+        system_prompt = self._tool_system_prompt(tool_list, budget.tools)
+        # Appended after the cached tool prefix so the prefix stays byte-stable
+        plan_text = plan.render()
+        if plan_text:
+            system_prompt = f"{system_prompt}\n\nPlan for this task:\n{plan_text}"
+        return tool_list, budget, system_prompt
+
+    def _run_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Any:
+        """Calls a registered tool and returns its observation (or an error message)."""
+        tool_fn = self.available_tools.get(tool_name)
+        if not tool_fn:
+            return f"Requested tool '{tool_name}' is not registered."
+        try:
+            return tool_fn(**tool_args)
+        except Exception as exc:
+            return self._tool_error(tool_name, exc)
+
+    @staticmethod
+    def _tool_error(tool_name: str, exc: Exception) -> str:
+        if isinstance(exc, TypeError):
+            return f"Error executing tool '{tool_name}': {exc}"
+        return f"Unexpected error in tool '{tool_name}': {exc}"
+
+    def _follow_up_prompt(
+        self,
+        context_messages: Sequence[Mapping[str, Any]],
+        tool_name: str,
+        observation: Any,
+        observation_tokens: int,
+    ) -> str:
+        """Builds the prompt that turns a tool observation into the final answer."""
+        formatted_context = self._format_context_messages(context_messages)
+        observation_text = truncate_to_tokens(str(observation), observation_tokens)
+        return (
+            f"{formatted_context}\n\n"
+            f"Tool '{tool_name}' observation: {observation_text}\n"
+            "Use the observation above to craft the final answer for the user. "
+            "Do not request additional tool calls."
+        )
+
+    def reflect(self, session_id: Optional[str] = None):
         """
         Review past actions to improve future performance.
         """
-        history = self.memory.get_history()
-        print(f"Reflecting on {len(history)} past interactions...")
+        memory = self.get_memory(session_id)
+        print(f"Reflecting on {memory.count()} past interactions...")
+        stats = memory.cache_stats()
+        print(
+            f"   🗂️ Context cache: {stats['hits']} hits / {stats['misses']} misses, "
+            f"{stats['summarizer_calls']} summarizer calls"
+        )
 
-    def run(self, task: str):
+    def run(self, task: str, session_id: Optional[str] = None):
         """Main entry point for the agent."""
         print(f"🚀 Starting Task: {task}")
-        result = self.act(task)
+        result = self.act(task, session_id=session_id)
         print(f"📦 Result: {result}")
-        self.reflect()
+        self.reflect(session_id=session_id)
 
     def shutdown(self) -> None:
         """
@@ -476,6 +824,11 @@ class GeminiAgent:
         if self.mcp_manager:
             print("🔌 Shutting down MCP connections...")
             self.mcp_manager.shutdown()
+        if self._planner is not None:
+            self._planner.shutdown(wait=False)
+            self._planner = None
+        self.sessions.close()
+        self.memory.close()
         print("👋 Agent shutdown complete.")
 
     def get_mcp_status(self) -> Dict[str, Any]:
@@ -0,0 +1,275 @@
+"""
+asyncio-native variant of GeminiAgent.
+
+GeminiAgent blocks its thread for every model call and every MCP tool call
+(the sync MCP wrapper drives its own event loop with run_until_complete), so
+serving N conversations at once needs N threads. AsyncGeminiAgent awaits the
+async Gemini client (`client.aio`) and the MCP tool coroutines directly, so
+hundreds of conversations can share one event loop:
+
+    async with AsyncGeminiAgent() as agent:
+        replies = await asyncio.gather(
+            *(agent.act_async(task, session_id=f"user-{i}") for i, task in enumerate(tasks))
+        )
+
+Turns of the same session are serialized; turns of different sessions
+interleave freely. Work that has no async transport (local tools, the
+OpenAI-compatible proxy) and every memory operation that may touch disk or
+call the summarizer (loading a session, add_entry, context windows, the
+end-of-turn archive/flush) runs on worker threads so it never stalls the loop.
+"""
+
+import asyncio
+import inspect
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from src.agent import GeminiAgent
+from src.memory import MemoryManager
+from src.memory.budget import PromptBudget
+from src.planner import Plan
+
+
+class AsyncGeminiAgent(GeminiAgent):
+    """
+    GeminiAgent whose Think-Act loop runs as coroutines.
+
+    MCP servers are connected by `start()` (or `async with`) on the running
+    loop instead of in the constructor, and their tools are registered as
+    the coroutine functions MCPClientManager provides.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # One lock per session id, dropped once no turn holds or awaits it
+        self._turn_locks: "weakref.WeakValueDictionary[Optional[str], asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def _initialize_mcp(self) -> None:
+        """MCP is connected by start() on the event loop the agent will run in."""
+
+    async def start(self) -> "AsyncGeminiAgent":
+        """
+        Connect MCP servers (if MCP_ENABLED) and register their tools.
+
+        Returns:
+            This agent.
+        """
+        if not self.settings.MCP_ENABLED or self.mcp_manager is not None:
+            return self
+        try:
+            from src.mcp_client import MCPClientManager
+            from src.tools.mcp_tools import _set_mcp_manager
+
+            print("🔌 Initializing MCP integration...")
+            self.mcp_manager = MCPClientManager()
+            await self.mcp_manager.initialize()
+            _set_mcp_manager(self.mcp_manager)
+
+            mcp_tools = self.mcp_manager.get_all_tools_as_callables()
+            if mcp_tools:
+                self.available_tools.update(mcp_tools)
+                print(f"   🔧 Loaded {len(mcp_tools)} MCP tools")
+
+        except ImportError as e:
+            print(f"   ⚠️ MCP library not installed: {e}")
+            print("      To enable MCP, run: pip install 'mcp[cli]'")
+        except Exception as e:
+            print(f"   ⚠️ Failed to initialize MCP: {e}")
+        return self
+
+    async def __aenter__(self) -> "AsyncGeminiAgent":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.shutdown_async()
+
+    async def _call_gemini_async(self, prompt: str) -> str:
+        """Awaitable counterpart of _call_gemini()."""
+        aio = getattr(self.client, "aio", None)
+        if self.use_openai_backend or aio is None:
+            # No async transport for this backend: keep the blocking call off the loop
+            return await asyncio.to_thread(self._call_gemini, prompt)
+        response_obj = await aio.models.generate_content(
+            model=self.settings.GEMINI_MODEL_NAME,
+            contents=prompt,
+        )
+        return self._response_text(response_obj)
+
+    async def _run_tool_async(self, tool_name: str, tool_args: Dict[str, Any]) -> Any:
+        """Awaits an MCP tool coroutine directly; sync tools run on a worker thread."""
+        tool_fn = self.available_tools.get(tool_name)
+        if not tool_fn:
+            return f"Requested tool '{tool_name}' is not registered."
+        try:
+            if inspect.iscoroutinefunction(tool_fn):
+                return await tool_fn(**tool_args)
+            observation = await asyncio.to_thread(tool_fn, **tool_args)
+            if inspect.isawaitable(observation):
+                observation = await observation
+            return observation
+        except Exception as exc:
+            return self._tool_error(tool_name, exc)
+
+    async def _context_window_async(
+        self, memory: MemoryManager, system_prompt: str, budget: PromptBudget, task: str
+    ) -> Any:
+        # Building a window may call the summarizer, a blocking model round trip
+        return await asyncio.to_thread(
+            memory.get_context_window,
+            system_prompt=system_prompt,
+            max_messages=self.settings.CONTEXT_MAX_MESSAGES,
+            summarizer=self.summarize_memory,
+            max_tokens=budget.history,
+            summary_tokens=budget.summary,
+            query=task,
+        )
+
+    async def think_async(self, task: str, session_id: Optional[str] = None) -> Plan:
+        """
+        Awaitable counterpart of think(), with the same cache and latency budget.
+
+        Args:
+            task: The user request.
+            session_id: Conversation whose history informs the plan; None uses the default memory.
+
+        Returns:
+            The plan; it has no steps when planning was skipped.
+        """
+        key, plan = self._plan_lookup(task)
+        if plan is not None:
+            return plan
+
+        prompt = await asyncio.to_thread(self._leased_planning_prompt, task, session_id)
+        print(f"\n🤔 <thought> Planning task: '{task}'")
+        latency_budget = self.settings.PLAN_LATENCY_BUDGET
+        request = asyncio.ensure_future(self._call_gemini_async(prompt))
+        done, _pending = await asyncio.wait({request}, timeout=latency_budget)
+        if not done:
+            print(f"   - No plan within {latency_budget:g}s; acting directly</thought>\n")
+            request.add_done_callback(lambda finished: self._cache_plan(key, finished))
+            return Plan(skipped="timeout")
+        if request.exception() is not None:
+            print(f"   ⚠️ Planning failed: {request.exception()}</thought>\n")
+            return Plan(skipped="error")
+        return self._finish_plan(key, request.result())
+
+    def _leased_planning_prompt(self, task: str, session_id: Optional[str]) -> str:
+        with self._memory_lease(session_id) as memory:
+            return self._planning_prompt(task, memory)
+
+    async def act_async(self, task: str, session_id: Optional[str] = None) -> str:
+        """
+        Awaitable counterpart of act().
+
+        Args:
+            task: The user request.
+            session_id: Conversation to record the turn in; None uses the default memory.
+        """
+        lock = self._turn_locks.get(session_id)
+        if lock is None:
+            lock = self._turn_locks[session_id] = asyncio.Lock()
+        async with lock:
+            async with self._memory_lease_async(session_id) as memory, self._turn_async(memory):
+                # Sizing the budget may (re)read the .context folder
+                budget = await asyncio.to_thread(self._prompt_budget, memory)
+                with self._turn_budget(memory, budget):
+                    return await self._act_turn_async(task, memory, session_id)
+
+    @asynccontextmanager
+    async def _memory_lease_async(self, session_id: Optional[str]) -> AsyncIterator[MemoryManager]:
+        """_memory_lease() whose load and release (which may close evicted sessions) run on a worker thread."""
+        if session_id is None:
+            yield self.memory
+            return
+        memory = await asyncio.to_thread(self.sessions.acquire, session_id)
+        try:
+            yield memory
+        finally:
+            await asyncio.to_thread(self.sessions.release, session_id)
+
+    @staticmethod
+    @asynccontextmanager
+    async def _turn_async(memory: MemoryManager) -> AsyncIterator[MemoryManager]:
+        """memory.turn() whose end-of-turn archive, flush and summary save run on a worker thread."""
+        scope = memory.turn()
+        scope.__enter__()
+        try:
+            yield memory
+        finally:
+            await asyncio.to_thread(scope.__exit__, None, None, None)
+
+    @staticmethod
+    async def _add_entry_async(memory: MemoryManager, role: str, content: str) -> None:
+        # A write may rewrite the memory file or wait on a sqlite/file lock
+        await asyncio.to_thread(memory.add_entry, role, content)
+
+    async def _act_turn_async(self, task: str, memory: MemoryManager, session_id: Optional[str]) -> str:
+        """Runs one Think-Act turn; see act_async()."""
+        # 1) Record user input
+        await self._add_entry_async(memory, "user", task)
+
+        # 2) Think
+        plan = await self.think_async(task, session_id=session_id)
+
+        # 3) Tool dispatch entry point
+        print(f"[TOOLS] Executing tools for: {task}")
+        tool_list, budget, system_prompt = self._act_system_prompt(memory, plan)
+
+        try:
+            context_messages = await self._context_window_async(memory, system_prompt, budget, task)
+            formatted_context = self._format_context_messages(context_messages)
+            initial_prompt = f"{formatted_context}\n\nCurrent Task: {task}"
+
+            print("💬 Sending request to Gemini...")
+            first_reply = await self._call_gemini_async(initial_prompt)
+            tool_name, tool_args = self._extract_tool_call(first_reply)
+
+            final_response = first_reply
+
+            if tool_name:
+                observation = await self._run_tool_async(tool_name, tool_args)
+
+                # Record intermediate reasoning and observation
+                await self._add_entry_async(memory, "assistant", first_reply)
+                await self._add_entry_async(memory, "tool", f"{tool_name} output: {observation}")
+
+                # Refresh context to include tool feedback before final answer
+                budget = self.budget_allocator.allocate(
+                    tools=tool_list,
+                    summary=memory.summary,
+                    observation=str(observation),
+                    growing=("summary",),
+                )
+                context_messages = await self._context_window_async(memory, system_prompt, budget, task)
+                follow_up_prompt = self._follow_up_prompt(
+                    context_messages, tool_name, observation, budget.observation
+                )
+                print(f"💬 Sending follow-up with observation from '{tool_name}'...")
+                final_response = await self._call_gemini_async(follow_up_prompt)
+
+            await self._add_entry_async(memory, "assistant", final_response)
+            return final_response
+
+        except Exception as e:
+            response = f"Error generating response: {str(e)}"
+            print(f"❌ API Error: {e}")
+            return response
+
+    async def run_async(self, task: str, session_id: Optional[str] = None) -> str:
+        """Awaitable counterpart of run(); returns the result as well."""
+        print(f"🚀 Starting Task: {task}")
+        result = await self.act_async(task, session_id=session_id)
+        print(f"📦 Result: {result}")
+        await asyncio.to_thread(self.reflect, session_id)
+        return result
+
+    async def shutdown_async(self) -> None:
+        """Close MCP connections on the running loop, then release memory and workers."""
+        if self.mcp_manager:
+            print("🔌 Shutting down MCP connections...")
+            await self.mcp_manager.shutdown()
+            self.mcp_manager = None
+        await asyncio.to_thread(self.shutdown)
@@ -63,6 +63,87 @@ class Settings(BaseSettings):
 
     # Memory Configuration
     MEMORY_FILE: str = "agent_memory.json"
+    MEMORY_BACKEND: str = Field(
+        default="",
+        description="Memory storage backend: json, jsonl or sqlite. Inferred from MEMORY_FILE extension when empty",
+    )
+    MEMORY_BACKGROUND_SUMMARY: bool = Field(
+        default=False,
+        description="Summarize evicted history on a worker thread instead of during the user's turn",
+    )
+    MEMORY_WRITE_BEHIND: bool = Field(
+        default=False,
+        description="Batch memory writes: flush on an interval, at the end of each turn and at shutdown",
+    )
+    MEMORY_FLUSH_INTERVAL: float = Field(
+        default=1.0, description="Seconds between write-behind flushes"
+    )
+    MEMORY_FSYNC: bool = Field(
+        default=False, description="fsync memory writes for crash safety (slower on network volumes)"
+    )
+    MEMORY_LOAD_TAIL: int = Field(
+        default=0,
+        description="jsonl backend: messages read at startup, newest first; older ones are paged in on demand. 0 loads everything",
+    )
+    MEMORY_SHARED: bool = Field(
+        default=False,
+        description="Several processes share the memory file: lock writes and merge what the others appended",
+    )
+    MEMORY_DEDUP: bool = Field(
+        default=False,
+        description="Store each distinct message body once by hash and collapse repeats in the context window",
+    )
+    MEMORY_BLOB_THRESHOLD: int = Field(
+        default=16_000,
+        description="Entries longer than this many characters are stored out of line with an inline preview. 0 disables",
+    )
+    MEMORY_SUMMARY_CHUNK_SIZE: int = Field(
+        default=32, description="Messages per leaf of the summary tree; bounds the work of each summarizer call"
+    )
+    MEMORY_MAX_HOT_SESSIONS: int = Field(
+        default=128, description="Sessions kept loaded in RAM before the least recently used is evicted"
+    )
+    MEMORY_RECALL: bool = Field(
+        default=False,
+        description="Index memory for long-term recall of relevant old messages (requires numpy)",
+    )
+    MEMORY_RECALL_K: int = Field(
+        default=3, description="Number of old messages recalled into the context window"
+    )
+    MEMORY_KEYWORD_RECALL: bool = Field(
+        default=False,
+        description="Maintain a BM25 keyword index over memory for recall of exact identifiers",
+    )
+    MEMORY_ARCHIVE_HORIZON: int = Field(
+        default=0,
+        description="Recent messages kept in the hot memory file; older ones move to compressed archive segments. 0 disables archival",
+    )
+    MEMORY_ARCHIVE_SEGMENT_SIZE: int = Field(
+        default=1000, description="Messages per archive segment"
+    )
+    MEMORY_ARCHIVE_CODEC: str = Field(
+        default="gzip", description="Archive segment compression: gzip, or zstd if zstandard is installed"
+    )
+    CONTEXT_TOKEN_BUDGET: int = Field(
+        default=0,
+        description="Prompt token budget. 0 uses the context window size of the configured model",
+    )
+    CONTEXT_MAX_MESSAGES: int = Field(
+        default=50,
+        description="Upper bound on verbatim history messages; the token budget decides how many fit",
+    )
+
+    # Planning Configuration
+    PLAN_LATENCY_BUDGET: float = Field(
+        default=5.0,
+        description="Seconds think() waits for a plan before acting without one. 0 disables planning",
+    )
+    PLAN_MIN_TASK_WORDS: int = Field(
+        default=4, description="Tasks with fewer words are acted on directly, without a planning call"
+    )
+    PLAN_CACHE_SIZE: int = Field(
+        default=256, description="Plans cached by normalized task; a repeated task reuses its plan. 0 disables"
+    )
 
     # MCP Configuration
     MCP_ENABLED: bool = Field(default=False, description="Enable MCP integration")
@@ -0,0 +1,40 @@
+"""
+Memory package for the Antigravity agent.
+
+Exposes the MemoryManager used by the agent together with the pluggable
+storage backends it can persist to:
+- JsonFileBackend: Single JSON document (legacy `agent_memory.json` format)
+- JournalBackend: Append-only JSONL journal with replay and compaction
+- SqliteBackend: SQLite database in WAL mode with rows indexed by session
+
+History entries are stored as immutable, slot-based Message objects.
+
+SessionStore keeps one MemoryManager per conversation behind an LRU of hot
+sessions. Old history can be archived into compressed segments (see
+src.memory.archive) so the hot file stays small. MemoryManager.fork() returns
+copy-on-write branches for exploring alternatives (see src.memory.branch).
+"""
+
+from src.memory.backends import (
+    BACKENDS,
+    JournalBackend,
+    JsonFileBackend,
+    MemoryBackend,
+    SqliteBackend,
+    create_backend,
+)
+from src.memory.manager import MemoryManager
+from src.memory.message import Message
+from src.memory.sessions import SessionStore
+
+__all__ = [
+    "BACKENDS",
+    "JournalBackend",
+    "JsonFileBackend",
+    "MemoryBackend",
+    "MemoryManager",
+    "Message",
+    "SessionStore",
+    "SqliteBackend",
+    "create_backend",
+]
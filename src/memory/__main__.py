@@ -0,0 +1,69 @@
+"""
+Memory maintenance commands.
+
+Run with:
+    python -m src.memory migrate --from json --to sqlite
+    python -m src.memory migrate --from json --to jsonl --source agent_memory.json --dest agent_memory.jsonl
+"""
+
+import argparse
+import sys
+import time
+from typing import List, Optional
+
+from src.config import settings
+from src.memory.backends import BACKENDS, resolve_backend_name
+from src.memory.migrate import default_destination, migrate
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.memory", description="Memory maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser(
+        "migrate", help="Copy a memory file to another backend in bounded batches and verify it"
+    )
+    migrate_parser.add_argument(
+        "--from", dest="source_backend", choices=sorted(BACKENDS),
+        help="Backend of the source (default: inferred from its extension)",
+    )
+    migrate_parser.add_argument("--to", dest="destination_backend", choices=["jsonl", "sqlite"], required=True)
+    migrate_parser.add_argument(
+        "--source", default=settings.MEMORY_FILE, help="Memory file to read (default: MEMORY_FILE)"
+    )
+    migrate_parser.add_argument(
+        "--dest", help="Memory file to create (default: the source with the new backend's extension)"
+    )
+    migrate_parser.add_argument("--batch-size", type=int, default=1000, help="Entries per read/write batch")
+    migrate_parser.add_argument("--session", default="default", help="Session id for sqlite memory files")
+    args = parser.parse_args(argv)
+
+    source_backend = resolve_backend_name(args.source, args.source_backend)
+    destination = args.dest or default_destination(args.source, args.destination_backend)
+    if destination == args.source:
+        parser.error("--dest must differ from --source.")
+
+    start = time.perf_counter()
+    try:
+        result = migrate(
+            args.source,
+            source_backend,
+            destination,
+            args.destination_backend,
+            batch_size=args.batch_size,
+            session_id=args.session,
+        )
+    except (OSError, ValueError, RuntimeError) as exc:
+        print(f"❌ Migration failed: {exc}")
+        return 1
+    print(
+        f"✅ Migrated {result.entries} entries from {args.source} ({source_backend}) to "
+        f"{result.destination} ({args.destination_backend}) in {time.perf_counter() - start:.1f}s; "
+        f"checksum {result.checksum[:16]} verified."
+    )
+    print(f"Set MEMORY_FILE={result.destination} to switch the agent over.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
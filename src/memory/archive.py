@@ -0,0 +1,378 @@
+"""
+Tiered archival of old history into compressed segments.
+
+The oldest entries of a long conversation are moved out of the hot memory
+file into immutable, compressed segment files. Each segment is written as a
+sequence of independently compressed blocks, and the manifest records the
+byte offset of every block, so reading one old message decompresses a single
+block instead of the whole archive. Segments are only opened when
+`get_history()` or recall reaches past the hot file, which keeps startup time
+and RAM bounded by the hot horizon rather than by the conversation length.
+"""
+
+import bisect
+import gzip
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.memory.backends.base import FileLock, MemoryBackend, atomic_write
+from src.memory.message import Message, json_default
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency; gzip is always available
+    zstandard = None
+
+# codec name -> (file extension, compress, decompress)
+_CODECS: Dict[str, Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "gzip": (".gz", gzip.compress, gzip.decompress),
+}
+if zstandard is not None:
+    _CODECS["zstd"] = (
+        ".zst",
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+
+class SegmentArchive:
+    """
+    Append-only store of immutable compressed history segments.
+
+    Layout of the archive directory:
+        manifest.json
+        segment-000000000000.jsonl.gz
+        segment-000000001000.jsonl.gz
+        ...
+
+    Manifest format:
+        {"segments": [{"file": ..., "start": 0, "count": 1000, "codec": "gzip",
+                       "block_size": 256, "blocks": [0, 8123, ..., <file size>]}]}
+
+    Block i of a segment holds entries [start + i * block_size, ...) as JSON
+    lines and spans bytes blocks[i]..blocks[i + 1] of the segment file.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(
+        self,
+        directory: str,
+        codec: str = "gzip",
+        block_size: int = 256,
+        fsync: bool = False,
+        cache_blocks: int = 8,
+    ):
+        """
+        Initialize the archive.
+
+        Args:
+            directory: Directory holding the manifest and segment files.
+            codec: Compression for new segments: "gzip", or "zstd" when the
+                zstandard package is installed (falls back to gzip otherwise).
+            block_size: Entries per independently compressed block in new segments.
+            fsync: Force segments and the manifest to stable storage.
+            cache_blocks: Number of decompressed blocks kept in RAM.
+
+        Raises:
+            ValueError: If the codec is unknown or block_size is smaller than 1.
+        """
+        if codec == "zstd" and codec not in _CODECS:
+            print("Warning: zstandard is not installed; archiving memory with gzip.")
+            codec = "gzip"
+        if codec not in _CODECS:
+            raise ValueError(f"Unknown archive codec '{codec}'. Available: {', '.join(sorted(_CODECS))}")
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1.")
+        self.directory = directory
+        self.codec = codec
+        self.block_size = block_size
+        self.fsync = fsync
+        self.cache_blocks = cache_blocks
+        self._segments: List[Dict[str, Any]] = []
+        self._starts: List[int] = []
+        self._blocks: "OrderedDict[Tuple[str, int], List[Message]]" = OrderedDict()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, self.MANIFEST)
+
+    def load(self) -> None:
+        """Reads the manifest; segment contents stay on disk until requested."""
+        self._segments = []
+        self._blocks.clear()
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._segments = list(json.load(f)["segments"])
+            except (OSError, ValueError, KeyError, TypeError):
+                print(f"Warning: Could not read archive manifest {self.manifest_path}.")
+                self._segments = []
+        self._starts = [segment["start"] for segment in self._segments]
+
+    def count(self) -> int:
+        """Returns the number of archived entries."""
+        if not self._segments:
+            return 0
+        last = self._segments[-1]
+        return last["start"] + last["count"]
+
+    def append(self, entries: List[Message]) -> None:
+        """
+        Writes entries as a new segment following the archived ones.
+
+        The segment file is complete on disk before the manifest references
+        it, so a crash never exposes a partial segment.
+
+        Args:
+            entries: Entries to archive, oldest first.
+        """
+        if not entries:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        start = self.count()
+        extension, compress, _decompress = _CODECS[self.codec]
+        name = f"segment-{start:012d}.jsonl{extension}"
+        path = os.path.join(self.directory, name)
+
+        offsets = [0]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for i in range(0, len(entries), self.block_size):
+                lines = "".join(
+                    json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=json_default) + "\n"
+                    for entry in entries[i:i + self.block_size]
+                )
+                f.write(compress(lines.encode("utf-8")))
+                offsets.append(f.tell())
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        self._segments.append(
+            {
+                "file": name,
+                "start": start,
+                "count": len(entries),
+                "codec": self.codec,
+                "block_size": self.block_size,
+                "blocks": offsets,
+            }
+        )
+        self._starts.append(start)
+        segments = self._segments
+        atomic_write(self.manifest_path, lambda f: json.dump({"segments": segments}, f), fsync=self.fsync)
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        """
+        Returns archived entries with positions in [start, stop), oldest first.
+
+        Only the blocks overlapping the range are read and decompressed.
+
+        Args:
+            start: Position of the first entry.
+            stop: Position after the last entry.
+        """
+        start = max(start, 0)
+        stop = min(stop, self.count())
+        result: List[Message] = []
+        position = start
+        while position < stop:
+            segment = self._segments[bisect.bisect_right(self._starts, position) - 1]
+            block_size = segment["block_size"]
+            block = (position - segment["start"]) // block_size
+            block_start = segment["start"] + block * block_size
+            entries = self._read_block(segment, block)
+            take = entries[position - block_start:stop - block_start]
+            if not take:
+                raise RuntimeError(f"Archive segment {segment['file']} is truncated.")
+            result.extend(take)
+            position += len(take)
+        return result
+
+    def clear(self) -> None:
+        """Deletes every segment and the manifest."""
+        for segment in self._segments:
+            path = os.path.join(self.directory, segment["file"])
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        self._segments = []
+        self._starts = []
+        self._blocks.clear()
+
+    def _read_block(self, segment: Dict[str, Any], block: int) -> List[Message]:
+        """Returns the decoded entries of one block, using the block cache."""
+        key = (segment["file"], block)
+        entries = self._blocks.get(key)
+        if entries is not None:
+            self._blocks.move_to_end(key)
+            return entries
+
+        codec = _CODECS.get(segment.get("codec", "gzip"))
+        if codec is None:
+            raise RuntimeError(
+                f"Archive segment {segment['file']} uses codec '{segment.get('codec')}', "
+                "which is not installed."
+            )
+        begin, end = segment["blocks"][block], segment["blocks"][block + 1]
+        with open(os.path.join(self.directory, segment["file"]), 'rb') as f:
+            f.seek(begin)
+            data = codec[2](f.read(end - begin))
+        entries = [Message.from_dict(json.loads(line)) for line in data.decode("utf-8").splitlines() if line]
+
+        self._blocks[key] = entries
+        if len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return entries
+
+
+class TieredBackend(MemoryBackend):
+    """
+    Presents archive segments followed by a hot backend as one history.
+
+    Positions are absolute: entries below `hot.archived` are served from the
+    archive, everything after from the hot backend. New entries, the summary
+    and flushes all go to the hot backend.
+    """
+
+    def __init__(self, hot: MemoryBackend, archive: SegmentArchive, segment_size: int = 1000):
+        """
+        Initialize the tiered backend.
+
+        Args:
+            hot: Backend holding the most recent entries.
+            archive: Segment archive holding older entries.
+            segment_size: Number of entries moved into each new segment.
+
+        Raises:
+            ValueError: If segment_size is smaller than 1.
+        """
+        if segment_size < 1:
+            raise ValueError("segment_size must be at least 1.")
+        super().__init__(hot.path, hot.fsync)
+        self.hot = hot
+        self.archive = archive
+        self.segment_size = segment_size
+
+    def load(self) -> None:
+        """Loads the hot backend and the archive manifest, finishing an interrupted archival."""
+        self.hot.load()
+        self.archive.load()
+        archived = self.archive.count()
+        if archived > self.hot.archived:
+            # Segment written but the hot file was not trimmed before a crash
+            self.hot.drop_head(archived - self.hot.archived)
+            self.hot.flush()
+        elif archived < self.hot.archived:
+            print(
+                f"Warning: Memory archive {self.archive.directory} is missing "
+                f"{self.hot.archived - archived} entries."
+            )
+        self._sync_state()
+
+    def refresh(self) -> bool:
+        changed = self.hot.refresh()
+        if self.hot.archived != self.archive.count():
+            # Another process archived more entries
+            self.archive.load()
+            changed = True
+        self._sync_state()
+        return changed
+
+    def lock(self) -> FileLock:
+        return self.hot.lock()
+
+    def _sync_state(self) -> None:
+        self.summary = self.hot.summary
+        self.summary_watermark = self.hot.summary_watermark
+        self.archived = self.hot.archived
+
+    def entries(self) -> List[Message]:
+        return self.range(0, self.count())
+
+    def count(self) -> int:
+        return self.hot.archived + self.hot.count()
+
+    def tail(self, n: int) -> List[Message]:
+        if n <= self.hot.count():
+            return self.hot.tail(n)
+        total = self.count()
+        return self.range(total - n, total)
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        base = self.hot.archived
+        start = max(start, 0)
+        stop = min(stop, self.count())
+        if start >= stop:
+            return []
+        result: List[Message] = []
+        if start < base:
+            result.extend(self.archive.range(start, min(stop, base)))
+        if stop > base:
+            result.extend(self.hot.range(max(start - base, 0), stop - base))
+        return result
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.hot.append(entry)
+
+    def set_summary(self, summary: str, watermark: int) -> None:
+        self.hot.set_summary(summary, watermark)
+        self._sync_state()
+
+    def clear(self) -> None:
+        self.hot.clear()
+        self.archive.clear()
+        self._sync_state()
+
+    def drop_head(self, n: int) -> None:
+        """
+        Not supported: the oldest entries already live in the archive, which is never trimmed.
+
+        Raises:
+            RuntimeError: Always; hot entries are moved out with archive_older_than().
+        """
+        raise RuntimeError("TieredBackend trims its hot backend through archive_older_than().")
+
+    def archive_older_than(self, keep: int) -> int:
+        """
+        Moves hot entries into new segments, keeping at least `keep` recent ones hot.
+
+        Only whole segments of `segment_size` entries are archived. Segments
+        are written before the hot backend is trimmed and flushed, so a crash
+        in between is repaired by the next load.
+
+        Args:
+            keep: Number of most recent entries that stay in the hot backend.
+
+        Returns:
+            Number of entries archived.
+        """
+        movable = self.hot.count() - max(keep, 0)
+        segments = movable // self.segment_size
+        if segments <= 0:
+            return 0
+        for i in range(segments):
+            offset = i * self.segment_size
+            self.archive.append(self.hot.range(offset, offset + self.segment_size))
+        moved = segments * self.segment_size
+        self.hot.drop_head(moved)
+        self.hot.flush()
+        self._sync_state()
+        return moved
+
+    def flush(self) -> None:
+        self.hot.flush()
+
+    def save(self) -> None:
+        self.hot.save()
+
+    def sidecar_path(self, suffix: str) -> str:
+        return self.hot.sidecar_path(suffix)
+
+    def close(self) -> None:
+        self.hot.close()
@@ -0,0 +1,101 @@
+"""
+Storage backends for MemoryManager.
+
+Backends are selected by name or, when no name is given, by the extension of
+the memory file:
+- `.jsonl` -> JournalBackend
+- `.db`, `.sqlite`, `.sqlite3` -> SqliteBackend
+- anything else -> JsonFileBackend
+"""
+
+import os
+from typing import Any, Dict, Optional, Type
+
+from src.config import settings
+from src.memory.backends.base import MemoryBackend
+from src.memory.backends.journal import JournalBackend
+from src.memory.backends.json_file import JsonFileBackend
+from src.memory.backends.sqlite import SqliteBackend
+
+BACKENDS: Dict[str, Type[MemoryBackend]] = {
+    "json": JsonFileBackend,
+    "jsonl": JournalBackend,
+    "sqlite": SqliteBackend,
+}
+
+# File extensions that select a backend when none is named explicitly
+_EXTENSION_BACKENDS: Dict[str, str] = {
+    ".jsonl": "jsonl",
+    ".db": "sqlite",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+}
+
+
+def resolve_backend_name(path: str, name: Optional[str] = None) -> str:
+    """
+    Return the backend name to use for a memory file.
+
+    Args:
+        path: Path of the memory file.
+        name: Explicit backend name, returned unchanged when given.
+
+    Returns:
+        The explicit name, or the one implied by the file extension.
+    """
+    if name:
+        return name
+    extension = os.path.splitext(path)[1].lower()
+    return _EXTENSION_BACKENDS.get(extension, "json")
+
+
+def backend_options(name: str) -> Dict[str, Any]:
+    """
+    Return the backend constructor options configured in settings.
+
+    Args:
+        name: Backend name from BACKENDS.
+
+    Returns:
+        Keyword arguments for the backend constructor.
+    """
+    options: Dict[str, Any] = {"fsync": settings.MEMORY_FSYNC}
+    if name == "jsonl":
+        options["tail_entries"] = settings.MEMORY_LOAD_TAIL
+    return options
+
+
+def create_backend(path: str, name: Optional[str] = None, **options: Any) -> MemoryBackend:
+    """
+    Instantiate the storage backend for a memory file.
+
+    Args:
+        path: Path of the memory file.
+        name: Backend name from BACKENDS. Inferred from the file extension when omitted.
+        **options: Extra keyword arguments for the backend constructor (e.g. fsync).
+
+    Returns:
+        An unloaded MemoryBackend instance.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    name = resolve_backend_name(path, name)
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(
+            f"Unknown memory backend '{name}'. Available: {', '.join(sorted(BACKENDS))}"
+        )
+    return backend_cls(path, **options)
+
+
+__all__ = [
+    "BACKENDS",
+    "JournalBackend",
+    "JsonFileBackend",
+    "MemoryBackend",
+    "SqliteBackend",
+    "backend_options",
+    "create_backend",
+    "resolve_backend_name",
+]
@@ -0,0 +1,256 @@
+"""
+Base class for MemoryManager storage engines.
+"""
+
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO
+
+from src.memory.message import Message
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+
+def atomic_write(path: str, write: Callable[[TextIO], None], fsync: bool = False) -> None:
+    """
+    Replace a file atomically by writing a temporary file and renaming it.
+
+    Readers see either the old or the new contents, never a partial write.
+
+    Args:
+        path: Destination file.
+        write: Callable that writes the new contents to the open temp file.
+        fsync: Flush the temp file (and the directory entry) to stable storage.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        write(f)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class FileLock:
+    """
+    Reentrant advisory lock held on a lock file across processes.
+
+    Uses flock on POSIX and msvcrt.locking on Windows; elsewhere it only
+    counts nesting and does not exclude other processes.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the lock.
+
+        Args:
+            path: Lock file, created on first use.
+        """
+        self.path = path
+        self._fd: Optional[int] = None
+        self._depth = 0
+
+    def __enter__(self) -> "FileLock":
+        if self._depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                elif msvcrt is not None:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            except BaseException:
+                os.close(fd)
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._depth -= 1
+        if self._depth or self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class MemoryBackend:
+    """
+    Storage engine interface used by MemoryManager.
+
+    Backends keep the conversation history, the rolling summary and its
+    watermark (how many leading entries the summary already covers). Mutations
+    (`append`, `set_summary`, `clear`, `drop_head`) only update backend state;
+    `flush` persists whatever changed since the last flush, while `save` always
+    writes a full snapshot.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        """
+        Initialize the backend.
+
+        Args:
+            path: Location of the persisted memory on disk.
+            fsync: Force writes to stable storage before flush/save return.
+        """
+        self.path = path
+        self.fsync = fsync
+        self.summary: str = ""
+        self.summary_watermark: int = 0
+        # Number of older entries moved out to archive segments before position 0
+        self.archived: int = 0
+        self._file_lock: Optional[FileLock] = None
+
+    def load(self) -> None:
+        """Loads history and summary from disk, starting fresh if nothing is stored."""
+        raise NotImplementedError
+
+    def entries(self) -> List[Message]:
+        """Returns the full conversation history."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Returns the number of history entries."""
+        return len(self.entries())
+
+    def tail(self, n: int) -> List[Message]:
+        """
+        Returns the last `n` history entries, oldest first.
+
+        Args:
+            n: Number of entries to return.
+        """
+        if n <= 0:
+            return []
+        return self.entries()[-n:]
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        """
+        Returns history entries with positions in [start, stop), oldest first.
+
+        Args:
+            start: Position of the first entry.
+            stop: Position after the last entry.
+        """
+        return self.entries()[start:stop]
+
+    def iter_range(self, start: int, stop: int, page_size: int = 1000) -> Iterator[Message]:
+        """
+        Yields history entries with positions in [start, stop), one page at a time.
+
+        Only one page of `page_size` entries is materialized at once, so
+        walking old history never loads it all into RAM.
+
+        Args:
+            start: Position of the first entry.
+            stop: Position after the last entry.
+            page_size: Number of entries read per page.
+        """
+        stop = min(stop, self.count())
+        for page_start in range(max(start, 0), stop, page_size):
+            yield from self.range(page_start, min(page_start + page_size, stop))
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Adds a history entry, stored as a Message."""
+        raise NotImplementedError
+
+    def extend(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Adds several history entries at once.
+
+        Backends override this with a bulk write where they have one.
+
+        Args:
+            entries: Entries to append, oldest first.
+        """
+        for entry in entries:
+            self.append(entry)
+
+    def page_out(self, keep: int = 0) -> None:
+        """
+        Releases RAM held for flushed entries older than the newest `keep`.
+
+        Backends that can read old entries back from disk on demand override
+        this; the default keeps everything.
+
+        Args:
+            keep: Number of most recent entries to keep in RAM.
+        """
+
+    def set_summary(self, summary: str, watermark: int) -> None:
+        """
+        Replaces the rolling summary.
+
+        Args:
+            summary: The new summary text.
+            watermark: Number of leading history entries folded into the summary.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Drops all history and the summary."""
+        raise NotImplementedError
+
+    def drop_head(self, n: int) -> None:
+        """
+        Drops the `n` oldest entries after they have been archived elsewhere.
+
+        Args:
+            n: Number of leading entries to drop; `archived` grows by the same amount.
+        """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persists pending changes."""
+        raise NotImplementedError
+
+    def save(self) -> None:
+        """Writes a full snapshot of the current state."""
+        raise NotImplementedError
+
+    def lock(self) -> FileLock:
+        """Returns the reentrant inter-process lock guarding this store."""
+        if self._file_lock is None:
+            self._file_lock = FileLock(self.sidecar_path(".lock"))
+        return self._file_lock
+
+    def refresh(self) -> bool:
+        """
+        Re-reads what other processes wrote since this backend last read or wrote the store.
+
+        Call while holding `lock()` and with no unflushed changes.
+
+        Returns:
+            True if the history, summary or archive changed.
+        """
+        return False
+
+    def sidecar_path(self, suffix: str) -> str:
+        """
+        Returns the path of an auxiliary file stored next to the memory.
+
+        Args:
+            suffix: Suffix identifying the auxiliary file (e.g. ".vectors.npy").
+        """
+        return f"{self.path}{suffix}"
+
+    def close(self) -> None:
+        """Releases resources held by the backend."""
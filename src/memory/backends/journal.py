@@ -0,0 +1,421 @@
+"""
+Append-only JSONL journal storage engine.
+
+Every history entry is written as one JSON line and summary changes are
+recorded as separate lines, so persisting a turn costs O(1) regardless of
+history size. The journal is replayed on load and periodically compacted
+into a snapshot once superseded records pile up.
+
+With `tail_entries` set, load reads the journal backwards from its end and
+materializes only the summary and the most recent entries; older entries are
+paged in from disk when a range reaching before the tail is requested.
+"""
+
+import bisect
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from src.memory.backends.base import MemoryBackend, atomic_write
+from src.memory.message import Message, json_default
+
+# Record types written to the journal
+OP_ENTRY = "entry"
+OP_SUMMARY = "summary"
+OP_CLEAR = "clear"
+OP_ARCHIVE = "archive"
+
+# Bytes read per step when scanning the journal backwards
+_READ_CHUNK = 64 * 1024
+# Remember the file offset of every Nth entry to start paging scans near it
+_ANCHOR_EVERY = 256
+
+
+class JournalBackend(MemoryBackend):
+    """
+    Stores memory as a journal of JSON lines.
+
+    Record formats:
+        {"op": "entry", "seq": 0, "data": {"role": ..., "content": ..., "metadata": {...}}}
+        {"op": "summary", "summary": "...", "watermark": 12, "archived": 0}
+        {"op": "clear"}
+        {"op": "archive", "archived": 1000}
+
+    `seq` is the absolute history position of an entry. An archive record
+    drops the entries before that absolute position, which have been moved to
+    archive segments. Summary records also note the archived count at the time
+    they were written and are re-emitted every `compact_threshold` records, so
+    a tail-first load never has to scan further back than that to recover the
+    state.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync: bool = False,
+        compact_threshold: int = 1000,
+        tail_entries: int = 0,
+    ):
+        """
+        Initialize the journal backend.
+
+        Args:
+            path: Path of the `.jsonl` journal file.
+            fsync: Force appended records to stable storage on every flush.
+            compact_threshold: Minimum number of superseded records before the
+                journal is rewritten. Compaction also waits until garbage
+                outnumbers live records, keeping appends amortized O(1).
+            tail_entries: Number of recent entries materialized on load. 0
+                replays the whole journal; otherwise startup cost depends only
+                on this number and older entries are read from disk on demand.
+        """
+        super().__init__(path, fsync)
+        self.compact_threshold = compact_threshold
+        self.tail_entries = tail_entries
+        # Entries at positions [self._tail_start, count()) are held in RAM
+        self._history: List[Message] = []
+        self._tail_start = 0
+        self._pending: List[str] = []
+        self._garbage = 0
+        self._needs_rewrite = False
+        self._records_since_state = 0
+        # Sorted (seq, byte offset) pairs of entries seen on disk
+        self._anchors: List[Tuple[int, int]] = []
+        # (inode, size) of the journal as last read or written
+        self._synced: Optional[Tuple[int, int]] = None
+
+    def load(self) -> None:
+        """Replays the journal from disk if it exists."""
+        self.summary = ""
+        self.summary_watermark = 0
+        self.archived = 0
+        self._history = []
+        self._tail_start = 0
+        self._pending = []
+        self._garbage = 0
+        self._needs_rewrite = False
+        self._records_since_state = 0
+        self._anchors = []
+        self._synced = self._fingerprint()
+        if not os.path.exists(self.path):
+            return
+        if self.tail_entries > 0:
+            self._load_tail()
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write from a crash can only affect the tail; skip it.
+                    print(f"Warning: Skipping corrupt record at {self.path}:{line_number}.")
+                    self._garbage += 1
+                    continue
+                self._replay(record)
+
+    def _replay(self, record: Dict[str, Any]) -> None:
+        op = record.get("op") if isinstance(record, dict) else None
+        self._records_since_state += 1
+        if op == OP_ENTRY:
+            self._history.append(Message.from_dict(record.get("data")))
+        elif op == OP_SUMMARY:
+            if self.summary or self.summary_watermark:
+                self._garbage += 1
+            self.summary = record.get("summary", "") or ""
+            self.summary_watermark = int(record.get("watermark", 0) or 0)
+            self.archived = int(record.get("archived", self.archived) or 0)
+            self._records_since_state = 0
+        elif op == OP_CLEAR:
+            self._garbage += len(self._history) + self._summary_records() + 1
+            self._history = []
+            self.summary = ""
+            self.summary_watermark = 0
+            self.archived = 0
+        elif op == OP_ARCHIVE:
+            archived = int(record.get("archived", 0) or 0)
+            dropped = min(max(archived - self.archived, 0), self.count())
+            self._garbage += dropped + (1 if self.archived else 0)
+            self._drop(dropped)
+            self.archived = archived
+        else:
+            self._garbage += 1
+
+    def _load_tail(self) -> None:
+        """Recovers the summary and the last `tail_entries` entries by reading backwards."""
+        tail: List[Message] = []
+        newest_seq: Optional[int] = None
+        oldest_tail: Optional[Tuple[int, int]] = None
+        summary_record: Optional[Dict[str, Any]] = None
+        archived: Optional[int] = None
+        scanned = 0
+
+        with open(self.path, 'rb') as f:
+            for offset, record in self._reverse_records(f, os.path.getsize(self.path)):
+                scanned += 1
+                op = record.get("op")
+                if op == OP_CLEAR:
+                    archived = archived or 0
+                    break
+                if op == OP_ENTRY:
+                    seq = int(record.get("seq", 0))
+                    if newest_seq is None:
+                        newest_seq = seq
+                    if len(tail) < self.tail_entries:
+                        tail.append(Message.from_dict(record.get("data")))
+                        oldest_tail = (seq, offset)
+                elif op == OP_SUMMARY and summary_record is None:
+                    summary_record = record
+                    if archived is None and "archived" in record:
+                        archived = int(record["archived"] or 0)
+                elif op == OP_ARCHIVE and archived is None:
+                    archived = int(record.get("archived", 0) or 0)
+                if len(tail) >= self.tail_entries and summary_record is not None and archived is not None:
+                    break
+
+        if summary_record is not None:
+            self.summary = summary_record.get("summary", "") or ""
+            self.summary_watermark = int(summary_record.get("watermark", 0) or 0)
+        # Without a recent state record, write one with the next flush
+        self._records_since_state = scanned if summary_record is not None else self.compact_threshold
+        self.archived = archived or 0
+        count = max(newest_seq + 1 - self.archived, 0) if newest_seq is not None else 0
+        # Entries older than the last archive record are no longer live
+        tail.reverse()
+        self._history = tail[max(len(tail) - count, 0):]
+        self._tail_start = count - len(self._history)
+        if oldest_tail is not None and self._history:
+            self._anchors = [oldest_tail]
+
+    def _reverse_records(self, f: BinaryIO, end: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yields (offset, record) for the records before byte `end`, newest first."""
+        position = end
+        buffer = b""
+        while position > 0:
+            read = min(_READ_CHUNK, position)
+            position -= read
+            f.seek(position)
+            buffer = f.read(read) + buffer
+            lines = buffer.split(b"\n")
+            # The first piece may be the end of a line that starts in an earlier chunk
+            buffer = lines[0] if position > 0 else b""
+            offset = position + len(lines[0]) + 1 if position > 0 else 0
+            records = []
+            for line in (lines[1:] if position > 0 else lines):
+                records.append((offset, line))
+                offset += len(line) + 1
+            for offset, line in reversed(records):
+                record = self._decode(line, offset)
+                if record is not None:
+                    yield offset, record
+
+    def _forward_records(self, f: BinaryIO, start: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yields (offset, record) for the records from byte `start` on, oldest first."""
+        f.seek(start)
+        offset = start
+        for line in f:
+            record = self._decode(line, offset)
+            if record is not None:
+                yield offset, record
+            offset += len(line)
+
+    def _decode(self, line: bytes, offset: int) -> Optional[Dict[str, Any]]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            record = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            # A torn write from a crash can only affect the tail; skip it.
+            print(f"Warning: Skipping corrupt record at {self.path} byte {offset}.")
+            return None
+        return record if isinstance(record, dict) else None
+
+    def refresh(self) -> bool:
+        current = self._fingerprint()
+        if current == self._synced:
+            return False
+        if current is None or self._synced is None or current[0] != self._synced[0] or current[1] < self._synced[1]:
+            # Cleared or compacted by another process
+            self.load()
+            return True
+        # Another process appended: replay only the new records
+        with open(self.path, 'rb') as f:
+            for _offset, record in self._forward_records(f, self._synced[1]):
+                self._replay(record)
+        self._synced = current
+        return True
+
+    def _fingerprint(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def entries(self) -> List[Message]:
+        if self._tail_start:
+            return self.range(0, self.count())
+        return self._history
+
+    def count(self) -> int:
+        return self._tail_start + len(self._history)
+
+    def tail(self, n: int) -> List[Message]:
+        if n <= 0:
+            return []
+        return self.range(max(self.count() - n, 0), self.count())
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        start = max(start, 0)
+        stop = min(stop, self.count())
+        if start >= stop:
+            return []
+        if start >= self._tail_start:
+            return self._history[start - self._tail_start:stop - self._tail_start]
+        paged = self._read_range(start, min(stop, self._tail_start))
+        if stop > self._tail_start:
+            paged.extend(self._history[:stop - self._tail_start])
+        return paged
+
+    def _read_range(self, start: int, stop: int) -> List[Message]:
+        """Reads entries at positions [start, stop) that are not held in RAM from disk."""
+        first, last = self.archived + start, self.archived + stop
+        found: Dict[int, Message] = {}
+        with open(self.path, 'rb') as f:
+            index = bisect.bisect_right(self._anchors, (first, float("inf"))) - 1
+            if index >= 0:
+                records = self._forward_records(f, self._anchors[index][1])
+            else:
+                # Walk back from the closest known entry after the range
+                later = bisect.bisect_left(self._anchors, (last, -1))
+                end = self._anchors[later][1] if later < len(self._anchors) else os.path.getsize(self.path)
+                records = self._reverse_records(f, end)
+            for offset, record in records:
+                if record.get("op") != OP_ENTRY:
+                    continue
+                seq = int(record.get("seq", 0))
+                if seq % _ANCHOR_EVERY == 0:
+                    self._add_anchor(seq, offset)
+                if first <= seq < last:
+                    found[seq] = Message.from_dict(record.get("data"))
+                if len(found) == last - first or (index >= 0 and seq >= last - 1) or (index < 0 and seq <= first):
+                    break
+        return [found[seq] for seq in range(first, last) if seq in found]
+
+    def _add_anchor(self, seq: int, offset: int) -> None:
+        index = bisect.bisect_left(self._anchors, (seq, -1))
+        if index == len(self._anchors) or self._anchors[index][0] != seq:
+            self._anchors.insert(index, (seq, offset))
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        entry = Message.from_dict(entry)
+        self._pending.append(self._encode({"op": OP_ENTRY, "seq": self.archived + self.count(), "data": entry}))
+        self._history.append(entry)
+
+    def set_summary(self, summary: str, watermark: int) -> None:
+        if summary == self.summary and watermark == self.summary_watermark:
+            return
+        self._garbage += self._summary_records()
+        self.summary = summary
+        self.summary_watermark = watermark
+        self._pending.append(self._encode(self._summary_record()))
+        self._records_since_state = 0
+
+    def clear(self) -> None:
+        self._history = []
+        self._tail_start = 0
+        self._anchors = []
+        self.summary = ""
+        self.summary_watermark = 0
+        self.archived = 0
+        self._pending = []
+        self._needs_rewrite = True
+
+    def drop_head(self, n: int) -> None:
+        if n <= 0:
+            return
+        self._garbage += min(n, self.count()) + (1 if self.archived else 0)
+        self._drop(n)
+        self.archived += n
+        self._pending.append(self._encode({"op": OP_ARCHIVE, "archived": self.archived}))
+
+    def page_out(self, keep: int = 0) -> None:
+        if self._pending or self._needs_rewrite:
+            # Unflushed entries exist only in RAM
+            return
+        release = len(self._history) - max(keep, 0)
+        if release > 0:
+            self._history = self._history[release:]
+            self._tail_start += release
+
+    def _drop(self, n: int) -> None:
+        """Forgets the `n` oldest entries, whether paged out or held in RAM."""
+        if n <= self._tail_start:
+            self._tail_start -= n
+        else:
+            self._history = self._history[n - self._tail_start:]
+            self._tail_start = 0
+
+    def flush(self) -> None:
+        if self._needs_rewrite or self._should_compact():
+            self.compact()
+            return
+        if not self._pending:
+            return
+        self._records_since_state += len(self._pending)
+        if self._records_since_state >= self.compact_threshold:
+            # Keep the latest state close to the end for tail-first loads
+            self._garbage += self._summary_records()
+            self._pending.append(self._encode(self._summary_record()))
+            self._records_since_state = 0
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(self._pending))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._pending = []
+        self._synced = self._fingerprint()
+
+    def save(self) -> None:
+        self.compact()
+
+    def compact(self) -> None:
+        """Rewrites the journal as a minimal snapshot of the current state."""
+        def write_snapshot(f) -> None:
+            for seq, entry in enumerate(self.iter_range(0, self.count()), self.archived):
+                f.write(self._encode({"op": OP_ENTRY, "seq": seq, "data": entry}))
+            # Written last so a tail-first load finds the state right away
+            if self.count() or self._summary_records() or self.archived:
+                f.write(self._encode(self._summary_record()))
+
+        atomic_write(self.path, write_snapshot, fsync=self.fsync)
+        self._pending = []
+        self._garbage = 0
+        self._needs_rewrite = False
+        self._records_since_state = 0
+        # Byte offsets changed with the rewrite
+        self._anchors = []
+        self._synced = self._fingerprint()
+
+    def _should_compact(self) -> bool:
+        live_records = self.count() + self._summary_records()
+        return self._garbage >= max(self.compact_threshold, live_records)
+
+    def _summary_records(self) -> int:
+        return 1 if self.summary or self.summary_watermark else 0
+
+    def _summary_record(self) -> Dict[str, Any]:
+        return {
+            "op": OP_SUMMARY,
+            "summary": self.summary,
+            "watermark": self.summary_watermark,
+            "archived": self.archived,
+        }
+
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=json_default) + "\n"
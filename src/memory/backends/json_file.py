@@ -0,0 +1,113 @@
+"""
+Single-document JSON storage engine (the legacy `agent_memory.json` format).
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.memory.backends.base import MemoryBackend, atomic_write
+from src.memory.message import Message, json_default
+
+
+class JsonFileBackend(MemoryBackend):
+    """Stores summary and history together in one pretty-printed JSON file."""
+
+    def __init__(self, path: str, fsync: bool = False):
+        super().__init__(path, fsync)
+        self._history: List[Message] = []
+        self._dirty = False
+        # (inode, size, mtime) of the file as last read or written
+        self._synced: Optional[Tuple[int, int, int]] = None
+
+    def load(self) -> None:
+        """Loads memory from the JSON file if it exists."""
+        self.summary = ""
+        self.summary_watermark = 0
+        self.archived = 0
+        self._history = []
+        self._dirty = False
+        self._synced = self._fingerprint()
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Warning: Could not decode memory file {self.path}. Starting fresh.")
+            return
+
+        if isinstance(data, dict):
+            self.summary = data.get("summary", "") or ""
+            self.summary_watermark = int(data.get("summary_watermark", 0) or 0)
+            self.archived = int(data.get("archived", 0) or 0)
+            history = data.get("history", [])
+            self._history = [Message.from_dict(e) for e in history] if isinstance(history, list) else []
+        elif isinstance(data, list):
+            # Backward compatibility for legacy memory files
+            self._history = [Message.from_dict(e) for e in data]
+        else:
+            print(f"Warning: Unexpected memory format in {self.path}. Starting fresh.")
+
+    def refresh(self) -> bool:
+        # A single JSON document cannot be read partially; reload it when it changed
+        if self._fingerprint() == self._synced:
+            return False
+        self.load()
+        return True
+
+    def _fingerprint(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def entries(self) -> List[Message]:
+        return self._history
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self._history.append(Message.from_dict(entry))
+        self._dirty = True
+
+    def set_summary(self, summary: str, watermark: int) -> None:
+        if summary != self.summary or watermark != self.summary_watermark:
+            self.summary = summary
+            self.summary_watermark = watermark
+            self._dirty = True
+
+    def clear(self) -> None:
+        self._history = []
+        self.summary = ""
+        self.summary_watermark = 0
+        self.archived = 0
+        self._dirty = True
+
+    def drop_head(self, n: int) -> None:
+        if n <= 0:
+            return
+        self._history = self._history[n:]
+        self.archived += n
+        self._dirty = True
+
+    def flush(self) -> None:
+        if self._dirty:
+            self._write()
+
+    def save(self) -> None:
+        self._write()
+
+    def _write(self) -> None:
+        payload = {
+            "summary": self.summary,
+            "summary_watermark": self.summary_watermark,
+            "archived": self.archived,
+            "history": self._history,
+        }
+        atomic_write(
+            self.path,
+            lambda f: json.dump(payload, f, indent=2, ensure_ascii=False, default=json_default),
+            fsync=self.fsync,
+        )
+        self._dirty = False
+        self._synced = self._fingerprint()
@@ -0,0 +1,189 @@
+"""
+SQLite storage engine running in WAL mode.
+
+History rows live in a table keyed by (session_id, seq), so reading the
+most recent messages is an index range scan instead of parsing the whole
+history at startup. `seq` is the absolute history position: rows moved to
+archive segments are deleted without renumbering the rest.
+"""
+
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from src.memory.backends.base import MemoryBackend
+from src.memory.message import Message
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state (
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (session_id, key)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteBackend(MemoryBackend):
+    """
+    Stores history rows and the rolling summary in an SQLite database.
+
+    Only the summary and the row count are read on load; history rows are
+    fetched on demand. Writes are grouped in a transaction that `flush`
+    commits.
+    """
+
+    def __init__(self, path: str, fsync: bool = False, session_id: str = "default"):
+        """
+        Initialize the SQLite backend.
+
+        Args:
+            path: Path of the SQLite database file.
+            fsync: Sync the WAL on every commit (synchronous=FULL).
+            session_id: Conversation whose rows this backend reads and writes.
+        """
+        super().__init__(path, fsync)
+        self.session_id = session_id
+        # MemoryManager serializes access, so a flusher thread may commit
+        self._conn: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._conn.executescript(_SCHEMA)
+        self._count = 0
+        # Changes whenever another connection commits to the database
+        self._data_version: Optional[int] = None
+
+    def load(self) -> None:
+        """Reads the summary and row count for the session."""
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        state = dict(
+            self._conn.execute(
+                "SELECT key, value FROM state WHERE session_id = ?", (self.session_id,)
+            )
+        )
+        self.summary = state.get("summary", "")
+        self.summary_watermark = int(state.get("summary_watermark", 0))
+        self.archived = int(state.get("archived", 0))
+        row = self._conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM history WHERE session_id = ?",
+            (self.session_id,),
+        ).fetchone()
+        self._count = max(row[0] - self.archived, 0)
+
+    def refresh(self) -> bool:
+        # Only the summary and the row count are cached, so re-reading them is the delta
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+            return False
+        self.load()
+        return True
+
+    def entries(self) -> List[Message]:
+        return self.range(0, self._count)
+
+    def count(self) -> int:
+        return self._count
+
+    def tail(self, n: int) -> List[Message]:
+        if n <= 0:
+            return []
+        return self.range(max(self._count - n, 0), self._count)
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        rows = self._conn.execute(
+            "SELECT role, content, metadata FROM history "
+            "WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (self.session_id, self.archived + start, self.archived + stop),
+        )
+        return [self._row_to_entry(row) for row in rows]
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT INTO history (session_id, seq, role, content, metadata) VALUES (?, ?, ?, ?, ?)",
+            (
+                self.session_id,
+                self.archived + self._count,
+                entry.get("role", ""),
+                entry.get("content", ""),
+                json.dumps(entry.get("metadata") or {}, ensure_ascii=False),
+            ),
+        )
+        self._count += 1
+
+    def extend(self, entries: List[Dict[str, Any]]) -> None:
+        self._conn.executemany(
+            "INSERT INTO history (session_id, seq, role, content, metadata) VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    self.session_id,
+                    self.archived + self._count + offset,
+                    entry.get("role", ""),
+                    entry.get("content", ""),
+                    json.dumps(entry.get("metadata") or {}, ensure_ascii=False),
+                )
+                for offset, entry in enumerate(entries)
+            ],
+        )
+        self._count += len(entries)
+
+    def set_summary(self, summary: str, watermark: int) -> None:
+        if summary == self.summary and watermark == self.summary_watermark:
+            return
+        self.summary = summary
+        self.summary_watermark = watermark
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO state (session_id, key, value) VALUES (?, ?, ?)",
+            [
+                (self.session_id, "summary", summary),
+                (self.session_id, "summary_watermark", str(watermark)),
+            ],
+        )
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM history WHERE session_id = ?", (self.session_id,))
+        self._conn.execute("DELETE FROM state WHERE session_id = ?", (self.session_id,))
+        self.summary = ""
+        self.summary_watermark = 0
+        self.archived = 0
+        self._count = 0
+
+    def drop_head(self, n: int) -> None:
+        n = min(n, self._count)
+        if n <= 0:
+            return
+        self.archived += n
+        self._count -= n
+        self._conn.execute(
+            "DELETE FROM history WHERE session_id = ? AND seq < ?", (self.session_id, self.archived)
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO state (session_id, key, value) VALUES (?, ?, ?)",
+            (self.session_id, "archived", str(self.archived)),
+        )
+
+    def flush(self) -> None:
+        self._conn.commit()
+
+    def save(self) -> None:
+        self._conn.commit()
+
+    def sidecar_path(self, suffix: str) -> str:
+        # Sessions share the database file, so keep their sidecars apart
+        return f"{self.path}.{self.session_id}{suffix}"
+
+    def close(self) -> None:
+        """Commits pending writes and closes the database connection."""
+        self._conn.commit()
+        self._conn.close()
+
+    @staticmethod
+    def _row_to_entry(row: Any) -> Message:
+        role, content, metadata = row
+        return Message(role, content, json.loads(metadata))
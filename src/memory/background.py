@@ -0,0 +1,87 @@
+"""
+Background summarization worker.
+
+Runs summarizer calls on a dedicated thread so the LLM round trip needed to
+compact history stays off the request critical path. The worker only computes
+summaries; MemoryManager applies finished results on its own thread.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class BackgroundSummarizer:
+    """Single-slot summarization queue backed by one worker thread."""
+
+    def __init__(self):
+        """Initialize the worker; the thread is started on first submit."""
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summarizer")
+        self._future: Optional[Future] = None
+        self._cutoff: int = 0
+
+    @property
+    def busy(self) -> bool:
+        """Whether a summarization job is queued or running."""
+        return self._future is not None
+
+    def submit(
+        self,
+        summarizer: Callable[[List[Dict[str, Any]], str], str],
+        messages: List[Dict[str, Any]],
+        previous_summary: str,
+        cutoff: int,
+    ) -> bool:
+        """
+        Schedule a summarization job unless one is already in flight.
+
+        Args:
+            summarizer: Callable that receives (old_messages, previous_summary).
+            messages: Messages to fold into the summary.
+            previous_summary: Summary the new one is merged into.
+            cutoff: Watermark the summary will cover once applied.
+
+        Returns:
+            True if the job was scheduled, False if the worker is busy.
+        """
+        if self.busy:
+            return False
+        self._cutoff = cutoff
+        self._future = self._executor.submit(summarizer, messages, previous_summary)
+        return True
+
+    def poll(self, timeout: Optional[float] = 0) -> Optional[Tuple[Any, int]]:
+        """
+        Collect the result of the pending job if it has finished.
+
+        Args:
+            timeout: Seconds to wait for the job; 0 never blocks, None waits forever.
+
+        Returns:
+            (summary, cutoff) for a finished job, or None if nothing is ready.
+
+        Raises:
+            Exception: Whatever the summarizer raised.
+        """
+        future = self._future
+        if future is None:
+            return None
+        if timeout == 0 and not future.done():
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return None
+        finally:
+            if future.done():
+                self._future = None
+        return result, self._cutoff
+
+    def cancel(self) -> None:
+        """Forget the pending job; its result will never be returned."""
+        self._future = None
+
+    def shutdown(self) -> None:
+        """Stop the worker thread, waiting for a running job to finish."""
+        self._future = None
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,213 @@
+"""
+Copy-on-write branches of a conversation.
+
+A branch sees the parent's history up to the fork point and its own entries
+after it. Nothing is copied when forking: entries before the fork point are
+read from the parent's backend on demand (as the same shared Message
+objects), the summary tree is shared because it is immutable, and new
+entries live only in the branch until it is committed back or discarded.
+This makes it cheap to explore several tool paths or swarm variants for one
+request and keep only the one that worked.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List
+
+from src.memory.backends.base import FileLock, MemoryBackend
+from src.memory.manager import MemoryManager
+from src.memory.message import Message
+
+
+class BranchBackend(MemoryBackend):
+    """
+    Overlay of in-RAM entries on top of a read-only prefix of another backend.
+
+    Positions below `base` are served by the parent backend, later ones from
+    the branch's own list. Nothing is ever written to disk.
+    """
+
+    def __init__(self, parent: MemoryBackend, lock: threading.RLock):
+        """
+        Initialize the branch at the parent's current end.
+
+        Args:
+            parent: Backend holding the history being forked.
+            lock: Lock that guards the parent backend.
+        """
+        super().__init__(parent.path, parent.fsync)
+        self.parent = parent
+        self._parent_lock = lock
+        self.base = parent.count()
+        self.local: List[Message] = []
+        self.summary = parent.summary
+        self.summary_watermark = parent.summary_watermark
+        self.archived = parent.archived
+
+    def load(self) -> None:
+        """Nothing to read: the branch starts from the parent's state."""
+
+    def entries(self) -> List[Message]:
+        return self.range(0, self.count())
+
+    def count(self) -> int:
+        return self.base + len(self.local)
+
+    def tail(self, n: int) -> List[Message]:
+        if n <= 0:
+            return []
+        total = self.count()
+        return self.range(total - n, total)
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        start = max(start, 0)
+        stop = min(stop, self.count())
+        if start >= stop:
+            return []
+        result: List[Message] = []
+        if start < self.base:
+            with self._parent_lock:
+                result.extend(self.parent.range(start, min(stop, self.base)))
+        if stop > self.base:
+            result.extend(self.local[max(start - self.base, 0):stop - self.base])
+        return result
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.local.append(Message.from_dict(entry))
+
+    def set_summary(self, summary: str, watermark: int) -> None:
+        self.summary = summary
+        self.summary_watermark = watermark
+
+    def clear(self) -> None:
+        raise RuntimeError("A branch cannot clear its parent's history; discard the branch instead.")
+
+    def flush(self) -> None:
+        """Branch entries stay in RAM until committed."""
+
+    def save(self) -> None:
+        """Branch entries stay in RAM until committed."""
+
+    def lock(self) -> FileLock:
+        return self.parent.lock()
+
+    def sidecar_path(self, suffix: str) -> str:
+        # Blobs are immutable and content-addressed, so the branch writes them
+        # where the parent will look for them after a commit
+        return self.parent.sidecar_path(suffix)
+
+    def close(self) -> None:
+        """The parent backend stays open; it belongs to the parent manager."""
+
+
+class MemoryBranch(MemoryManager):
+    """
+    Copy-on-write fork of a MemoryManager, created by `MemoryManager.fork()`.
+
+    A branch supports the usual reads, add_entry and get_context_window.
+    It runs without recall indexes, archival, background summarization or
+    persistence of its own. Call `commit()` to append its new entries to the
+    parent, or `discard()` to drop them.
+    """
+
+    # Metadata key keeping when a committed entry was added to the branch
+    BRANCH_TIMESTAMP_METADATA_KEY = "branch_timestamp"
+
+    def __init__(self, parent: MemoryManager):
+        """
+        Fork the parent at its current end.
+
+        Args:
+            parent: Memory manager (or another branch) to branch off.
+        """
+        self.parent = parent
+        self._fork_tree = parent.summary_tree
+        super().__init__(
+            memory_file=parent.memory_file,
+            backend=BranchBackend(parent.backend, parent._lock),
+            background_summary=False,
+            write_behind=False,
+            recall=False,
+            keyword_recall=False,
+            archive_horizon=0,
+            shared=False,
+            dedup=False,
+            blob_threshold=parent.blob_threshold,
+        )
+        # Collapse repeats like the parent; bodies are already deduplicated there
+        self.dedup = parent.dedup
+
+    def _load_summary_tree(self) -> None:
+        # Summary trees are immutable, so the branch shares the parent's
+        self._use_summary_tree(self._fork_tree)
+
+    def _save_summary_tree(self) -> None:
+        """A branch's summary only reaches disk through commit()."""
+
+    @property
+    def base(self) -> int:
+        """History position the branch was forked at."""
+        return self.backend.base
+
+    def commit(self) -> int:
+        """
+        Appends the branch's new entries to the parent and closes the branch.
+
+        If the parent gained entries since the fork, the branch entries are
+        appended after them. If the parent is unchanged, the summary the
+        branch computed is adopted as well.
+
+        Committed entries are stamped with the commit time (never earlier
+        than the parent's newest entry), so the parent's timestamps keep
+        increasing for `since()`; the time each was added to the branch is
+        kept under "branch_timestamp".
+
+        Returns:
+            Number of entries committed.
+
+        Raises:
+            RuntimeError: If the branch is closed or the parent was cleared after the fork.
+        """
+        if self._closed:
+            raise RuntimeError("This branch was already committed or discarded.")
+        parent = self.parent
+        with parent._exclusive():
+            if parent.backend.count() < self.base:
+                raise RuntimeError("The parent memory was cleared after the fork; discard the branch.")
+            entries = self._restamped(parent)
+            unchanged = parent.backend.count() == self.base and parent.summary_tree is self._fork_tree
+            parent._extend(entries)
+            if unchanged and self.summary_tree is not self._fork_tree:
+                parent._summary_base = self._fork_tree
+                parent._apply_summary(self.summary_tree)
+        self.close()
+        return len(entries)
+
+    def _restamped(self, parent: MemoryManager) -> List[Message]:
+        """Branch entries stamped as added now; call with the parent's lock held."""
+        now = time.time()
+        total = parent.backend.count()
+        if total:
+            now = max(now, parent._entry_timestamp(total - 1))
+        entries = []
+        for entry in self.backend.local:
+            metadata = dict(entry.metadata)
+            if self.TIMESTAMP_METADATA_KEY in metadata:
+                metadata[self.BRANCH_TIMESTAMP_METADATA_KEY] = metadata[self.TIMESTAMP_METADATA_KEY]
+            metadata[self.TIMESTAMP_METADATA_KEY] = now
+            entries.append(Message(entry.role, entry.content, metadata))
+        return entries
+
+    def clear_memory(self):
+        """
+        Not supported: the history before the fork belongs to the parent.
+
+        Raises:
+            RuntimeError: Always; use discard() to drop the branch's entries.
+        """
+        raise RuntimeError("A branch cannot clear its parent's history; discard the branch instead.")
+
+    def discard(self) -> None:
+        """Drops the branch's entries and closes the branch."""
+        self.backend.local = []
+        self.close()
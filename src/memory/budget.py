@@ -0,0 +1,198 @@
+"""
+Token budgeting for prompt assembly.
+
+Splits a model-specific context budget across the parts of an agent prompt
+(.context knowledge, tool list, summary, recent history and the current tool
+observation) and provides cheap per-entry token counts that are computed once
+and cached in the entry metadata.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, Mapping, Optional
+
+# Rough heuristic shared by Gemini and OpenAI tokenizers for English text
+CHARS_PER_TOKEN = 4
+
+# Context window sizes (tokens) by model name prefix; longest prefix wins
+MODEL_CONTEXT_TOKENS: Dict[str, int] = {
+    "gemini-1.5-pro": 2_097_152,
+    "gemini-1.5-flash": 1_048_576,
+    "gemini-2.0": 1_048_576,
+    "gemini-2.5": 1_048_576,
+    "gemini-3": 1_048_576,
+    "gpt-4o": 128_000,
+    "gpt-4.1": 1_047_576,
+    "llama3": 8_192,
+}
+DEFAULT_CONTEXT_TOKENS = 32_000
+
+# Metadata key holding an entry's cached token count
+TOKENS_METADATA_KEY = "tokens"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Args:
+        text: The text to measure.
+
+    Returns:
+        Approximate token count (never negative).
+    """
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def entry_tokens(entry: Mapping[str, Any]) -> int:
+    """
+    Return the token count of a history entry, caching it in the entry metadata.
+
+    Args:
+        entry: History entry with "role", "content" and "metadata" keys.
+
+    Returns:
+        Approximate token count of the rendered entry.
+    """
+    metadata = entry.get("metadata")
+    if isinstance(metadata, dict):
+        cached = metadata.get(TOKENS_METADATA_KEY)
+        if isinstance(cached, int):
+            return cached
+    # Role prefix and separator as rendered by the agent ("ROLE: content")
+    tokens = estimate_tokens(f"{entry.get('role', '')}: {entry.get('content', '')}")
+    if isinstance(metadata, dict):
+        metadata[TOKENS_METADATA_KEY] = tokens
+    return tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Trim text so it fits in a token budget, marking the cut.
+
+    Args:
+        text: The text to trim.
+        max_tokens: Maximum number of tokens to keep.
+
+    Returns:
+        The original text if it fits, otherwise its head followed by a marker.
+        A budget too small for the marker and some text gets the head alone;
+        the result never exceeds max_tokens.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget_chars = max(max_tokens, 0) * CHARS_PER_TOKEN
+    marker = "\n[... truncated to fit the context budget ...]"
+    keep_chars = budget_chars - len(marker)
+    if keep_chars <= 0:
+        return text[:budget_chars]
+    return text[:keep_chars] + marker
+
+
+def model_context_tokens(model_name: str) -> int:
+    """
+    Look up the context window size of a model.
+
+    Args:
+        model_name: Model identifier such as "gemini-2.0-flash-exp".
+
+    Returns:
+        Context size in tokens, or DEFAULT_CONTEXT_TOKENS for unknown models.
+    """
+    name = (model_name or "").lower()
+    matches = [prefix for prefix in MODEL_CONTEXT_TOKENS if name.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_TOKENS
+    return MODEL_CONTEXT_TOKENS[max(matches, key=len)]
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    """Token allowance for each section of a prompt."""
+
+    total: int
+    knowledge: int
+    tools: int
+    summary: int
+    history: int
+    observation: int
+
+
+class TokenBudgetAllocator:
+    """
+    Splits a context budget across prompt sections.
+
+    Fixed sections (knowledge, tools, summary, observation) get what they need
+    up to a share cap; everything left over, including the headroom of
+    sections that need less than their cap, goes to recent history.
+    """
+
+    DEFAULT_SHARES: Dict[str, float] = {
+        "knowledge": 0.25,
+        "tools": 0.20,
+        "summary": 0.10,
+        "observation": 0.25,
+    }
+
+    def __init__(
+        self,
+        total_tokens: int,
+        output_reserve: float = 0.1,
+        shares: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Initialize the allocator.
+
+        Args:
+            total_tokens: Context window size of the model.
+            output_reserve: Fraction of the window kept free for the model's reply.
+            shares: Maximum fraction of the usable budget per fixed section.
+
+        Raises:
+            ValueError: If the budget is not positive or shares exceed the budget.
+        """
+        if total_tokens < 1:
+            raise ValueError("total_tokens must be at least 1.")
+        self.shares = dict(self.DEFAULT_SHARES)
+        self.shares.update(shares or {})
+        if sum(self.shares.values()) >= 1:
+            raise ValueError("Section shares must leave room for history.")
+        self.total_tokens = total_tokens
+        self.usable_tokens = int(total_tokens * (1 - output_reserve))
+
+    def allocate(
+        self,
+        knowledge: str = "",
+        tools: str = "",
+        summary: str = "",
+        observation: str = "",
+        growing: Collection[str] = (),
+    ) -> PromptBudget:
+        """
+        Compute the budget for one prompt.
+
+        Args:
+            knowledge: Loaded .context knowledge block.
+            tools: Rendered tool list.
+            summary: Current rolling summary.
+            observation: Tool observation to include verbatim.
+            growing: Sections whose text may grow before the prompt is built
+                (e.g. "summary" when the window may summarize); they are
+                granted their whole cap instead of their current size.
+
+        Returns:
+            PromptBudget with the tokens granted to each section.
+        """
+        granted = {}
+        for section, text in (
+            ("knowledge", knowledge),
+            ("tools", tools),
+            ("summary", summary),
+            ("observation", observation),
+        ):
+            cap = int(self.usable_tokens * self.shares[section])
+            granted[section] = cap if section in growing else min(estimate_tokens(text), cap)
+
+        history = self.usable_tokens - sum(granted.values())
+        return PromptBudget(total=self.usable_tokens, history=history, **granted)
@@ -0,0 +1,300 @@
+"""
+Content-addressed storage of message bodies.
+
+Retry-heavy workloads repeat the same request and the same answer many
+times. ContentStore keeps each distinct message body once, keyed by its
+hash, in an append-only sidecar file; DedupBackend wraps a storage backend
+so the history only holds a short reference per entry. Entries read back
+share one string object per distinct body, so duplicates cost no extra RAM
+either.
+
+BlobStore keeps very large payloads (e.g. tool observations) out of line,
+one file per blob, so the history only carries a preview and a handle and
+the full text is read from disk only when somebody asks for it.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.memory.backends.base import FileLock, MemoryBackend
+from src.memory.message import Message
+
+# Metadata key of a stored entry whose body lives in the ContentStore
+CONTENT_REF_KEY = "content_ref"
+
+
+class ContentStore:
+    """
+    Append-only store of message bodies addressed by hash.
+
+    File format, one JSON object per line:
+        {"h": "<digest>", "c": "<body>"}
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        """
+        Initialize the store.
+
+        Args:
+            path: File holding the bodies.
+            fsync: Force each new body to stable storage before put() returns.
+        """
+        self.path = path
+        self.fsync = fsync
+        self._bodies: Dict[str, str] = {}
+        # Bytes of the file already read; bodies appended by other processes follow
+        self._offset: int = 0
+
+    @staticmethod
+    def digest(content: str) -> str:
+        """Returns the address of a body (128-bit SHA-256 prefix, hex)."""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+    def __len__(self) -> int:
+        return len(self._bodies)
+
+    def load(self) -> None:
+        """Reads every stored body."""
+        self._bodies = {}
+        self._offset = 0
+        self._read_new()
+
+    def _read_new(self) -> None:
+        """Reads complete lines appended since the last read; a torn last line is left for later."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+                self._bodies.setdefault(record["h"], record["c"])
+            except (ValueError, KeyError, TypeError):
+                print(f"Warning: Skipping corrupt record in {self.path}.")
+        self._offset += end
+
+    def put(self, content: str) -> str:
+        """
+        Stores a body unless it is already present.
+
+        Args:
+            content: Message body.
+
+        Returns:
+            The body's digest.
+        """
+        digest = self.digest(content)
+        if digest in self._bodies:
+            return digest
+        line = json.dumps({"h": digest, "c": content}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with open(self.path, 'ab') as f:
+            f.write(line.encode("utf-8"))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self._offset = f.tell()
+        self._bodies[digest] = content
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        """
+        Returns the body stored under a digest.
+
+        Bodies another process added since the last read are picked up on a miss.
+
+        Args:
+            digest: Address returned by put().
+
+        Returns:
+            The body, or None if it is not stored.
+        """
+        content = self._bodies.get(digest)
+        if content is None:
+            self._read_new()
+            content = self._bodies.get(digest)
+        return content
+
+    def clear(self) -> None:
+        """Deletes every stored body."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._bodies = {}
+        self._offset = 0
+
+
+class BlobStore:
+    """
+    Directory of immutable blobs, one file per distinct payload.
+
+    Layout:
+        <directory>/<digest[:2]>/<digest>
+    """
+
+    def __init__(self, directory: str, fsync: bool = False):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Directory holding the blob files.
+            fsync: Force each new blob to stable storage before put() returns.
+        """
+        self.directory = directory
+        self.fsync = fsync
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, content: str) -> str:
+        """
+        Writes a payload unless an identical one is already stored.
+
+        Args:
+            content: Payload text.
+
+        Returns:
+            The handle (digest) to load it back with.
+        """
+        digest = ContentStore.digest(content)
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique temp name: blobs are written without holding the memory lock
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        """
+        Reads a payload.
+
+        Args:
+            digest: Handle returned by put().
+
+        Returns:
+            The payload, or None if it is not stored.
+        """
+        try:
+            with open(self._path(digest), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def clear(self) -> None:
+        """Deletes every blob."""
+        if not os.path.isdir(self.directory):
+            return
+        for root, _dirs, files in os.walk(self.directory, topdown=False):
+            for name in files:
+                os.remove(os.path.join(root, name))
+            os.rmdir(root)
+
+
+class DedupBackend(MemoryBackend):
+    """
+    Stores entry bodies in a ContentStore and references in the wrapped backend.
+
+    Bodies shorter than `min_chars` stay inline, where a reference would not
+    be smaller. Entries are resolved back to their full content on every read.
+    """
+
+    def __init__(self, inner: MemoryBackend, store: ContentStore, min_chars: int = 64):
+        """
+        Initialize the deduplicating backend.
+
+        Args:
+            inner: Backend persisting the history.
+            store: Store receiving the entry bodies.
+            min_chars: Shortest body stored by reference.
+        """
+        super().__init__(inner.path, inner.fsync)
+        self.inner = inner
+        self.store = store
+        self.min_chars = min_chars
+
+    def load(self) -> None:
+        self.inner.load()
+        self.store.load()
+        self._sync_state()
+
+    def _sync_state(self) -> None:
+        self.summary = self.inner.summary
+        self.summary_watermark = self.inner.summary_watermark
+        self.archived = self.inner.archived
+
+    def _resolve(self, entry: Message) -> Message:
+        digest = entry.metadata.get(CONTENT_REF_KEY)
+        if digest is None:
+            return entry
+        content = self.store.get(digest)
+        if content is None:
+            print(f"Warning: Memory body {digest} is missing from {self.store.path}.")
+            content = ""
+        return Message(entry.role, content, entry.metadata)
+
+    def entries(self) -> List[Message]:
+        return [self._resolve(entry) for entry in self.inner.entries()]
+
+    def count(self) -> int:
+        return self.inner.count()
+
+    def tail(self, n: int) -> List[Message]:
+        return [self._resolve(entry) for entry in self.inner.tail(n)]
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        return [self._resolve(entry) for entry in self.inner.range(start, stop)]
+
+    def iter_range(self, start: int, stop: int, page_size: int = 1000) -> Iterator[Message]:
+        for entry in self.inner.iter_range(start, stop, page_size):
+            yield self._resolve(entry)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        entry = Message.from_dict(entry)
+        if isinstance(entry.content, str) and len(entry.content) >= self.min_chars:
+            # The body is on disk before any entry refers to it
+            digest = self.store.put(entry.content)
+            entry = Message(entry.role, "", dict(entry.metadata, **{CONTENT_REF_KEY: digest}))
+        self.inner.append(entry)
+
+    def set_summary(self, summary: str, watermark: int) -> None:
+        self.inner.set_summary(summary, watermark)
+        self._sync_state()
+
+    def clear(self) -> None:
+        self.inner.clear()
+        self.store.clear()
+        self._sync_state()
+
+    def drop_head(self, n: int) -> None:
+        self.inner.drop_head(n)
+        self._sync_state()
+
+    def flush(self) -> None:
+        self.inner.flush()
+
+    def save(self) -> None:
+        self.inner.save()
+
+    def lock(self) -> FileLock:
+        return self.inner.lock()
+
+    def refresh(self) -> bool:
+        changed = self.inner.refresh()
+        self._sync_state()
+        return changed
+
+    def sidecar_path(self, suffix: str) -> str:
+        return self.inner.sidecar_path(suffix)
+
+    def close(self) -> None:
+        self.inner.close()
@@ -0,0 +1,175 @@
+"""
+BM25 keyword recall over agent history.
+
+An incrementally maintained inverted index that finds messages by exact
+terms: ticket keys, function names, hostnames and other identifiers that a
+rolling summary tends to drop. Postings are appended in position order, so
+adding an entry is O(terms in the entry) and a query only walks the posting
+lists of its own terms.
+"""
+
+import bisect
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Identifiers may contain inner punctuation: PROJ-123, get_context_window, db-01.example.com
+_IDENTIFIER = re.compile(r"\w(?:[\w.\-/:]*\w)?", re.UNICODE)
+_PART = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search terms.
+
+    Compound identifiers are indexed whole and by their parts, so
+    "db-staging-07" matches queries for "db-staging-07" and for "staging".
+
+    Args:
+        text: Text to tokenize.
+
+    Returns:
+        List of terms, in order, possibly with repeats.
+    """
+    terms: List[str] = []
+    for identifier in _IDENTIFIER.findall(text.lower()):
+        terms.append(identifier)
+        parts = _PART.findall(identifier)
+        if len(parts) > 1 or (parts and parts[0] != identifier):
+            terms.extend(parts)
+    return terms
+
+
+class BM25Index:
+    """
+    Append-only Okapi BM25 index.
+
+    Position i in the index corresponds to history position i.
+    """
+
+    # Suffix of the file the index is saved to, next to the memory file
+    sidecar_suffix = ".bm25.json"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation.
+            b: Document length normalization strength.
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._doc_lengths: List[int] = []
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, text: str) -> int:
+        """
+        Index one entry.
+
+        Args:
+            text: Text of the entry.
+
+        Returns:
+            Position of the new entry.
+        """
+        position = len(self._doc_lengths)
+        terms = tokenize(text)
+        for term, frequency in Counter(terms).items():
+            self._postings.setdefault(term, []).append((position, frequency))
+        self._doc_lengths.append(len(terms))
+        self._total_length += len(terms)
+        return position
+
+    def search(self, query: str, k: int = 5, stop: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Rank entries against a keyword query.
+
+        Args:
+            query: Free-text query.
+            k: Maximum number of results.
+            stop: Only consider positions below this one (defaults to all).
+
+        Returns:
+            (position, BM25 score) pairs, best first.
+        """
+        doc_count = len(self._doc_lengths)
+        if k < 1 or not doc_count:
+            return []
+        limit = doc_count if stop is None else min(stop, doc_count)
+        average_length = self._total_length / doc_count or 1.0
+
+        matched = [
+            (term, self._postings[term]) for term in set(tokenize(query)) if term in self._postings
+        ]
+        # Terms found in most entries add almost nothing to the ranking but cost
+        # a walk over huge posting lists; skip them when rarer terms are present.
+        selective = [(term, postings) for term, postings in matched if len(postings) <= doc_count / 2]
+        scores: Dict[int, float] = {}
+        for term, postings in selective or matched:
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            end = bisect.bisect_left(postings, (limit, 0))
+            for position, frequency in postings[:end]:
+                length_norm = 1 - self.b + self.b * self._doc_lengths[position] / average_length
+                scores[position] = scores.get(position, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                )
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._postings = {}
+        self._doc_lengths = []
+        self._total_length = 0
+
+    def save(self, path: str) -> None:
+        """
+        Persist the index to a JSON file.
+
+        Args:
+            path: Destination file.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(
+                {"doc_lengths": self._doc_lengths, "postings": self._postings},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """
+        Restore an index saved by `save`.
+
+        Args:
+            path: File written by `save`.
+
+        Returns:
+            True if the file existed and could be decoded.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._doc_lengths = list(data["doc_lengths"])
+            self._postings = {
+                term: [(position, frequency) for position, frequency in postings]
+                for term, postings in data["postings"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            self.clear()
+            return False
+        self._total_length = sum(self._doc_lengths)
+        return True
@@ -0,0 +1,981 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+from src.config import settings
+from src.memory.archive import SegmentArchive, TieredBackend
+from src.memory.backends import MemoryBackend, backend_options, create_backend, resolve_backend_name
+from src.memory.background import BackgroundSummarizer
+from src.memory.budget import TOKENS_METADATA_KEY, entry_tokens, estimate_tokens, truncate_to_tokens
+from src.memory.content_store import BlobStore, ContentStore, DedupBackend
+from src.memory.keyword_index import BM25Index
+from src.memory.message import Message
+from src.memory.summary_tree import SummaryNode, SummaryTree
+
+
+class MemoryManager:
+    """Memory manager for the agent, persisted through a pluggable storage backend."""
+
+    # Token cap for each recalled message injected into the context window
+    RECALL_SNIPPET_TOKENS = 128
+    RECALL_HEADER = "Relevant earlier messages:\n"
+    # While summarization is deferred, the verbatim tail may grow to this many times max_messages
+    DEFERRED_TAIL_FACTOR = 2
+    # Characters of an out-of-line payload kept inline as its preview (at most blob_threshold)
+    BLOB_PREVIEW_CHARS = 1000
+    # Metadata keys of an entry whose full content lives in the blob store
+    BLOB_METADATA_KEY = "blob"
+    BLOB_CHARS_METADATA_KEY = "blob_chars"
+    # Metadata key holding when an entry was added (seconds since the epoch)
+    TIMESTAMP_METADATA_KEY = "timestamp"
+
+    def __init__(
+        self,
+        memory_file: str = settings.MEMORY_FILE,
+        backend: Optional[Union[str, MemoryBackend]] = None,
+        background_summary: Optional[bool] = None,
+        write_behind: Optional[bool] = None,
+        recall: Optional[bool] = None,
+        keyword_recall: Optional[bool] = None,
+        archive_horizon: Optional[int] = None,
+        shared: Optional[bool] = None,
+        dedup: Optional[bool] = None,
+        blob_threshold: Optional[int] = None,
+    ):
+        """
+        Initialize the memory manager.
+
+        Args:
+            memory_file: Path of the memory file.
+            backend: Backend name (e.g. "json", "jsonl", "sqlite") or a MemoryBackend
+                instance. Defaults to settings.MEMORY_BACKEND, then to the memory
+                file extension.
+            background_summary: Run the summarizer on a worker thread instead of
+                inside get_context_window. Defaults to settings.MEMORY_BACKGROUND_SUMMARY.
+            write_behind: Only mark changes dirty and persist them in batches from a
+                flusher thread, at the end of each turn and on close(). Defaults to
+                settings.MEMORY_WRITE_BEHIND.
+            recall: Index every entry for long-term recall so get_context_window
+                can pull relevant old messages back in. Defaults to settings.MEMORY_RECALL.
+            keyword_recall: Maintain a BM25 keyword index for recall of exact terms
+                (ticket keys, identifiers, hostnames). Defaults to
+                settings.MEMORY_KEYWORD_RECALL.
+            archive_horizon: Number of recent entries kept in the hot memory file.
+                Older entries are moved to compressed archive segments between
+                turns and read back only when needed. 0 disables archival;
+                defaults to settings.MEMORY_ARCHIVE_HORIZON.
+            shared: Other processes write to the same memory. Every change is then
+                written through under an inter-process file lock, after merging
+                what the others wrote since the last read. Implies write_behind=False.
+                Defaults to settings.MEMORY_SHARED.
+            dedup: Store each distinct message body once, addressed by its hash, and
+                collapse back-to-back repeats in the context window. Defaults to
+                settings.MEMORY_DEDUP.
+            blob_threshold: Entries longer than this many characters (typically big
+                tool observations) are written to a blob store next to the memory
+                file; history keeps a preview and a handle for `load_blob`. 0 keeps
+                everything inline. Defaults to settings.MEMORY_BLOB_THRESHOLD.
+        """
+        self.memory_file = memory_file
+        if isinstance(backend, MemoryBackend):
+            self.backend = backend
+        else:
+            name = resolve_backend_name(memory_file, backend or settings.MEMORY_BACKEND)
+            self.backend = create_backend(memory_file, name, **backend_options(name))
+        self.dedup = settings.MEMORY_DEDUP if dedup is None else dedup
+        if self.dedup:
+            self.backend = DedupBackend(
+                self.backend,
+                ContentStore(self.backend.sidecar_path(".content.jsonl"), fsync=settings.MEMORY_FSYNC),
+            )
+        self.archive_horizon = (
+            settings.MEMORY_ARCHIVE_HORIZON if archive_horizon is None else archive_horizon
+        )
+        if self.archive_horizon > 0:
+            self.backend = TieredBackend(
+                self.backend,
+                SegmentArchive(
+                    self.backend.sidecar_path(".archive"),
+                    codec=settings.MEMORY_ARCHIVE_CODEC,
+                    fsync=settings.MEMORY_FSYNC,
+                ),
+                segment_size=settings.MEMORY_ARCHIVE_SEGMENT_SIZE,
+            )
+        self.blob_threshold = (
+            settings.MEMORY_BLOB_THRESHOLD if blob_threshold is None else blob_threshold
+        )
+        self.blobs = BlobStore(self.backend.sidecar_path(".blobs"), fsync=settings.MEMORY_FSYNC)
+        # Serializes backend access between callers and the flusher thread
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._closed = False
+        self.summary: str = ""
+        # Number of leading history entries already folded into self.summary
+        self.summary_watermark: int = 0
+        # self.summary is the joined root digests of this tree
+        self.summary_tree = SummaryTree(settings.MEMORY_SUMMARY_CHUNK_SIZE)
+        # Tree last written to the sidecar file, to skip unchanged saves
+        self._saved_tree: Optional[SummaryTree] = None
+        # Bumped on every history change; part of the context window cache key
+        self._version: int = 0
+        # Last window served per _window_key(); the key leaves out the system prompt
+        self._window_cache: Dict[Tuple[Any, ...], Tuple[Message, ...]] = {}
+        self._cache_hits: int = 0
+        self._cache_misses: int = 0
+        self._summarizer_calls: int = 0
+        # Summarization steps started in the current turn, None outside of turn()
+        self._turn_summaries: Optional[int] = None
+        if background_summary is None:
+            background_summary = settings.MEMORY_BACKGROUND_SUMMARY
+        self._background: Optional[BackgroundSummarizer] = (
+            BackgroundSummarizer() if background_summary else None
+        )
+        self.write_behind = settings.MEMORY_WRITE_BEHIND if write_behind is None else write_behind
+        self.shared = settings.MEMORY_SHARED if shared is None else shared
+        if self.shared and self.write_behind:
+            print("Warning: Write-behind is disabled for shared memory; changes are written through.")
+            self.write_behind = False
+        # Summary tree the pending summarization extends
+        self._summary_base: Optional[SummaryTree] = None
+        # Indexes over history positions; each has add/search/clear/save/load
+        self.recall_indexes: List[Any] = []
+        if settings.MEMORY_RECALL if recall is None else recall:
+            self._init_vector_index()
+        self.keyword_index: Optional[BM25Index] = None
+        if settings.MEMORY_KEYWORD_RECALL if keyword_recall is None else keyword_recall:
+            self.keyword_index = BM25Index()
+            self.recall_indexes.append(self.keyword_index)
+        self._load_memory()
+        self._stop_flusher = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if self.write_behind:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="memory-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def _load_memory(self):
+        """Loads memory from the backend if it exists."""
+        if self.shared:
+            with self.backend.lock():
+                self.backend.load()
+        else:
+            self.backend.load()
+        self._load_summary_tree()
+        self._load_recall_indexes()
+        self._invalidate()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Holds the thread lock and, for shared memory, the file lock with other writers' changes merged in."""
+        with self._lock:
+            if not self.shared:
+                yield
+                return
+            with self.backend.lock():
+                self._sync()
+                yield
+
+    @contextmanager
+    def _sidecar_write(self) -> Iterator[None]:
+        """Holds the thread lock and, for shared memory, the file lock while sidecar files are rewritten."""
+        with self._lock:
+            if not self.shared:
+                yield
+                return
+            # Other processes save the same sidecars through the same temp file names
+            with self.backend.lock():
+                yield
+
+    def refresh(self) -> None:
+        """Merges what other processes wrote to shared memory since the last read."""
+        if self.shared:
+            with self._exclusive():
+                pass
+
+    def _sync(self) -> None:
+        """Adopts changes other processes made to the backend; call with the file lock held."""
+        before = self.backend.count()
+        if not self.backend.refresh():
+            return
+        total = self.backend.count()
+        for index in self.recall_indexes:
+            if total < before or len(index) > total:
+                # Memory was cleared elsewhere
+                index.clear()
+        self._catch_up_recall_indexes()
+        self._adopt_backend_summary(self.summary_tree)
+        self._invalidate()
+
+    def _load_summary_tree(self) -> None:
+        """Restores the saved summary tree if it still matches the backend summary."""
+        tree = SummaryTree.load(
+            self.backend.sidecar_path(SummaryTree.sidecar_suffix), settings.MEMORY_SUMMARY_CHUNK_SIZE
+        )
+        self._saved_tree = tree
+        self._adopt_backend_summary(tree or self.summary_tree)
+
+    def _adopt_backend_summary(self, tree: SummaryTree) -> None:
+        """
+        Uses tree if it matches the summary stored in the backend.
+
+        Otherwise (no saved tree, a crash before it was saved, or another
+        process summarized) the stored summary becomes the single seed node
+        of a new tree.
+        """
+        summary = self.backend.summary
+        watermark = self.backend.summary_watermark
+        if tree.covered != watermark or tree.text != summary:
+            tree = SummaryTree.seeded(summary, watermark, settings.MEMORY_SUMMARY_CHUNK_SIZE)
+        self._use_summary_tree(tree)
+
+    def _use_summary_tree(self, tree: SummaryTree) -> None:
+        self.summary_tree = tree
+        self.summary = tree.text
+        self.summary_watermark = tree.covered
+
+    def _save_summary_tree(self) -> None:
+        """Writes the summary tree to its sidecar file if it changed since the last save."""
+        with self._sidecar_write():
+            if self.summary_tree is self._saved_tree:
+                return
+            self.summary_tree.save(self.backend.sidecar_path(SummaryTree.sidecar_suffix))
+            self._saved_tree = self.summary_tree
+
+    def _init_vector_index(self) -> None:
+        """Creates the vector recall index unless numpy is missing."""
+        try:
+            from src.memory.recall import VectorIndex
+        except ImportError as exc:
+            print(f"Warning: Vector recall disabled, numpy is not installed: {exc}")
+            return
+        self.recall_indexes.append(VectorIndex())
+
+    def _load_recall_indexes(self) -> None:
+        """Restores saved recall indexes and embeds entries they are missing."""
+        total = self.backend.count()
+        for index in self.recall_indexes:
+            if not index.load(self.backend.sidecar_path(index.sidecar_suffix)) or len(index) > total:
+                index.clear()
+        self._catch_up_recall_indexes()
+
+    def _catch_up_recall_indexes(self) -> None:
+        """Indexes the entries the recall indexes are missing."""
+        total = self.backend.count()
+        for index in self.recall_indexes:
+            for entry in self.backend.iter_range(len(index), total):
+                index.add(self._entry_text(entry))
+
+    @staticmethod
+    def _entry_text(entry: Dict[str, Any]) -> str:
+        return f"{entry.get('role', '')}: {entry.get('content', '')}"
+
+    def _invalidate(self) -> None:
+        """Marks the history as changed, dropping cached context windows."""
+        self._version += 1
+        self._window_cache.clear()
+
+    def save_memory(self):
+        """Saves a full snapshot of the current memory state."""
+        with self._exclusive():
+            self.backend.set_summary(self.summary, self.summary_watermark)
+            self.backend.save()
+            self._dirty = False
+
+    def _persist(self) -> None:
+        """Flushes backend changes now, or marks them dirty in write-behind mode."""
+        if self.write_behind:
+            self._dirty = True
+        else:
+            self.backend.flush()
+
+    def flush(self) -> None:
+        """Writes pending changes to the backend in one batch."""
+        with self._lock:
+            if self._dirty:
+                self.backend.flush()
+                self._dirty = False
+
+    def archive(self) -> int:
+        """
+        Moves entries older than the archive horizon out of the hot memory file.
+
+        Runs automatically at the end of every turn and on close().
+
+        Returns:
+            Number of entries archived (0 when archival is disabled).
+        """
+        if not isinstance(self.backend, TieredBackend):
+            return 0
+        with self._exclusive():
+            moved = self.backend.archive_older_than(self.archive_horizon)
+            if moved:
+                # Trimming the hot file flushed every pending change with it
+                self._dirty = False
+            return moved
+
+    def _flush_loop(self) -> None:
+        """Flusher thread body: group-commits dirty state on a short interval."""
+        while not self._stop_flusher.wait(settings.MEMORY_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"Warning: Background memory flush failed: {exc}")
+
+    def add_entry(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Adds a new interaction to memory.
+
+        The entry's metadata records when it was added (see `since`). Content
+        longer than `blob_threshold` characters is stored out of line; the
+        entry keeps a preview and the blob handle in its metadata.
+        """
+        metadata = dict(metadata or {})
+        metadata.setdefault(self.TIMESTAMP_METADATA_KEY, time.time())
+        if self.blob_threshold > 0 and isinstance(content, str) and len(content) > self.blob_threshold:
+            # Written before taking the lock; the blob is immutable and content-addressed
+            handle = self.blobs.put(content)
+            metadata[self.BLOB_METADATA_KEY] = handle
+            metadata[self.BLOB_CHARS_METADATA_KEY] = len(content)
+            preview_chars = min(self.BLOB_PREVIEW_CHARS, self.blob_threshold)
+            content = (
+                f"{content[:preview_chars]}\n"
+                f"[... {len(content) - preview_chars} more characters stored as blob {handle}]"
+            )
+        entry = Message(role, content, metadata)
+        # Computed once here and cached in metadata for token budgeting
+        entry_tokens(entry)
+        with self._exclusive():
+            self._extend([entry])
+
+    def _extend(self, entries: List[Message]) -> None:
+        """Appends prepared entries in one batch; call inside _exclusive()."""
+        self.backend.extend(entries)
+        for entry in entries:
+            for index in self.recall_indexes:
+                index.add(self._entry_text(entry))
+        self._persist()
+        self._invalidate()
+
+    def fork(self) -> "MemoryManager":
+        """
+        Returns a copy-on-write branch of this memory.
+
+        The branch shares the history up to now and the summary tree instead
+        of copying them; entries added to it stay in RAM until the branch is
+        committed back with `commit()` or dropped with `discard()`.
+
+        Returns:
+            A MemoryBranch (see src.memory.branch).
+        """
+        from src.memory.branch import MemoryBranch
+
+        self.refresh()
+        self._collect_background_summary()
+        with self._lock:
+            return MemoryBranch(self)
+
+    def load_blob(self, handle: str) -> str:
+        """
+        Reads an out-of-line payload from disk.
+
+        Args:
+            handle: Value of an entry's "blob" metadata.
+
+        Returns:
+            The full payload.
+
+        Raises:
+            KeyError: If no blob is stored under handle.
+        """
+        content = self.blobs.get(handle)
+        if content is None:
+            raise KeyError(f"No memory blob {handle}.")
+        return content
+
+    def full_content(self, entry: Mapping[str, Any]) -> str:
+        """
+        Returns the complete content of a history entry, loading its blob if it has one.
+
+        Args:
+            entry: Entry from get_history() or a context window.
+        """
+        metadata = entry.get("metadata") or {}
+        handle = metadata.get(self.BLOB_METADATA_KEY)
+        if handle is None:
+            return entry.get("content", "")
+        return self.load_blob(handle)
+
+    def get_history(self) -> List[Message]:
+        """
+        Returns the full conversation history, including archived entries.
+
+        This materializes every entry; prefer count(), tail(), iter_range()
+        or since() on hot paths.
+        """
+        self.refresh()
+        with self._lock:
+            return self.backend.entries()
+
+    def count(self) -> int:
+        """Returns the number of history entries, including archived ones."""
+        self.refresh()
+        with self._lock:
+            return self.backend.count()
+
+    def tail(self, n: int) -> List[Message]:
+        """
+        Returns the last `n` history entries, oldest first.
+
+        Args:
+            n: Number of entries to return.
+        """
+        self.refresh()
+        with self._lock:
+            return self.backend.tail(n)
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None, page_size: int = 1000) -> Iterator[Message]:
+        """
+        Yields history entries with positions in [start, stop), one page at a time.
+
+        Args:
+            start: Position of the first entry.
+            stop: Position after the last entry; defaults to the current count.
+            page_size: Number of entries read from the backend at once.
+        """
+        self.refresh()
+        return self._iter_range(start, stop, page_size)
+
+    def _iter_range(self, start: int, stop: Optional[int], page_size: int = 1000) -> Iterator[Message]:
+        """iter_range without the shared-memory refresh; holds the lock only while reading a page."""
+        with self._lock:
+            total = self.backend.count()
+        stop = total if stop is None else min(stop, total)
+        for page_start in range(max(start, 0), stop, page_size):
+            with self._lock:
+                page = self.backend.range(page_start, min(page_start + page_size, stop))
+            yield from page
+
+    def since(self, timestamp: float) -> Iterator[Message]:
+        """
+        Yields the entries added at or after a point in time, oldest first.
+
+        The first such entry is found by binary search over positions, so
+        only O(log n) entries are read before the result starts. Entries
+        written before timestamps were recorded count as older than any time.
+
+        Args:
+            timestamp: Seconds since the epoch, as returned by time.time().
+        """
+        self.refresh()
+        with self._lock:
+            total = self.backend.count()
+            # Leftmost position whose timestamp is >= timestamp
+            start, stop = 0, total
+            while start < stop:
+                middle = (start + stop) // 2
+                if self._entry_timestamp(middle) < timestamp:
+                    start = middle + 1
+                else:
+                    stop = middle
+        return self._iter_range(start, total)
+
+    def _entry_timestamp(self, position: int) -> float:
+        metadata = self.backend.range(position, position + 1)[0].metadata
+        value = metadata.get(self.TIMESTAMP_METADATA_KEY)
+        return value if isinstance(value, (int, float)) else float("-inf")
+
+    def _default_summarizer(self, old_messages: List[Dict[str, Any]], previous_summary: str) -> str:
+        """
+        Fallback summarization that compacts old messages.
+        Concatenates previous summary (if any) with role-tagged message content.
+        """
+        lines: List[str] = []
+        if previous_summary:
+            lines.append(previous_summary.strip())
+        for message in old_messages:
+            role = message.get("role", "unknown")
+            content = message.get("content", "")
+            lines.append(f"{role}: {content}")
+        return "\n".join(lines).strip()
+
+    def get_context_window(
+        self,
+        system_prompt: str,
+        max_messages: int,
+        summarizer: Optional[Callable[[List[Dict[str, Any]], str], str]] = None,
+        max_tokens: Optional[int] = None,
+        query: Optional[str] = None,
+        recall_k: Optional[int] = None,
+        summary_tokens: Optional[int] = None,
+    ) -> Sequence[Message]:
+        """
+        Returns the context window, applying a summary buffer when history exceeds max_messages.
+
+        The summary is a summary tree (see `summary_tree`): messages pushed out of
+        the window since the last call (those past `summary_watermark`) are
+        digested in fixed-size chunks, full chunks are merged upward, and the
+        summary is the O(log n) cached root digests joined together. Each
+        summarizer call therefore sees at most one chunk of messages and its
+        running digest, or two digests to merge, however long the history is.
+        A build digests at most one chunk (plus the merges it carries); a
+        longer backlog is left to later builds and served as deferred below.
+
+        When max_tokens is given, the verbatim tail is the longest run of recent
+        messages (up to max_messages) whose cached token counts fit the budget.
+
+        Everything after the system prompt is memoized on (history version,
+        summary, max_messages, max_tokens, query, recall_k), so rebuilding the
+        same window is free even when the system prompt differs (think() and
+        act() use different ones); only the system message is swapped.
+        Inside `turn()` the summarizer runs at most once; later builds in that
+        turn defer summarization the same way the background mode does.
+
+        With background summarization enabled, the summarizer runs on a worker
+        thread: until its result is ready the window serves the last completed
+        summary plus a verbatim tail of up to 2 * max_messages messages (still
+        within max_tokens). Uncovered messages older than that are left out
+        until the summary catches up, or reach the window through recall.
+
+        With recall enabled and a query given, the recall_k most relevant messages
+        older than the verbatim tail are injected after the summary. Their
+        block is reserved out of max_tokens before the tail is fitted.
+
+        The window is an immutable tuple sharing the stored Message objects, so
+        building or re-serving it never copies history.
+
+        Args:
+            system_prompt: The system prompt to prepend.
+            max_messages: Maximum number of recent history messages to keep verbatim.
+            summarizer: Callable that receives (old_messages, previous_summary) and returns a summary string.
+            max_tokens: Optional token budget for the verbatim history messages
+                (and the recall block, when one is injected).
+            query: Text to recall relevant older messages for (usually the task).
+            recall_k: Number of messages to recall; defaults to settings.MEMORY_RECALL_K.
+            summary_tokens: Optional token budget for the summary message; a longer
+                summary is truncated.
+
+        Raises:
+            ValueError: If system_prompt is empty, max_messages is invalid, or summarizer returns non-string.
+            TypeError: If summarizer does not accept the required arguments.
+        """
+        if not system_prompt:
+            raise ValueError("system_prompt is required to build the context window.")
+        if max_messages < 1:
+            raise ValueError("max_messages must be at least 1.")
+        if max_tokens is not None and max_tokens < 0:
+            raise ValueError("max_tokens must not be negative.")
+        if summary_tokens is not None and summary_tokens < 0:
+            raise ValueError("summary_tokens must not be negative.")
+
+        self.refresh()
+        self._collect_background_summary()
+        if recall_k is None:
+            recall_k = settings.MEMORY_RECALL_K
+        if not self.recall_indexes:
+            query = None
+        key = self._window_key(max_messages, max_tokens, query, recall_k, summary_tokens)
+        cached = self._window_cache.get(key)
+        if cached is not None:
+            self._cache_hits += 1
+            if cached[0].content != system_prompt:
+                cached = self._window_cache[key] = (Message("system", system_prompt), *cached[1:])
+            return cached
+        self._cache_misses += 1
+
+        with self._lock:
+            total = self.backend.count()
+            recent = self.backend.tail(max_messages)
+        # Token budget of the verbatim tail
+        tail_tokens = max_tokens
+        if tail_tokens is not None:
+            recent = self._fit_tokens(recent, tail_tokens)
+            if len(recent) < total and query and recall_k > 0:
+                # Older messages will be recalled: make room for their block
+                tail_tokens = max(tail_tokens - self._recall_tokens(recall_k), 0)
+                recent = self._fit_tokens(recent, tail_tokens)
+        cutoff = total - len(recent)
+
+        if cutoff == 0:
+            if self.dedup:
+                recent = self._collapse_repeats(recent)
+            history = tuple(recent)
+        else:
+            self._seed_legacy_summary(cutoff)
+            self._summarize_until(cutoff, summarizer or self._default_summarizer)
+            start = cutoff
+            if self.summary_watermark < cutoff:
+                # Summarization is deferred: keep a somewhat longer tail of the entries
+                # the summary does not cover yet; older ones wait for it (or for recall)
+                start = max(self.summary_watermark, total - self.DEFERRED_TAIL_FACTOR * max_messages)
+            with self._lock:
+                recent_history = self.backend.range(start, total)
+            if tail_tokens is not None and start < cutoff:
+                recent_history = self._fit_tokens(recent_history, tail_tokens)
+                start = total - len(recent_history)
+            if self.dedup:
+                recent_history = self._collapse_repeats(recent_history)
+
+            summary = self.summary
+            if summary_tokens is not None:
+                summary = truncate_to_tokens(summary, summary_tokens)
+            summary_message = Message("system", f"Previous Summary: {summary}")
+            recalled = self.recall(query, recall_k, stop=start) if query and recall_k > 0 else []
+            if recalled:
+                history = (summary_message, self._recall_message(recalled), *recent_history)
+            else:
+                history = (summary_message, *recent_history)
+
+        window = (Message("system", system_prompt), *history)
+        if not (cutoff > self.summary_watermark and self._can_summarize()):
+            # Keyed after summarizing, since that changes the summary and version.
+            # A window whose summary the next build would extend is not cached.
+            key = self._window_key(max_messages, max_tokens, query, recall_k, summary_tokens)
+            self._window_cache[key] = window
+        return window
+
+    def _window_key(
+        self,
+        max_messages: int,
+        max_tokens: Optional[int],
+        query: Optional[str],
+        recall_k: int,
+        summary_tokens: Optional[int],
+    ) -> Tuple[Any, ...]:
+        """Cache key of a context window; any system prompt can be served from the same entry."""
+        return (self._version, self.summary, max_messages, max_tokens, query, recall_k, summary_tokens)
+
+    def recall(self, query: str, k: int, stop: Optional[int] = None) -> List[Tuple[int, Message]]:
+        """
+        Finds the history entries most relevant to a query.
+
+        Results of several recall indexes are merged by reciprocal rank fusion.
+
+        Args:
+            query: Free-text query.
+            k: Maximum number of entries to return.
+            stop: Only consider positions below this one (defaults to all).
+
+        Returns:
+            (position, entry) pairs, most relevant first.
+        """
+        fused: Dict[int, float] = {}
+        for index in self.recall_indexes:
+            for rank, (position, _score) in enumerate(index.search(query, k, stop=stop)):
+                fused[position] = fused.get(position, 0.0) + 1.0 / (60 + rank)
+        positions = sorted(fused, key=fused.get, reverse=True)[:k]
+        with self._lock:
+            return [(position, self.backend.range(position, position + 1)[0]) for position in positions]
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, Message]]:
+        """
+        Finds history entries containing the query's keywords, ranked by BM25.
+
+        Args:
+            query: Keywords or identifiers to look for.
+            k: Maximum number of entries to return.
+
+        Returns:
+            (position, entry) pairs, best match first.
+
+        Raises:
+            RuntimeError: If keyword recall is not enabled.
+        """
+        if self.keyword_index is None:
+            raise RuntimeError("Keyword recall is disabled; enable MEMORY_KEYWORD_RECALL.")
+        with self._lock:
+            return [
+                (position, self.backend.range(position, position + 1)[0])
+                for position, _score in self.keyword_index.search(query, k)
+            ]
+
+    def _recall_tokens(self, k: int) -> int:
+        """Upper bound on the tokens of a recall block of k entries (see _recall_message)."""
+        # Header, plus a "- role: " prefix per entry on top of its snippet
+        return estimate_tokens(f"system: {self.RECALL_HEADER}") + k * (self.RECALL_SNIPPET_TOKENS + 8)
+
+    def _recall_message(self, recalled: List[Tuple[int, Message]]) -> Message:
+        """Renders recalled entries as one system message, oldest first."""
+        lines = [
+            f"- {entry.get('role', 'unknown')}: "
+            f"{truncate_to_tokens(str(entry.get('content', '')), self.RECALL_SNIPPET_TOKENS)}"
+            for _position, entry in sorted(recalled, key=lambda item: item[0])
+        ]
+        return Message("system", self.RECALL_HEADER + "\n".join(lines))
+
+    @staticmethod
+    def _fit_tokens(messages: List[Message], max_tokens: int) -> List[Message]:
+        """
+        Returns the longest suffix of messages that fits in max_tokens.
+
+        Args:
+            messages: Candidate messages, oldest first.
+            max_tokens: Token budget for the returned messages.
+
+        Returns:
+            The fitting suffix, possibly empty.
+        """
+        used = 0
+        keep = 0
+        for message in reversed(messages):
+            used += entry_tokens(message)
+            if used > max_tokens:
+                break
+            keep += 1
+        return messages[len(messages) - keep:]
+
+    @staticmethod
+    def _collapse_repeats(messages: Sequence[Message]) -> List[Message]:
+        """
+        Collapses back-to-back repeats of a message or of a two-message exchange.
+
+        A repeated block is kept once and its last message notes how many
+        times it occurred.
+
+        Args:
+            messages: Window messages, oldest first.
+
+        Returns:
+            The messages with repeats collapsed.
+        """
+        kept: List[Message] = []
+        # (occurrences, block length) of the block ending at each kept message
+        repeats: List[Tuple[int, int]] = []
+        i = 0
+        while i < len(messages):
+            for period in (1, 2):
+                block = messages[i:i + period]
+                if (
+                    len(block) == period <= len(kept)
+                    # The kept block must not already stand for repeats of another length
+                    and all(count == 1 for count, _ in repeats[-period:-1])
+                    and (repeats[-1][0] == 1 or repeats[-1][1] == period)
+                    and all(
+                        old.role == new.role and old.content == new.content
+                        for old, new in zip(kept[-period:], block)
+                    )
+                ):
+                    repeats[-1] = (repeats[-1][0] + 1, period)
+                    i += period
+                    break
+            else:
+                kept.append(messages[i])
+                repeats.append((1, 1))
+                i += 1
+
+        result: List[Message] = []
+        for message, (occurrences, period) in zip(kept, repeats):
+            if occurrences > 1:
+                what = "message" if period == 1 else "exchange"
+                metadata = {key: value for key, value in message.metadata.items() if key != TOKENS_METADATA_KEY}
+                message = Message(
+                    message.role, f"{message.content}\n(this {what} was repeated {occurrences} times)", metadata
+                )
+            result.append(message)
+        return result
+
+    @contextmanager
+    def turn(self) -> Iterator["MemoryManager"]:
+        """
+        Scopes one agent turn so it triggers at most one summarization step.
+
+        A step digests one chunk of history, plus the O(log n) merges of
+        sealed nodes that chunk may carry; a longer backlog is digested one
+        step per turn.
+
+        Yields:
+            This memory manager.
+        """
+        self._turn_summaries = 0
+        try:
+            yield self
+        finally:
+            self._turn_summaries = None
+            # Windows built with deferred summarization are only valid in-turn
+            self._window_cache.clear()
+            self.archive()
+            self.flush()
+            self._save_summary_tree()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Returns context window cache statistics.
+
+        Returns:
+            Dictionary with hits, misses, hit_rate and summarizer_calls.
+        """
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "hit_rate": self._cache_hits / lookups if lookups else 0.0,
+            "summarizer_calls": self._summarizer_calls,
+        }
+
+    def _summarize_until(
+        self,
+        cutoff: int,
+        summarizer: Callable[[List[Dict[str, Any]], str], str],
+    ) -> None:
+        """
+        Folds history entries in [summary_watermark, cutoff) into the summary.
+
+        In the foreground one chunk is digested per call (plus the merges it
+        carries), so the summary may stop short of cutoff; the background
+        worker digests the whole range.
+
+        Args:
+            cutoff: Position of the first entry that stays verbatim in the window.
+            summarizer: Callable that receives (old_messages, previous_summary).
+
+        Raises:
+            ValueError: If summarizer returns non-string.
+            TypeError: If summarizer does not accept the required arguments.
+        """
+        if cutoff <= self.summary_watermark or not self._can_summarize():
+            return
+
+        # Paged lazily: the summary tree pulls one chunk at a time
+        chunk_size = self.summary_tree.chunk_size
+        messages_to_summarize = self._iter_range(self.summary_watermark, cutoff, chunk_size)
+        base = self.summary_tree
+        self._summary_base = base
+        if self._turn_summaries is not None:
+            self._turn_summaries += 1
+
+        if self._background is not None:
+            # Read on this thread: the worker only calls the summarizer and never
+            # touches the backend (the list shares the stored Message objects)
+            self._background.submit(
+                lambda messages, _previous_summary: base.extend(messages, summarizer),
+                list(messages_to_summarize),
+                self.summary,
+                cutoff,
+            )
+            return
+
+        try:
+            # One chunk per call keeps a turn's summarization cost bounded however
+            # long the backlog is; later calls (or turns) digest the rest
+            tree, calls = base.extend(messages_to_summarize, summarizer, max_chunks=1)
+        except TypeError as exc:
+            raise TypeError("Summarizer must accept two arguments: (old_messages, previous_summary).") from exc
+
+        self._summarizer_calls += calls
+        self._apply_summary(tree)
+
+    def _seed_legacy_summary(self, cutoff: int) -> None:
+        """
+        Anchors a summary stored without a watermark (by older versions) at cutoff.
+
+        Such a summary already describes the history before the window, so it
+        becomes a seed covering [0, cutoff) instead of all of history being
+        digested again behind it.
+        """
+        tree = self.summary_tree
+        if tree.covered or not tree.text:
+            return
+        self._summary_base = tree
+        self._apply_summary(SummaryTree.seeded(tree.text, cutoff, tree.chunk_size))
+
+    def _can_summarize(self) -> bool:
+        """Whether a summarization step may start now (none yet this turn, no background job running)."""
+        if self._turn_summaries:
+            return False
+        return self._background is None or not self._background.busy
+
+    def _apply_summary(self, tree: SummaryTree) -> None:
+        """
+        Stores an extended summary tree.
+
+        The tree is only applied if the one it extends is still current; with
+        shared memory another process may have summarized first.
+        """
+        with self._exclusive():
+            if self.summary_tree is not self._summary_base:
+                return
+            self._use_summary_tree(tree)
+            self.backend.set_summary(self.summary, self.summary_watermark)
+            self._persist()
+
+    def summary_digests(self, start: int = 0, stop: Optional[int] = None) -> List[SummaryNode]:
+        """
+        Zooms into the summary of a past period.
+
+        Args:
+            start: First history position of interest.
+            stop: Position after the last one; defaults to summary_watermark.
+
+        Returns:
+            The coarsest cached digests covering [start, stop), oldest first.
+            Each node carries its `start`, `stop` and `text`.
+        """
+        return self.summary_tree.digests(start, stop)
+
+    def _collect_background_summary(self, timeout: Optional[float] = 0) -> None:
+        """
+        Applies the background summarizer result if one is ready.
+
+        Args:
+            timeout: Seconds to wait for a running job; 0 never blocks.
+        """
+        if self._background is None:
+            return
+        try:
+            result = self._background.poll(timeout)
+        except Exception as exc:
+            print(f"Warning: Background summarization failed: {exc}")
+            return
+        if result is None:
+            return
+        (tree, calls), _cutoff = result
+        self._summarizer_calls += calls
+        self._apply_summary(tree)
+        self._invalidate()
+
+    def wait_for_summary(self, timeout: Optional[float] = None) -> None:
+        """
+        Blocks until a pending background summary is applied.
+
+        Args:
+            timeout: Maximum seconds to wait; None waits until the job finishes.
+        """
+        self._collect_background_summary(timeout)
+
+    def close(self) -> None:
+        """Finishes pending background work, flushes dirty state and stops worker threads."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._background is not None:
+            self.wait_for_summary()
+            self._background.shutdown()
+        if self._flusher is not None:
+            self._stop_flusher.set()
+            self._flusher.join()
+            self._flusher = None
+        self.archive()
+        self.flush()
+        self._save_summary_tree()
+        with self._sidecar_write():
+            for index in self.recall_indexes:
+                index.save(self.backend.sidecar_path(index.sidecar_suffix))
+        self.backend.close()
+
+    @property
+    def in_turn(self) -> bool:
+        """Whether a turn() scope is currently active."""
+        return self._turn_summaries is not None
+
+    def clear_memory(self):
+        """Clears the agent's memory."""
+        if self._background is not None:
+            self._background.cancel()
+        with self._exclusive():
+            self.backend.clear()
+            self.blobs.clear()
+            self._use_summary_tree(SummaryTree(settings.MEMORY_SUMMARY_CHUNK_SIZE))
+            for index in self.recall_indexes:
+                index.clear()
+            self._persist()
+            self._invalidate()
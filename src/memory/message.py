@@ -0,0 +1,97 @@
+"""
+Compact, immutable representation of a history entry.
+
+A plain dict per message costs a hash table for three fixed keys and invites
+defensive copies wherever history is handed out. Message stores the same
+three fields in `__slots__`, interns the role string (there are only a
+handful of roles across millions of messages) and cannot be modified, so
+context windows can share the stored objects instead of copying them. It
+still behaves as a read-only mapping, so `msg["content"]` and
+`msg.get("role")` keep working.
+"""
+
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+
+class Message(Mapping):
+    """Immutable history entry with `role`, `content` and `metadata` fields."""
+
+    __slots__ = ("role", "content", "metadata")
+
+    _KEYS = ("role", "content", "metadata")
+
+    def __init__(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Initialize a message.
+
+        Args:
+            role: Speaker role ("user", "assistant", "tool", "system", ...).
+            content: Message text.
+            metadata: Extra attributes; the dict is owned by the message from now on.
+        """
+        object.__setattr__(self, "role", sys.intern(str(role)))
+        object.__setattr__(self, "content", content)
+        object.__setattr__(self, "metadata", metadata if metadata is not None else {})
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "Message":
+        """
+        Build a message from a stored entry.
+
+        Args:
+            data: Mapping with "role", "content" and "metadata" keys, or a Message.
+
+        Returns:
+            The message (data itself if it already is one).
+        """
+        if isinstance(data, Message):
+            return data
+        if not isinstance(data, Mapping):
+            data = {}
+        metadata = data.get("metadata")
+        return cls(
+            data.get("role", ""),
+            data.get("content", ""),
+            metadata if isinstance(metadata, dict) else {},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the message as a plain dict (e.g. for JSON serialization)."""
+        return {"role": self.role, "content": self.content, "metadata": self.metadata}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Message is immutable.")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Message is immutable.")
+
+    def __reduce__(self):
+        return (Message, (self.role, self.content, self.metadata))
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r}, metadata={self.metadata!r})"
+
+
+def json_default(value: Any) -> Any:
+    """
+    `default` hook for json.dump/json.dumps that serializes Message objects.
+
+    Raises:
+        TypeError: If value is not a Message.
+    """
+    if isinstance(value, Message):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
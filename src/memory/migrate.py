@@ -0,0 +1,336 @@
+"""
+Streaming migration of a memory file to another storage backend.
+
+Entries are read and written in batches of bounded size, so moving a
+multi-GB legacy `agent_memory.json` costs RAM for one batch rather than for
+the whole history. Archived segments are inlined ahead of the hot entries,
+so positions (and with them the summary watermark, summary tree and recall
+indexes) stay valid. The destination is verified against a running
+checksum when the copy is done.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+from src.memory.archive import SegmentArchive
+from src.memory.backends import create_backend
+from src.memory.backends.base import MemoryBackend
+from src.memory.keyword_index import BM25Index
+from src.memory.message import Message, json_default
+from src.memory.summary_tree import SummaryTree
+
+# Sidecar files addressed by history position or content hash, copied as-is
+SIDECAR_SUFFIXES = (
+    ".content.jsonl",
+    ".blobs",
+    SummaryTree.sidecar_suffix,
+    SummaryTree.node_log_suffix,
+    BM25Index.sidecar_suffix,
+    ".vectors.npy",
+)
+
+# Destination file extension for each backend
+BACKEND_EXTENSIONS: Dict[str, str] = {"json": ".json", "jsonl": ".jsonl", "sqlite": ".db"}
+
+_DECODER = json.JSONDecoder()
+
+
+@dataclass(frozen=True)
+class MigrationResult:
+    """Outcome of a verified migration."""
+
+    entries: int
+    checksum: str
+    destination: str
+
+
+class _JsonStream:
+    """Incremental reader of JSON values from a text file, one buffer chunk at a time."""
+
+    def __init__(self, f: TextIO, chunk_size: int):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        data = self._f.read(self._chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._position:] + data
+        self._position = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it ("" at the end)."""
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in " \t\r\n":
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                return ""
+
+    def expect(self, characters: str) -> str:
+        """Consumes one of `characters` and returns it."""
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} in memory file, found {character!r}.")
+        self._position += 1
+        return character
+
+    def value(self) -> Any:
+        """Decodes the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._position)
+                # A number at the buffer end may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+
+def iter_json_history(path: str, state: Dict[str, Any], chunk_size: int = 1 << 20) -> Iterator[Message]:
+    """
+    Streams the history of a JsonFileBackend file without loading the document.
+
+    Top-level fields other than "history" ("summary", "summary_watermark",
+    "archived") are stored into `state` as they are read; JsonFileBackend
+    writes them before the history, so they are known by the first entry.
+
+    Args:
+        path: JSON memory file (dict format, or the legacy bare list).
+        state: Receives the top-level fields.
+        chunk_size: Characters read from the file at a time.
+
+    Yields:
+        History entries, oldest first.
+
+    Raises:
+        ValueError: If the file is not valid JSON memory.
+    """
+    def array() -> Iterator[Message]:
+        stream.expect("[")
+        if stream.peek() == "]":
+            stream.expect("]")
+            return
+        while True:
+            yield Message.from_dict(stream.value())
+            if stream.expect(",]") == "]":
+                return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f, chunk_size)
+        if stream.peek() == "[":
+            # Legacy memory files are a bare list of entries
+            yield from array()
+            return
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == "history":
+                yield from array()
+            else:
+                state[key] = stream.value()
+            if stream.expect(",}") == "}":
+                return
+
+
+def entry_checksum(digest: Any, entry: Message) -> None:
+    """Feeds one entry, in canonical JSON form, into a running checksum."""
+    digest.update(
+        json.dumps(
+            entry, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=json_default
+        ).encode("utf-8")
+    )
+    digest.update(b"\n")
+
+
+def default_destination(source: str, backend: str) -> str:
+    """Returns the source path with the extension of the destination backend."""
+    return os.path.splitext(source)[0] + BACKEND_EXTENSIONS[backend]
+
+
+def _open(path: str, backend: str, session_id: str, batch_size: int) -> MemoryBackend:
+    options: Dict[str, Any] = {}
+    if backend == "jsonl":
+        # Read backwards from the end; older entries are paged in on demand
+        options["tail_entries"] = batch_size
+    elif backend == "sqlite":
+        options["session_id"] = session_id
+    store = create_backend(path, backend, **options)
+    store.load()
+    return store
+
+
+def migrate(
+    source: str,
+    source_backend: str,
+    destination: str,
+    destination_backend: str,
+    batch_size: int = 1000,
+    session_id: str = "default",
+) -> MigrationResult:
+    """
+    Copies a memory file to another backend in bounded batches and verifies the copy.
+
+    The source is only read. Sidecar files (content store, blobs, summary
+    tree, recall indexes) are copied next to the destination.
+
+    Args:
+        source: Memory file to read.
+        source_backend: Backend name of the source.
+        destination: Memory file to create.
+        destination_backend: Backend name of the destination.
+        batch_size: Entries read, written and committed at a time.
+        session_id: Conversation to migrate for sqlite files.
+
+    Returns:
+        Entry count and checksum of the verified destination.
+
+    Raises:
+        ValueError: If the destination already holds memory or batch_size is invalid.
+        RuntimeError: If archive segments are missing or verification fails.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1.")
+    if destination_backend == "json":
+        raise ValueError("The json backend rewrites the whole file on every write; migrate to jsonl or sqlite.")
+    if not os.path.exists(source):
+        raise ValueError(f"Memory file {source} does not exist.")
+
+    target = _open(destination, destination_backend, session_id, batch_size)
+    try:
+        if target.count() or target.summary or target.archived:
+            raise ValueError(f"Destination {destination} already holds memory.")
+
+        state: Dict[str, Any] = {}
+        reader: Optional[MemoryBackend] = None
+        if source_backend == "json":
+            hot = iter_json_history(source, state)
+            archive_path = f"{source}.archive"
+        else:
+            reader = _open(source, source_backend, session_id, batch_size)
+            state = {
+                "summary": reader.summary,
+                "summary_watermark": reader.summary_watermark,
+                "archived": reader.archived,
+            }
+            hot = reader.iter_range(0, reader.count(), batch_size)
+            archive_path = reader.sidecar_path(".archive")
+
+        digest = hashlib.sha256()
+        written = 0
+        batch: List[Message] = []
+        try:
+            for entry in _with_archive(hot, state, archive_path, batch_size):
+                entry_checksum(digest, entry)
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    written += _write_batch(target, batch)
+                    batch = []
+            written += _write_batch(target, batch)
+        finally:
+            if reader is not None:
+                reader.close()
+
+        target.set_summary(str(state.get("summary", "") or ""), int(state.get("summary_watermark", 0) or 0))
+        target.flush()
+        sidecar_source = reader.sidecar_path if reader is not None else (lambda suffix: f"{source}{suffix}")
+        _copy_sidecars(sidecar_source, target.sidecar_path)
+    finally:
+        target.close()
+
+    checksum = digest.hexdigest()
+    _verify(destination, destination_backend, session_id, batch_size, written, checksum, state)
+    return MigrationResult(written, checksum, destination)
+
+
+def _with_archive(
+    hot: Iterator[Message], state: Dict[str, Any], archive_path: str, batch_size: int
+) -> Iterator[Message]:
+    """Yields the archived entries of the source, then its hot ones."""
+    # Reading the first hot entry also reads the header fields before it
+    first = next(hot, None)
+    archived = int(state.get("archived", 0) or 0)
+    archive = SegmentArchive(archive_path)
+    archive.load()
+    if archive.count() < archived:
+        raise RuntimeError(
+            f"Memory archive {archive_path} is missing {archived - archive.count()} entries."
+        )
+    for start in range(0, archive.count(), batch_size):
+        yield from archive.range(start, min(start + batch_size, archive.count()))
+
+    # Segment written but the hot file was not trimmed before a crash: skip the copies
+    skip = archive.count() - archived
+    for entry in itertools.chain([first] if first is not None else [], hot):
+        if skip:
+            skip -= 1
+            continue
+        yield entry
+
+
+def _write_batch(target: MemoryBackend, batch: List[Message]) -> int:
+    if not batch:
+        return 0
+    target.extend(batch)
+    target.flush()
+    target.page_out()
+    return len(batch)
+
+
+def _copy_sidecars(source_path: Any, destination_path: Any) -> None:
+    for suffix in SIDECAR_SUFFIXES:
+        source = source_path(suffix)
+        destination = destination_path(suffix)
+        if os.path.isdir(source):
+            shutil.copytree(source, destination, dirs_exist_ok=True)
+        elif os.path.exists(source):
+            shutil.copyfile(source, destination)
+
+
+def _verify(
+    destination: str,
+    backend: str,
+    session_id: str,
+    batch_size: int,
+    expected_count: int,
+    expected_checksum: str,
+    state: Dict[str, Any],
+) -> None:
+    """Re-reads the destination from disk and compares it with what was written."""
+    store = _open(destination, backend, session_id, batch_size)
+    try:
+        digest = hashlib.sha256()
+        count = 0
+        for entry in store.iter_range(0, store.count(), batch_size):
+            entry_checksum(digest, entry)
+            count += 1
+        summary = str(state.get("summary", "") or "")
+        watermark = int(state.get("summary_watermark", 0) or 0)
+    finally:
+        store.close()
+    if count != expected_count:
+        raise RuntimeError(f"Migration verification failed: wrote {expected_count} entries, read back {count}.")
+    if digest.hexdigest() != expected_checksum:
+        raise RuntimeError("Migration verification failed: checksum mismatch.")
+    if store.summary != summary or store.summary_watermark != watermark:
+        raise RuntimeError("Migration verification failed: summary mismatch.")
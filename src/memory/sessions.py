@@ -0,0 +1,248 @@
+"""
+Multi-session memory store.
+
+Keeps one MemoryManager per conversation, loading each lazily on first use and
+holding at most a bounded number of them in RAM. The least recently used
+session is flushed and closed when a new one needs room; it is reloaded from
+disk the next time it is requested. Sessions held through `lease()` (or
+`acquire()`) are pinned and never closed until they are released.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.config import settings
+from src.memory.backends import (
+    MemoryBackend,
+    SqliteBackend,
+    backend_options,
+    create_backend,
+    resolve_backend_name,
+)
+from src.memory.manager import MemoryManager
+
+_SAFE_SESSION_ID = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class SessionStore:
+    """Session-keyed MemoryManager registry with an LRU of hot sessions."""
+
+    def __init__(
+        self,
+        memory_file: str = settings.MEMORY_FILE,
+        backend: Optional[str] = None,
+        max_hot_sessions: int = settings.MEMORY_MAX_HOT_SESSIONS,
+        **manager_options: Any,
+    ):
+        """
+        Initialize the session store.
+
+        Args:
+            memory_file: Base memory file. SQLite sessions share this database;
+                file backends keep one file per session in a `<name>.sessions/`
+                directory next to it.
+            backend: Backend name; defaults to settings.MEMORY_BACKEND, then to
+                the memory file extension.
+            max_hot_sessions: Maximum number of sessions kept loaded in RAM.
+            **manager_options: Extra keyword arguments for each MemoryManager
+                (e.g. write_behind, background_summary).
+
+        Raises:
+            ValueError: If max_hot_sessions is smaller than 1.
+        """
+        if max_hot_sessions < 1:
+            raise ValueError("max_hot_sessions must be at least 1.")
+        self.memory_file = memory_file
+        self.backend_name = resolve_backend_name(memory_file, backend or settings.MEMORY_BACKEND)
+        self.max_hot_sessions = max_hot_sessions
+        self.manager_options = manager_options
+        stem, extension = os.path.splitext(memory_file)
+        self.sessions_dir = f"{stem}.sessions"
+        self._extension = extension
+        self._hot: "OrderedDict[str, MemoryManager]" = OrderedDict()
+        # Number of callers holding each pinned session
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> MemoryManager:
+        """
+        Return the memory of a session, loading it if it is not hot.
+
+        The session is not pinned: a later load of other sessions may close it.
+        Use `lease()` to hold it across calls.
+
+        Args:
+            session_id: Conversation or user identifier.
+
+        Returns:
+            The session's MemoryManager.
+
+        Raises:
+            ValueError: If session_id is empty.
+        """
+        return self._load(session_id, pin=False)
+
+    def acquire(self, session_id: str) -> MemoryManager:
+        """
+        Return the memory of a session and pin it until `release()` is called.
+
+        A pinned session is never evicted or closed. Each acquire() needs
+        its own release().
+
+        Args:
+            session_id: Conversation or user identifier.
+
+        Returns:
+            The session's MemoryManager.
+
+        Raises:
+            ValueError: If session_id is empty.
+        """
+        return self._load(session_id, pin=True)
+
+    def release(self, session_id: str) -> None:
+        """
+        Drop one pin taken by `acquire()`; once unpinned the session may be evicted.
+
+        Args:
+            session_id: Conversation or user identifier.
+
+        Raises:
+            ValueError: If the session is not pinned.
+        """
+        with self._lock:
+            pins = self._pins.get(session_id, 0)
+            if pins < 1:
+                raise ValueError(f"Session {session_id!r} is not pinned.")
+            if pins == 1:
+                del self._pins[session_id]
+            else:
+                self._pins[session_id] = pins - 1
+            self._evict_cold()
+
+    @contextmanager
+    def lease(self, session_id: str) -> Iterator[MemoryManager]:
+        """
+        Pin a session for the duration of a with block.
+
+        Args:
+            session_id: Conversation or user identifier.
+
+        Yields:
+            The session's MemoryManager.
+        """
+        memory = self.acquire(session_id)
+        try:
+            yield memory
+        finally:
+            self.release(session_id)
+
+    def _load(self, session_id: str, pin: bool) -> MemoryManager:
+        if not session_id:
+            raise ValueError("session_id is required.")
+        with self._lock:
+            memory = self._hot.get(session_id)
+            if memory is not None:
+                self._hot.move_to_end(session_id)
+            else:
+                memory = MemoryManager(
+                    memory_file=self.session_path(session_id),
+                    backend=self._create_backend(session_id),
+                    **self.manager_options,
+                )
+                self._hot[session_id] = memory
+            if pin:
+                self._pins[session_id] = self._pins.get(session_id, 0) + 1
+            # The requested session stays loaded even if every other one is pinned
+            self._evict_cold(keep=session_id)
+            return memory
+
+    def session_path(self, session_id: str) -> str:
+        """
+        Return the file that persists a session.
+
+        Args:
+            session_id: Conversation or user identifier.
+
+        Returns:
+            Path of the session's memory file.
+        """
+        if self.backend_name == "sqlite":
+            return self.memory_file
+        safe_id = _SAFE_SESSION_ID.sub("_", session_id)
+        if safe_id != session_id:
+            # Keep sanitized ids distinct ("a/b" vs "a_b")
+            safe_id = f"{safe_id}-{hashlib.sha1(session_id.encode('utf-8')).hexdigest()[:8]}"
+        return os.path.join(self.sessions_dir, f"{safe_id}{self._extension}")
+
+    def evict(self, session_id: str) -> bool:
+        """
+        Flush and unload a session from RAM.
+
+        Args:
+            session_id: Conversation or user identifier.
+
+        Returns:
+            True if the session was hot and has been evicted; False if it was
+            not loaded or is pinned.
+        """
+        with self._lock:
+            if session_id in self._pins:
+                return False
+            memory = self._hot.pop(session_id, None)
+        if memory is None:
+            return False
+        memory.close()
+        return True
+
+    def hot_sessions(self) -> List[str]:
+        """Return the ids of sessions loaded in RAM, least recently used first."""
+        with self._lock:
+            return list(self._hot)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of hot and pinned sessions and the LRU capacity."""
+        with self._lock:
+            return {"hot": len(self._hot), "pinned": len(self._pins), "capacity": self.max_hot_sessions}
+
+    def close(self) -> None:
+        """Flush and unload every hot session, pinned or not."""
+        with self._lock:
+            sessions = list(self._hot.values())
+            self._hot.clear()
+            self._pins.clear()
+        for memory in sessions:
+            memory.close()
+
+    def _create_backend(self, session_id: str) -> MemoryBackend:
+        if self.backend_name == "sqlite":
+            return SqliteBackend(self.memory_file, fsync=settings.MEMORY_FSYNC, session_id=session_id)
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        return create_backend(
+            self.session_path(session_id), self.backend_name, **backend_options(self.backend_name)
+        )
+
+    def _evict_cold(self, keep: Optional[str] = None) -> None:
+        """
+        Closes least recently used sessions until the LRU fits its capacity.
+
+        Pinned sessions, sessions in the middle of a turn and `keep` are
+        skipped; the LRU may stay over capacity until they are released.
+        """
+        while len(self._hot) > self.max_hot_sessions:
+            cold_id = next(
+                (
+                    sid
+                    for sid, mem in self._hot.items()
+                    if sid != keep and sid not in self._pins and not mem.in_turn
+                ),
+                None,
+            )
+            if cold_id is None:
+                return
+            self._hot.pop(cold_id).close()
@@ -0,0 +1,422 @@
+"""
+Hierarchical summary of agent history.
+
+A single rolling summary re-reads (and re-writes) an ever longer text block
+every time messages are evicted from the context window. The summary tree
+instead digests history in fixed-size chunks: the open chunk is summarized
+incrementally, a full chunk becomes a sealed leaf, and two adjacent sealed
+nodes of the same level are merged into a parent, like carries in a binary
+counter. Every summarizer call therefore sees at most one chunk of messages
+or two digests, and the history is covered by O(log n) root nodes whose
+digests are cached and simply joined to form the summary.
+
+Sealed nodes keep their children, so `digests(start, stop)` can zoom into
+any past period by descending only the nodes that overlap it.
+
+Sealed nodes never change, so on disk each one is appended once to a node
+log, its record pointing at its children by byte offset. The head file read
+at startup only holds the O(log n) roots and the partial node; children are
+read back from the log when a zoom descends into them.
+"""
+
+import itertools
+import json
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.memory.message import Message
+
+# Level of a node holding a summary that predates the tree; it never merges
+SEED_LEVEL = -1
+
+
+@dataclass(frozen=True)
+class SummaryNode:
+    """Digest of history positions [start, stop)."""
+
+    start: int
+    stop: int
+    level: int
+    text: str
+    children: Tuple["SummaryNode", ...] = ()
+    # (node log id, byte offset) of the record a node was read from; its
+    # children, if any, are read from there on demand
+    ref: Optional[Tuple[str, int]] = field(default=None, compare=False, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "start": self.start,
+            "stop": self.stop,
+            "level": self.level,
+            "text": self.text,
+        }
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SummaryNode":
+        return cls(
+            int(data["start"]),
+            int(data["stop"]),
+            int(data["level"]),
+            str(data["text"]),
+            tuple(cls.from_dict(child) for child in data.get("children", ())),
+        )
+
+
+class SummaryTree:
+    """
+    Immutable forest of summary nodes covering history positions [0, covered).
+
+    `extend` returns a new tree, so a background worker can build the next
+    tree while the current one keeps serving context windows.
+    """
+
+    # Suffixes of the head file the tree is saved to, next to the memory file,
+    # and of the append-only log of its sealed nodes
+    sidecar_suffix = ".summary_tree.json"
+    node_log_suffix = ".summary_tree.nodes.jsonl"
+
+    def __init__(
+        self,
+        chunk_size: int = 32,
+        roots: Tuple[SummaryNode, ...] = (),
+        partial: Optional[SummaryNode] = None,
+        node_log: Optional[str] = None,
+    ):
+        """
+        Initialize the tree.
+
+        Args:
+            chunk_size: History entries digested by each leaf.
+            roots: Sealed nodes, oldest first.
+            partial: Digest of the chunk that is still filling up, if any.
+            node_log: Node log that children of loaded nodes are read from.
+
+        Raises:
+            ValueError: If chunk_size is smaller than 1.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1.")
+        self.chunk_size = chunk_size
+        self.roots = roots
+        self.partial = partial
+        self.node_log = node_log
+
+    @classmethod
+    def seeded(cls, summary: str, watermark: int, chunk_size: int = 32) -> "SummaryTree":
+        """
+        Builds a tree from a plain rolling summary (e.g. one written by an older version).
+
+        Args:
+            summary: Summary of history positions [0, watermark).
+            watermark: Number of entries the summary covers.
+            chunk_size: History entries digested by each leaf.
+        """
+        if not summary and watermark <= 0:
+            return cls(chunk_size)
+        return cls(chunk_size, (SummaryNode(0, watermark, SEED_LEVEL, summary),))
+
+    @property
+    def covered(self) -> int:
+        """Number of leading history entries the tree summarizes."""
+        if self.partial is not None:
+            return self.partial.stop
+        return self.roots[-1].stop if self.roots else 0
+
+    @property
+    def text(self) -> str:
+        """The summary served in context windows: the root digests, oldest first."""
+        nodes = self.roots + ((self.partial,) if self.partial is not None else ())
+        return "\n".join(node.text for node in nodes if node.text)
+
+    def extend(
+        self,
+        messages: Iterable[Message],
+        summarizer: Callable[[List[Message], str], str],
+        max_chunks: Optional[int] = None,
+    ) -> Tuple["SummaryTree", int]:
+        """
+        Digests the entries that follow the covered ones.
+
+        Messages are pulled one chunk at a time, so a lazy iterator over a
+        long backlog is never materialized as a whole.
+
+        Args:
+            messages: History entries from position `covered` on, oldest first.
+            summarizer: Callable that receives (old_messages, previous_summary).
+            max_chunks: Stop after digesting this many chunks (each followed by
+                the merges it carries); the rest of `messages` is left unread.
+                None digests them all.
+
+        Returns:
+            The new tree and the number of summarizer calls made.
+
+        Raises:
+            ValueError: If summarizer returns non-string.
+        """
+        messages = iter(messages)
+        roots = list(self.roots)
+        partial = self.partial
+        position = self.covered
+        calls = 0
+        chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            start = partial.start if partial is not None else position
+            piece = list(itertools.islice(messages, self.chunk_size - (position - start)))
+            if not piece:
+                break
+            text = _summarize(summarizer, piece, partial.text if partial else "")
+            calls += 1
+            chunks += 1
+            position += len(piece)
+            partial = SummaryNode(start, position, 0, text)
+            if position - start < self.chunk_size:
+                continue
+
+            # Chunk is full: seal it and carry merges upward
+            roots.append(partial)
+            partial = None
+            while len(roots) >= 2 and roots[-1].level == roots[-2].level != SEED_LEVEL:
+                right = roots.pop()
+                left = roots.pop()
+                merged = _summarize(summarizer, [Message("summary", right.text)], left.text)
+                calls += 1
+                roots.append(SummaryNode(left.start, right.stop, left.level + 1, merged, (left, right)))
+        return SummaryTree(self.chunk_size, tuple(roots), partial, self.node_log), calls
+
+    def digests(self, start: int = 0, stop: Optional[int] = None) -> List[SummaryNode]:
+        """
+        Returns the coarsest nodes that together cover [start, stop).
+
+        Nodes that lie entirely inside the range are returned whole; nodes
+        that straddle its edges are replaced by their children, down to leaves.
+
+        Args:
+            start: First history position of interest.
+            stop: Position after the last one; defaults to the covered count.
+
+        Returns:
+            Nodes ordered by position.
+        """
+        if stop is None:
+            stop = self.covered
+        result: List[SummaryNode] = []
+        pending = list(self.roots) + ([self.partial] if self.partial is not None else [])
+        pending.reverse()
+        while pending:
+            node = pending.pop()
+            if node.stop <= start or node.start >= stop:
+                continue
+            children = self._children(node)
+            if (start <= node.start and node.stop <= stop) or not children:
+                result.append(node)
+            else:
+                pending.extend(reversed(children))
+        return result
+
+    def _children(self, node: SummaryNode) -> Tuple[SummaryNode, ...]:
+        """Children of a node, read from the node log for nodes loaded without them."""
+        if node.children or node.level <= 0 or node.ref is None or self.node_log is None:
+            return node.children
+        log_id, offset = node.ref
+        try:
+            with open(self.node_log, 'rb') as f:
+                if _read_log_id(f) != log_id:
+                    return ()
+                f.seek(offset)
+                record = json.loads(f.readline())
+                return tuple(_read_node(f, log_id, child) for child in record.get("children", ()))
+        except (OSError, ValueError, KeyError, TypeError):
+            return ()
+
+    def save(self, path: str) -> None:
+        """
+        Persist the tree: new sealed nodes are appended to the node log, then
+        the head file (roots and partial node) is replaced.
+
+        Nodes already in the log (the roots of the previous save and nodes
+        loaded from it) are not written again, so a save costs the nodes
+        sealed since the last one plus the O(log n) head. A tree sharing no
+        node with the log (e.g. after the memory was cleared) starts a new log.
+
+        Args:
+            path: Destination head file; the node log lives next to it.
+        """
+        log_path = _node_log_path(path)
+        log_id, log_size, known = _read_head_log(path, log_path)
+        nodes = self.roots + ((self.partial,) if self.partial is not None else ())
+        if log_id is None or not any(_shares_log(node, log_id, known) for node in nodes):
+            log_id, log_size, known = uuid.uuid4().hex, None, {}
+
+        header = json.dumps({"log_id": log_id}) + "\n" if log_size is None else ""
+        # Records of nodes missing from the log, children before parents
+        pending: List[bytes] = []
+        end = len(header.encode("utf-8")) if log_size is None else log_size
+
+        def write(node: SummaryNode) -> int:
+            nonlocal end
+            offset = _logged_offset(node, log_id, known)
+            if offset is not None:
+                return offset
+            children = [write(child) for child in self._children(node)]
+            record: Dict[str, Any] = {"start": node.start, "stop": node.stop, "level": node.level, "text": node.text}
+            if children:
+                record["children"] = children
+            line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+            offset = end
+            pending.append(line)
+            end += len(line)
+            known[_node_key(node)] = offset
+            return offset
+
+        roots = []
+        for root in self.roots:
+            data = {"start": root.start, "stop": root.stop, "level": root.level, "text": root.text}
+            data["offset"] = write(root)
+            roots.append(data)
+
+        if log_size is None:
+            tmp_log = f"{log_path}.tmp"
+            with open(tmp_log, 'wb') as f:
+                f.write(header.encode("utf-8"))
+                f.write(b"".join(pending))
+            os.replace(tmp_log, log_path)
+        elif pending:
+            with open(log_path, 'r+b') as f:
+                # Drops records a crashed save appended but never referenced
+                f.seek(log_size)
+                f.write(b"".join(pending))
+                f.truncate()
+
+        data = {
+            "chunk_size": self.chunk_size,
+            "log_id": log_id,
+            "log_size": end,
+            "roots": roots,
+            "partial": self.partial.to_dict() if self.partial is not None else None,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, chunk_size: int = 32) -> Optional["SummaryTree"]:
+        """
+        Restore a tree saved by `save`.
+
+        Only the head file is read; children are read from the node log when
+        `digests` needs them.
+
+        Args:
+            path: File written by `save`.
+            chunk_size: Chunk size expected by the caller; a tree saved with a
+                different one is discarded.
+
+        Returns:
+            The tree, or None if the file is missing, unreadable or stale.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data["chunk_size"] != chunk_size:
+                return None
+            partial = data.get("partial")
+            partial_node = SummaryNode.from_dict(partial) if partial else None
+            log_id = data.get("log_id")
+            if log_id is None:
+                # Written by an older version with every child inline
+                roots = tuple(SummaryNode.from_dict(root) for root in data["roots"])
+                return cls(chunk_size, roots, partial_node)
+            log_path = _node_log_path(path)
+            # A crash may have replaced the head before the log reached the disk
+            if not os.path.exists(log_path) or os.path.getsize(log_path) < data["log_size"]:
+                return None
+            roots = tuple(
+                SummaryNode(
+                    int(root["start"]),
+                    int(root["stop"]),
+                    int(root["level"]),
+                    str(root["text"]),
+                    ref=(log_id, int(root["offset"])),
+                )
+                for root in data["roots"]
+            )
+            return cls(chunk_size, roots, partial_node, log_path)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+def _node_log_path(path: str) -> str:
+    """Node log next to a head file ("x.summary_tree.json" -> "x.summary_tree.nodes.jsonl")."""
+    return f"{os.path.splitext(path)[0]}.nodes.jsonl"
+
+
+def _node_key(node: SummaryNode) -> Tuple[int, int, int, str]:
+    return (node.start, node.stop, node.level, node.text)
+
+
+def _logged_offset(node: SummaryNode, log_id: str, known: Dict[Tuple[int, int, int, str], int]) -> Optional[int]:
+    """Offset of a node's record in the current log, or None if it has to be written."""
+    if node.ref is not None and node.ref[0] == log_id:
+        return node.ref[1]
+    return known.get(_node_key(node))
+
+
+def _shares_log(node: SummaryNode, log_id: str, known: Dict[Tuple[int, int, int, str], int]) -> bool:
+    """Whether a node or one of its in-memory descendants is already in the log."""
+    if _logged_offset(node, log_id, known) is not None:
+        return True
+    return any(_shares_log(child, log_id, known) for child in node.children)
+
+
+def _read_head_log(path: str, log_path: str) -> Tuple[Optional[str], Optional[int], Dict[Tuple[int, int, int, str], int]]:
+    """
+    Reads which node log the current head file uses.
+
+    Returns:
+        (log id, valid log size, root offsets by node key), or (None, None, {})
+        if there is no usable log.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        log_id = data["log_id"]
+        log_size = int(data["log_size"])
+        with open(log_path, 'rb') as f:
+            if _read_log_id(f) != log_id or os.fstat(f.fileno()).st_size < log_size:
+                return None, None, {}
+        known = {
+            (int(root["start"]), int(root["stop"]), int(root["level"]), str(root["text"])): int(root["offset"])
+            for root in data["roots"]
+        }
+        return log_id, log_size, known
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None, {}
+
+
+def _read_log_id(f: Any) -> Optional[str]:
+    f.seek(0)
+    return json.loads(f.readline()).get("log_id")
+
+
+def _read_node(f: Any, log_id: str, offset: int) -> SummaryNode:
+    """Reads the node record at offset, without its children."""
+    f.seek(offset)
+    record = json.loads(f.readline())
+    return SummaryNode(
+        int(record["start"]), int(record["stop"]), int(record["level"]), str(record["text"]), ref=(log_id, offset)
+    )
+
+
+def _summarize(summarizer: Callable[[List[Message], str], str], messages: List[Message], previous: str) -> str:
+    result = summarizer(messages, previous)
+    if not isinstance(result, str):
+        raise ValueError("Summarizer must return a string.")
+    return result.strip()
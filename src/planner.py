@@ -0,0 +1,159 @@
+"""
+Planning stage of the Think-Act-Reflect loop.
+
+`GeminiAgent.think()` asks the model for a short structured plan (ordered
+steps and the tools they need) that `act()` then injects into its prompt.
+Plans are cached by a normalized signature of the task, so a request that
+differs from an earlier one only in case, punctuation or spacing costs no
+extra model call, and trivial tasks skip planning altogether.
+"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Tuple
+
+# A free-text plan line: a list marker ("1.", "2)", "-", "*") followed by the step
+_LIST_ITEM = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+(\S.*)$")
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Structured outcome of the planning stage."""
+
+    steps: Tuple[str, ...] = ()
+    tools: Tuple[str, ...] = ()
+    # Why no model plan was made: "trivial", "disabled", "timeout" or "error"; "" for a real plan
+    skipped: str = ""
+    cached: bool = False
+
+    def render(self) -> str:
+        """Returns the plan as a prompt block, or "" if it has no steps."""
+        if not self.steps:
+            return ""
+        lines = [f"{i}. {step}" for i, step in enumerate(self.steps, 1)]
+        if self.tools:
+            lines.append(f"Tools likely needed: {', '.join(self.tools)}")
+        return "\n".join(lines)
+
+
+def task_signature(task: str) -> str:
+    """
+    Normalizes a task into its plan cache key.
+
+    Case, punctuation and runs of whitespace are ignored, so "List files!"
+    and "  list files " share one plan.
+    """
+    return " ".join(_NON_WORD.sub(" ", task.lower()).split())
+
+
+def is_trivial(task: str, min_words: int) -> bool:
+    """Whether a task is too short to be worth a planning call."""
+    return len(task_signature(task).split()) < min_words
+
+
+def _as_list(value: Any) -> Optional[List[Any]]:
+    """A JSON "steps"/"tools" value as a list: a lone string is one item, other non-lists are None."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return value
+    return None
+
+
+def parse_plan(text: str, known_tools: Iterable[str], max_steps: int = 8) -> Plan:
+    """
+    Reads a plan from a model reply.
+
+    The reply should be {"steps": [...], "tools": [...]}; a numbered or
+    bulleted list is accepted as well, but other lines (prose, refusals,
+    error strings) are not steps. A single string is read as a one-item list;
+    steps or tools of any other non-list type make the reply unusable. Tools
+    that are not registered are dropped.
+
+    Args:
+        text: Model reply.
+        known_tools: Names of the registered tools.
+        max_steps: Upper bound on the number of steps kept.
+
+    Returns:
+        The parsed plan, or Plan(skipped="error") if the reply held no steps
+        or malformed steps or tools.
+    """
+    known = set(known_tools)
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`").split("\n", 1)[-1]
+
+    steps = []
+    tools = []
+    try:
+        payload = json.loads(cleaned)
+    except json.JSONDecodeError:
+        payload = None
+    if isinstance(payload, dict):
+        raw_steps = _as_list(payload.get("steps"))
+        raw_tools = _as_list(payload.get("tools"))
+        if raw_steps is None or raw_tools is None:
+            return Plan(skipped="error")
+        steps = [str(step).strip() for step in raw_steps if str(step).strip()]
+        tools = [str(tool) for tool in raw_tools]
+    else:
+        items = (_LIST_ITEM.match(line) for line in cleaned.splitlines())
+        steps = [item.group(1).strip() for item in items if item]
+
+    if not steps:
+        return Plan(skipped="error")
+    tools = [tool for tool in dict.fromkeys(tools) if tool in known]
+    return Plan(tuple(steps[:max_steps]), tuple(tools))
+
+
+class PlanCache:
+    """Thread-safe LRU cache of plans keyed by task signature."""
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Plans kept before the least recently used is evicted; 0 disables caching.
+        """
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[Tuple[str, int], Plan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, int]) -> Optional[Plan]:
+        """Returns the cached plan for a key, or None."""
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+
+    def put(self, key: Tuple[str, int], plan: Plan) -> None:
+        """Stores a plan, evicting the least recently used one when full."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops every cached plan."""
+        with self._lock:
+            self._plans.clear()
+
+    def __len__(self) -> int:
+        return len(self._plans)
@@ -9,6 +9,7 @@ def mock_agent():
         agent = GeminiAgent()
         agent.memory = MockMemory.return_value
         agent.memory.get_history.return_value = []
+        agent.memory.count.return_value = 0
         return agent
 
 def test_agent_initialization(mock_agent):
@@ -24,7 +25,7 @@ def test_agent_think_act_loop(mock_agent):
         response = mock_agent.act(task)
         
         # Verify think was called
-        mock_think.assert_called_once_with(task)
+        mock_think.assert_called_once_with(task, session_id=None)
         
         # Verify memory was updated
         assert mock_agent.memory.add_entry.call_count == 2 # User task + Assistant response
@@ -37,3 +38,311 @@ def test_agent_tools_integration():
     from src.tools.example_tool import web_search
     result = web_search("test query")
     assert "Search results for: test query" in result
+
+def test_agent_act_records_turn_in_session_memory(mock_agent, tmp_path):
+    """Test that act(session_id=...) uses that session's memory."""
+    from src.memory import SessionStore
+
+    mock_agent.sessions = SessionStore(memory_file=str(tmp_path / "memory.json"))
+
+    with patch.object(mock_agent, 'think'):
+        mock_agent.act("Session task", session_id="user-42")
+
+    history = mock_agent.sessions.get("user-42").get_history()
+    assert [m["role"] for m in history] == ["user", "assistant"]
+    mock_agent.memory.add_entry.assert_not_called()
+    mock_agent.sessions.close()
+
+def test_reflect_counts_history_without_loading_it(mock_agent):
+    """Test that reflect() asks memory for a count instead of the full history."""
+    mock_agent.memory.count.return_value = 7
+    mock_agent.memory.cache_stats.return_value = {"hits": 1, "misses": 2, "summarizer_calls": 0}
+
+    mock_agent.reflect()
+
+    mock_agent.memory.count.assert_called_once_with()
+    mock_agent.memory.get_history.assert_not_called()
+
+def test_load_context_is_cached_until_files_change(mock_agent, tmp_path):
+    """Test that .context/ is only re-read when a file is added, removed or edited."""
+    mock_agent.context_dir = tmp_path
+    (tmp_path / "rules.md").write_text("Be brief.", encoding="utf-8")
+
+    first = mock_agent._load_context()
+    with patch("pathlib.Path.read_text", side_effect=AssertionError("re-read")):
+        assert mock_agent._load_context() is first
+
+    (tmp_path / "style.md").write_text("Use tables.", encoding="utf-8")
+    assert "Use tables." in mock_agent._load_context()
+
+    (tmp_path / "rules.md").write_text("Be very brief.", encoding="utf-8")
+    assert "Be very brief." in mock_agent._load_context()
+
+    # Dot-files are loaded too, so their edits must invalidate the cache as well
+    (tmp_path / ".hidden.md").write_text("Secret rule.", encoding="utf-8")
+    assert "Secret rule." in mock_agent._load_context()
+    (tmp_path / ".hidden.md").write_text("Changed rule.", encoding="utf-8")
+    assert "Changed rule." in mock_agent._load_context()
+
+    (tmp_path / "style.md").unlink()
+    assert "Use tables." not in mock_agent._load_context()
+
+def test_tool_prompt_prefix_is_rebuilt_only_when_tools_change(mock_agent):
+    """Test that the tool catalog prompt is cached per registry version and byte-stable."""
+    def lookup(city):
+        """Looks up a city."""
+        return city
+
+    first = mock_agent._tool_system_prompt(mock_agent._get_tool_descriptions(), 10_000)
+    assert mock_agent._get_tool_descriptions() is mock_agent._get_tool_descriptions()
+    assert mock_agent._tool_system_prompt(mock_agent._get_tool_descriptions(), 10_000) is first
+
+    version = mock_agent.available_tools.version
+    mock_agent.available_tools["lookup"] = lookup
+    assert mock_agent.available_tools.version > version
+    second = mock_agent._tool_system_prompt(mock_agent._get_tool_descriptions(), 10_000)
+    assert "- lookup: Looks up a city." in second
+
+    del mock_agent.available_tools["lookup"]
+    assert mock_agent._tool_system_prompt(mock_agent._get_tool_descriptions(), 10_000) == first
+
+    # Every way of changing the catalog moves the version
+    for change in (
+        lambda tools: tools.update({"lookup": lookup}),
+        lambda tools: tools.pop("lookup"),
+        lambda tools: tools.__ior__({"lookup": lookup}),
+        lambda tools: tools.popitem(),
+        lambda tools: tools.setdefault("fresh", lookup),
+    ):
+        version = mock_agent.available_tools.version
+        change(mock_agent.available_tools)
+        assert mock_agent.available_tools.version != version
+    mock_agent.available_tools |= {"other": lookup}
+    assert "- other: Looks up a city." in mock_agent._get_tool_descriptions()
+
+    # A plain dict assigned to available_tools is adopted as a registry
+    mock_agent.available_tools = {"lookup": lookup}
+    assert mock_agent._get_tool_descriptions() == "- lookup: Looks up a city."
+
+def test_think_skips_trivial_tasks_without_sleeping(mock_agent):
+    """Test that short tasks are acted on directly, with no model call or fixed delay."""
+    with patch.object(mock_agent, "_call_gemini") as mock_call, patch("time.sleep") as mock_sleep:
+        plan = mock_agent.think("hi there")
+
+    assert plan.skipped == "trivial"
+    assert plan.render() == ""
+    mock_call.assert_not_called()
+    mock_sleep.assert_not_called()
+
+def test_think_plans_once_per_normalized_task(mock_agent):
+    """Test that think() parses a structured plan and reuses it for the same task."""
+    reply = '{"steps": ["Search the web", "Summarize results"], "tools": ["web_search", "made_up"]}'
+    with patch.object(mock_agent, "_call_gemini", return_value=reply) as mock_call:
+        plan = mock_agent.think("Find the latest Gemini release notes")
+        again = mock_agent.think("  find the LATEST gemini release notes! ")
+
+    mock_call.assert_called_once()
+    assert plan.steps == ("Search the web", "Summarize results")
+    assert plan.tools == ("web_search",)
+    assert not plan.cached
+    assert again.cached and again.steps == plan.steps
+
+def test_think_rejects_replies_without_plan_steps(mock_agent):
+    """Test that prose, refusals and backend errors are neither used nor cached as plans."""
+    task = "Find the latest Gemini release notes"
+    for reply in ("I have completed the task", "[openai-backend-error] timed out", "Sure!\n-5 degrees today"):
+        with patch.object(mock_agent, "_call_gemini", return_value=reply):
+            plan = mock_agent.think(task)
+        assert plan.skipped == "error"
+        assert plan.render() == ""
+    assert len(mock_agent.plan_cache) == 0
+
+    with patch.object(mock_agent, "_call_gemini", return_value="Plan:\n1. Search the web\n- Summarize results"):
+        assert mock_agent.think(task).steps == ("Search the web", "Summarize results")
+
+def test_parse_plan_checks_steps_and_tools_types():
+    """Test that a lone string is one step or tool and other non-list values are rejected."""
+    from src.planner import parse_plan
+
+    plan = parse_plan('{"steps": "Search the web", "tools": "web_search"}', ["web_search"])
+    assert plan.steps == ("Search the web",)
+    assert plan.tools == ("web_search",)
+
+    for reply in ('{"steps": {"1": "Search"}}', '{"steps": 3}', '{"steps": ["Search"], "tools": {"web_search": 1}}'):
+        assert parse_plan(reply, ["web_search"]).skipped == "error"
+
+def test_think_respects_latency_budget(mock_agent):
+    """Test that a slow plan is not waited for but still cached once it arrives."""
+    import threading
+
+    release = threading.Event()
+
+    def slow_call(prompt):
+        release.wait(5)
+        return '{"steps": ["Read the file"]}'
+
+    task = "Read the project configuration file carefully"
+    with patch.object(mock_agent.settings, "PLAN_LATENCY_BUDGET", 0.05), \
+            patch.object(mock_agent, "_call_gemini", side_effect=slow_call):
+        assert mock_agent.think(task).skipped == "timeout"
+        release.set()
+        mock_agent._planner.shutdown(wait=True)
+        assert mock_agent.think(task).steps == ("Read the file",)
+
+def test_act_includes_plan_in_prompt(mock_agent):
+    """Test that act() reuses the plan made by think()."""
+    from src.planner import Plan
+
+    with patch.object(mock_agent, "think", return_value=Plan(("Search the web",))):
+        mock_agent.act("Find the latest Gemini release notes")
+
+    system_prompt = mock_agent.memory.get_context_window.call_args.kwargs["system_prompt"]
+    assert "Plan for this task:\n1. Search the web" in system_prompt
+
+def test_act_reuses_the_window_built_by_think(mock_agent, tmp_path):
+    """Test that think() and act() share one history budget, so act() hits the window cache."""
+    from src.memory import MemoryManager
+
+    mock_agent.memory = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    mock_agent.context_dir = tmp_path
+    (tmp_path / "rules.md").write_text("Be brief. " * 200, encoding="utf-8")
+
+    for task in ("Find the latest Gemini release notes", "Summarize the open pull requests"):
+        mock_agent.act(task)
+
+    stats = mock_agent.memory.cache_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    mock_agent.memory.close()
+
+def test_summary_made_during_a_turn_reaches_the_prompt(mock_agent, tmp_path):
+    """Test that a summary first written by think()'s window is not cut to fit the turn-start budget."""
+    from src.memory import MemoryManager
+
+    prompts = []
+    with patch.object(mock_agent.settings, "CONTEXT_MAX_MESSAGES", 4), \
+            patch.object(mock_agent.settings, "MEMORY_SUMMARY_CHUNK_SIZE", 2):
+        mock_agent.memory = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+        for i in range(4):
+            mock_agent.memory.add_entry("user", f"earlier message {i}")
+        with patch.object(mock_agent, "summarize_memory", return_value="User sent earlier messages 0 and 1."), \
+                patch.object(mock_agent, "_call_gemini", side_effect=lambda prompt: prompts.append(prompt) or "Done"):
+            mock_agent.act("Find the latest Gemini release notes")
+
+    assert mock_agent.memory.summary == "User sent earlier messages 0 and 1."
+    assert "Previous Summary: User sent earlier messages 0 and 1." in prompts[-1]
+    assert "truncated" not in prompts[-1]
+    mock_agent.memory.close()
+
+def test_async_agent_runs_conversations_concurrently(tmp_path):
+    """Test that act_async() interleaves sessions on one loop via client.aio."""
+    import asyncio
+    from src.async_agent import AsyncGeminiAgent
+    from src.memory import SessionStore
+
+    in_flight = {"now": 0, "max": 0}
+
+    class _AsyncModels:
+        async def generate_content(self, model, contents):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return MagicMock(text="Done")
+
+    with patch('src.agent.MemoryManager'):
+        agent = AsyncGeminiAgent()
+    agent.sessions = SessionStore(memory_file=str(tmp_path / "memory.json"))
+    agent.client = MagicMock()
+    agent.client.aio.models = _AsyncModels()
+
+    async def main():
+        tasks = [agent.act_async("hi", session_id=f"user-{i}") for i in range(20)]
+        return await asyncio.gather(*tasks)
+
+    replies = asyncio.run(main())
+
+    assert replies == ["Done"] * 20
+    assert in_flight["max"] > 1
+    agent.client.models.generate_content.assert_not_called()
+    assert [m["role"] for m in agent.sessions.get("user-3").get_history()] == ["user", "assistant"]
+    agent.sessions.close()
+
+def test_async_agent_runs_more_sessions_than_stay_hot(tmp_path):
+    """Test that sessions evicted from the LRU are never closed under a running turn."""
+    import asyncio
+    from src.async_agent import AsyncGeminiAgent
+    from src.memory import SessionStore
+
+    class _AsyncModels:
+        async def generate_content(self, model, contents):
+            await asyncio.sleep(0.01)
+            return MagicMock(text="Done")
+
+    with patch('src.agent.MemoryManager'):
+        agent = AsyncGeminiAgent()
+    agent.sessions = SessionStore(memory_file=str(tmp_path / "memory.db"), max_hot_sessions=2)
+    agent.client = MagicMock()
+    agent.client.aio.models = _AsyncModels()
+
+    async def main():
+        tasks = [agent.act_async("hi", session_id=f"user-{i}") for i in range(20)]
+        return await asyncio.gather(*tasks)
+
+    replies = asyncio.run(main())
+
+    assert replies == ["Done"] * 20
+    assert agent.sessions.stats() == {"hot": 2, "pinned": 0, "capacity": 2}
+    for i in range(20):
+        assert [m["role"] for m in agent.sessions.get(f"user-{i}").get_history()] == ["user", "assistant"]
+    agent.sessions.close()
+
+def test_async_agent_awaits_tool_coroutines():
+    """Test that async (MCP) tools are awaited directly and sync tools still work."""
+    import asyncio
+    from src.async_agent import AsyncGeminiAgent
+
+    async def mcp_lookup(city):
+        """Looks up a city."""
+        await asyncio.sleep(0)
+        return f"{city}: sunny"
+
+    with patch('src.agent.MemoryManager'):
+        agent = AsyncGeminiAgent()
+    agent.available_tools["mcp_lookup"] = mcp_lookup
+
+    assert asyncio.run(agent._run_tool_async("mcp_lookup", {"city": "Oslo"})) == "Oslo: sunny"
+    assert "Search results for: x" in asyncio.run(agent._run_tool_async("web_search", {"query": "x"}))
+    assert "not registered" in asyncio.run(agent._run_tool_async("missing", {}))
+
+def test_async_agent_keeps_memory_io_off_the_event_loop(tmp_path):
+    """Test that memory writes and the end-of-turn flush never run on the loop thread."""
+    import asyncio
+    import threading
+    from src.async_agent import AsyncGeminiAgent
+    from src.memory import MemoryManager, SessionStore
+
+    with patch('src.agent.MemoryManager'):
+        agent = AsyncGeminiAgent()
+    agent.sessions = SessionStore(memory_file=str(tmp_path / "memory.json"))
+    threads = []
+
+    def recording(method):
+        def wrapper(self, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    async def main():
+        loop_thread = threading.get_ident()
+        await agent.act_async("hi", session_id="user-1")
+        return loop_thread
+
+    with patch.object(MemoryManager, "add_entry", recording(MemoryManager.add_entry)), \
+            patch.object(MemoryManager, "flush", recording(MemoryManager.flush)), \
+            patch.object(MemoryManager, "archive", recording(MemoryManager.archive)):
+        loop_thread = asyncio.run(main())
+
+    assert len(threads) == 4  # user + assistant entries, archive and flush at turn end
+    assert loop_thread not in threads
+    agent.sessions.close()
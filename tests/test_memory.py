@@ -1,5 +1,33 @@
 import json
-from src.memory import MemoryManager
+import multiprocessing
+import sys
+import threading
+import time
+from src.config import settings
+from src.memory import JournalBackend, JsonFileBackend, MemoryManager, Message, SessionStore, SqliteBackend
+from src.memory import __main__ as memory_cli
+from src.memory.archive import SegmentArchive
+from src.memory.budget import (
+    DEFAULT_CONTEXT_TOKENS,
+    TokenBudgetAllocator,
+    estimate_tokens,
+    model_context_tokens,
+    truncate_to_tokens,
+)
+from src.memory.keyword_index import BM25Index, tokenize
+from src.memory.message import json_default
+from src.memory.migrate import iter_json_history, migrate
+from src.memory.recall import VectorIndex
+from src.memory.summary_tree import SummaryTree
+
+
+def _digest_backlog(manager, max_messages, summarizer=None):
+    """Builds windows until the summary covers everything before the verbatim tail."""
+    while True:
+        watermark = manager.summary_watermark
+        manager.get_context_window("SYS", max_messages=max_messages, summarizer=summarizer)
+        if manager.summary_watermark == watermark:
+            return
 
 
 def test_context_window_without_overflow(tmp_path):
@@ -48,3 +76,1192 @@ def test_loads_legacy_memory_format(tmp_path):
 
     assert manager.summary == ""
     assert manager.get_history() == legacy_payload
+
+
+def test_backend_inferred_from_extension(tmp_path):
+    assert isinstance(MemoryManager(memory_file=str(tmp_path / "m.json")).backend, JsonFileBackend)
+    assert isinstance(MemoryManager(memory_file=str(tmp_path / "m.jsonl")).backend, JournalBackend)
+
+
+def test_journal_appends_one_line_per_entry(tmp_path):
+    journal = tmp_path / "memory.jsonl"
+    manager = MemoryManager(memory_file=str(journal))
+
+    manager.add_entry("user", "Hello")
+    manager.add_entry("assistant", "Hi there")
+
+    lines = journal.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])["data"]["content"] == "Hi there"
+
+
+def test_journal_replays_entries_and_summary(tmp_path):
+    journal = tmp_path / "memory.jsonl"
+    manager = MemoryManager(memory_file=str(journal))
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+    manager.get_context_window("SYS", max_messages=2)
+
+    reloaded = MemoryManager(memory_file=str(journal))
+
+    assert reloaded.summary == manager.summary
+    assert [m["content"] for m in reloaded.get_history()] == [f"msg {i}" for i in range(4)]
+
+
+def test_journal_skips_torn_tail_record(tmp_path):
+    journal = tmp_path / "memory.jsonl"
+    manager = MemoryManager(memory_file=str(journal))
+    manager.add_entry("user", "kept")
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"op": "entry", "da')
+
+    reloaded = MemoryManager(memory_file=str(journal))
+
+    assert [m["content"] for m in reloaded.get_history()] == ["kept"]
+
+
+def test_journal_compacts_superseded_summaries(tmp_path):
+    journal = tmp_path / "memory.jsonl"
+    backend = JournalBackend(str(journal), compact_threshold=3)
+    manager = MemoryManager(memory_file=str(journal), backend=backend)
+    manager.add_entry("user", "hello")
+
+    for i in range(5):
+        backend.set_summary(f"summary {i}", 0)
+        backend.flush()
+
+    records = [json.loads(line) for line in journal.read_text(encoding="utf-8").splitlines()]
+    assert len(records) <= 4
+    reloaded = MemoryManager(memory_file=str(journal))
+    assert reloaded.summary == "summary 4"
+    assert [m["content"] for m in reloaded.get_history()] == ["hello"]
+
+
+def test_journal_clear_truncates_file(tmp_path):
+    journal = tmp_path / "memory.jsonl"
+    manager = MemoryManager(memory_file=str(journal))
+    manager.add_entry("user", "hello")
+
+    manager.clear_memory()
+
+    assert journal.read_text(encoding="utf-8") == ""
+    assert MemoryManager(memory_file=str(journal)).get_history() == []
+
+
+def test_sqlite_backend_persists_history_and_summary(tmp_path):
+    db_file = tmp_path / "memory.db"
+    manager = MemoryManager(memory_file=str(db_file))
+    assert isinstance(manager.backend, SqliteBackend)
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}", {"turn": i})
+    manager.get_context_window("SYS", max_messages=2)
+
+    reloaded = MemoryManager(memory_file=str(db_file))
+
+    assert reloaded.summary == manager.summary == "user: msg 0\nuser: msg 1"
+    last = reloaded.get_history()[3]
+    assert (last["role"], last["content"], last["metadata"]["turn"]) == ("user", "msg 3", 3)
+
+
+def test_sqlite_context_window_reads_only_recent_rows(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.db"))
+    for i in range(6):
+        manager.add_entry("user", f"msg {i}")
+    manager.backend.entries = None  # full-history reads would fail
+
+    window = manager.get_context_window("SYS", max_messages=10)
+
+    assert [m["content"] for m in window[1:]] == [f"msg {i}" for i in range(6)]
+
+
+def test_sqlite_sessions_are_isolated(tmp_path):
+    db_file = str(tmp_path / "memory.db")
+    alice = MemoryManager(memory_file=db_file, backend=SqliteBackend(db_file, session_id="alice"))
+    bob = MemoryManager(memory_file=db_file, backend=SqliteBackend(db_file, session_id="bob"))
+
+    alice.add_entry("user", "from alice")
+    bob.add_entry("user", "from bob")
+
+    assert [m["content"] for m in alice.get_history()] == ["from alice"]
+    assert [m["content"] for m in bob.get_history()] == ["from bob"]
+
+
+def test_summarizer_only_receives_newly_evicted_messages(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    calls = []
+
+    def summarizer(old_msgs, prev_summary):
+        calls.append([msg["content"] for msg in old_msgs])
+        return "|".join(filter(None, [prev_summary, *calls[-1]]))
+
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+    manager.get_context_window("SYS", max_messages=2, summarizer=summarizer)
+    manager.get_context_window("SYS", max_messages=2, summarizer=summarizer)
+    manager.add_entry("user", "msg 4")
+    manager.get_context_window("SYS", max_messages=2, summarizer=summarizer)
+
+    assert calls == [["msg 0", "msg 1"], ["msg 2"]]
+    assert manager.summary == "msg 0|msg 1|msg 2"
+    assert manager.summary_watermark == 3
+
+
+def test_summary_watermark_is_persisted(tmp_path):
+    for name in ("memory.json", "memory.jsonl", "memory.db"):
+        memory_file = str(tmp_path / name)
+        manager = MemoryManager(memory_file=memory_file)
+        for i in range(5):
+            manager.add_entry("user", f"msg {i}")
+        manager.get_context_window("SYS", max_messages=2)
+
+        reloaded = MemoryManager(memory_file=memory_file)
+
+        assert reloaded.summary_watermark == 3
+        assert reloaded.summary == manager.summary
+
+
+def test_context_window_cache_hits_for_unchanged_history(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+
+    first = manager.get_context_window("SYS", max_messages=2)
+    second = manager.get_context_window("SYS", max_messages=2)
+    manager.add_entry("user", "msg 4")
+    manager.get_context_window("SYS", max_messages=2)
+
+    assert first == second
+    stats = manager.cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["summarizer_calls"] == 2
+
+
+def test_context_window_cache_ignores_system_prompt(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+
+    think = manager.get_context_window("THINK", max_messages=2)
+    act = manager.get_context_window("ACT", max_messages=2)
+
+    assert act[0]["content"] == "ACT"
+    assert act[1:] == think[1:]
+    assert all(a is b for a, b in zip(act[1:], think[1:]))
+    assert manager.cache_stats()["hits"] == 1
+
+
+def test_turn_allows_a_single_summarizer_call(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+
+    with manager.turn():
+        manager.get_context_window("THINK", max_messages=2)
+        manager.get_context_window("ACT", max_messages=2)
+        manager.add_entry("assistant", "tool call")
+        manager.add_entry("tool", "observation")
+        window = manager.get_context_window("ACT", max_messages=2)
+
+    assert manager.cache_stats()["summarizer_calls"] == 1
+    # msg 2 and msg 3 were evicted mid-turn and are kept verbatim instead
+    assert [m["content"] for m in window[2:]] == ["msg 2", "msg 3", "tool call", "observation"]
+
+    manager.get_context_window("ACT", max_messages=2)
+    assert manager.summary_watermark == 4
+
+
+def test_summary_tree_merges_full_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MEMORY_SUMMARY_CHUNK_SIZE", 2)
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    calls = []
+
+    def summarizer(old_msgs, prev_summary):
+        calls.append(len(old_msgs))
+        return "+".join(filter(None, [prev_summary, *(msg["content"] for msg in old_msgs)]))
+
+    for i in range(9):
+        manager.add_entry("user", f"m{i}")
+    manager.get_context_window("SYS", max_messages=1, summarizer=summarizer)
+    # A build digests a single chunk, however long the backlog
+    assert calls == [2]
+    assert manager.summary_watermark == 2
+
+    _digest_backlog(manager, 1, summarizer)
+    # 4 leaves of 2 messages, merged into one level-2 root; m8 stays verbatim
+    assert [root.level for root in manager.summary_tree.roots] == [2]
+    assert manager.summary == "m0+m1+m2+m3+m4+m5+m6+m7"
+    assert manager.summary_watermark == 8
+    # Every call saw at most one chunk or one digest to merge
+    assert max(calls) == 2
+    assert manager.cache_stats()["summarizer_calls"] == len(calls) == 7
+
+    manager.add_entry("user", "m9")
+    calls.clear()
+    manager.get_context_window("SYS", max_messages=1, summarizer=summarizer)
+    assert calls == [1]
+    assert manager.summary == "m0+m1+m2+m3+m4+m5+m6+m7\nm8"
+
+
+def test_summary_digests_zoom_into_past_periods(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MEMORY_SUMMARY_CHUNK_SIZE", 2)
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    for i in range(9):
+        manager.add_entry("user", f"m{i}")
+    _digest_backlog(manager, 1)
+
+    assert [(node.start, node.stop) for node in manager.summary_digests()] == [(0, 8)]
+    assert [(node.start, node.stop) for node in manager.summary_digests(2, 8)] == [(2, 4), (4, 8)]
+    assert [node.text for node in manager.summary_digests(5, 6)] == ["user: m4\nuser: m5"]
+
+
+def test_summary_tree_survives_reload_and_seeds_legacy_summaries(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MEMORY_SUMMARY_CHUNK_SIZE", 2)
+    memory_file = str(tmp_path / "memory.json")
+    manager = MemoryManager(memory_file=memory_file)
+    for i in range(6):
+        manager.add_entry("user", f"m{i}")
+    _digest_backlog(manager, 1)
+    manager.close()
+
+    reloaded = MemoryManager(memory_file=memory_file)
+    assert [(root.start, root.stop) for root in reloaded.summary_tree.roots] == [(0, 4)]
+    assert reloaded.summary_tree.partial.stop == 5
+    assert reloaded.summary == manager.summary
+
+    # A summary without a matching tree becomes the seed of a new one
+    (tmp_path / f"memory.json{SummaryTree.sidecar_suffix}").unlink()
+    legacy = MemoryManager(memory_file=memory_file)
+    assert legacy.summary == manager.summary
+    assert [(node.start, node.stop) for node in legacy.summary_digests()] == [(0, 5)]
+    legacy.add_entry("user", "m6")
+    legacy.get_context_window("SYS", max_messages=1)
+    assert legacy.summary_watermark == 6
+    assert legacy.summary.startswith(manager.summary)
+
+
+def test_summary_tree_appends_sealed_nodes_once(tmp_path):
+    from src.memory.message import Message
+
+    head = tmp_path / f"memory.json{SummaryTree.sidecar_suffix}"
+    node_log = tmp_path / f"memory.json{SummaryTree.node_log_suffix}"
+
+    def summarizer(old_msgs, prev_summary):
+        return "+".join(filter(None, [prev_summary, *(msg["content"] for msg in old_msgs)]))
+
+    def extended(tree, start, stop):
+        return tree.extend([Message("user", f"m{i}") for i in range(start, stop)], summarizer)[0]
+
+    tree = extended(SummaryTree(2), 0, 64)
+    tree.save(str(head))
+    log_lines = node_log.read_text(encoding="utf-8").splitlines()
+    # Header plus 32 leaves and their 31 merges; the head only lists the root
+    assert len(log_lines) == 1 + 63
+    assert len(json.loads(head.read_text(encoding="utf-8"))["roots"]) == 1
+
+    # Later saves append only the nodes sealed since, also after a reload
+    reloaded = SummaryTree.load(str(head), 2)
+    assert reloaded.roots[0].children == ()
+    tree = extended(reloaded, 64, 69)
+    tree.save(str(head))
+    assert node_log.read_text(encoding="utf-8").splitlines()[:64] == log_lines
+    assert len(node_log.read_text(encoding="utf-8").splitlines()) == 64 + 3
+
+    # Zooming into a loaded tree reads the children from the log
+    reloaded = SummaryTree.load(str(head), 2)
+    assert reloaded.text == tree.text
+    assert [(node.start, node.stop, node.text) for node in reloaded.digests(6, 10)] == [
+        (6, 8, "m6+m7"), (8, 10, "m8+m9"),
+    ]
+
+    # A tree that shares nothing with the log starts a new one
+    SummaryTree(2).save(str(head))
+    assert len(node_log.read_text(encoding="utf-8").splitlines()) == 1
+    assert SummaryTree.load(str(head), 2).covered == 0
+
+    # Heads written by older versions, with every child inline, still load
+    inline = extended(SummaryTree(2), 0, 8).roots[0].to_dict()
+    head.write_text(json.dumps({"chunk_size": 2, "roots": [inline], "partial": None}), encoding="utf-8")
+    legacy = SummaryTree.load(str(head), 2)
+    assert [node.text for node in legacy.digests(6, 8)] == ["m6+m7"]
+
+
+def test_legacy_summary_without_watermark_is_not_redigested(tmp_path):
+    memory_file = tmp_path / "memory.json"
+    history = [{"role": "user", "content": f"msg {i}", "metadata": {}} for i in range(1000)]
+    with open(memory_file, "w", encoding="utf-8") as f:
+        json.dump({"summary": "Earlier: the user set up the project.", "history": history}, f)
+    manager = MemoryManager(memory_file=str(memory_file))
+    calls = []
+
+    def summarizer(old_msgs, prev_summary):
+        calls.append(len(old_msgs))
+        return prev_summary
+
+    window = manager.get_context_window("SYS", max_messages=10, summarizer=summarizer)
+
+    assert calls == []
+    assert manager.summary_watermark == 990
+    assert window[1]["content"] == "Previous Summary: Earlier: the user set up the project."
+    assert [m["content"] for m in window[2:]] == [f"msg {i}" for i in range(990, 1000)]
+    assert MemoryManager(memory_file=str(memory_file)).summary_watermark == 990
+
+
+def test_dedup_stores_repeated_bodies_once(tmp_path):
+    question = "Analyze the stock performance of GOOGL over the last quarter and compare it to peers."
+    answer = "GOOGL gained 12% over the quarter, ahead of MSFT (+8%) and META (+5%). " * 3
+    for name in ("memory.json", "memory.jsonl", "memory.db"):
+        memory_file = tmp_path / name
+        manager = MemoryManager(memory_file=str(memory_file), dedup=True)
+        for _ in range(5):
+            manager.add_entry("user", question)
+            manager.add_entry("assistant", answer)
+        manager.add_entry("user", "thanks")
+        manager.close()
+
+        with open(manager.backend.sidecar_path(".content.jsonl"), encoding="utf-8") as f:
+            assert len(f.readlines()) == 2
+
+        reloaded = MemoryManager(memory_file=str(memory_file), dedup=True)
+        history = reloaded.get_history()
+        assert [msg["content"] for msg in history] == [question, answer] * 5 + ["thanks"]
+        # Duplicates share one string in RAM
+        assert history[0]["content"] is history[2]["content"]
+        reloaded.close()
+
+
+def test_dedup_collapses_consecutive_repeats_in_window(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"), dedup=True)
+    for _ in range(3):
+        manager.add_entry("user", "retry the deploy")
+        manager.add_entry("assistant", "deploy failed: timeout")
+    manager.add_entry("tool", "ping")
+    manager.add_entry("tool", "ping")
+    manager.add_entry("user", "done?")
+
+    window = manager.get_context_window("SYS", max_messages=20)
+
+    assert [msg["content"] for msg in window[1:]] == [
+        "retry the deploy",
+        "deploy failed: timeout\n(this exchange was repeated 3 times)",
+        "ping\n(this message was repeated 2 times)",
+        "done?",
+    ]
+    # History itself is untouched
+    assert len(manager.get_history()) == 9
+
+
+def test_dedup_clear_memory_drops_bodies(tmp_path):
+    memory_file = tmp_path / "memory.jsonl"
+    manager = MemoryManager(memory_file=str(memory_file), dedup=True)
+    manager.add_entry("user", "x" * 100)
+    manager.clear_memory()
+    manager.add_entry("user", "y" * 100)
+    manager.close()
+
+    assert MemoryManager(memory_file=str(memory_file), dedup=True).get_history()[0]["content"] == "y" * 100
+    assert len((tmp_path / "memory.jsonl.content.jsonl").read_text(encoding="utf-8").splitlines()) == 1
+
+
+def test_large_entries_are_stored_as_blobs(tmp_path):
+    memory_file = tmp_path / "memory.jsonl"
+    manager = MemoryManager(memory_file=str(memory_file), blob_threshold=5_000)
+    observation = "jira output: " + "PROJ-1 status=open; " * 2_000
+    manager.add_entry("tool", observation)
+    manager.add_entry("tool", observation)
+    manager.add_entry("user", "short")
+    manager.close()
+
+    assert memory_file.stat().st_size < 5_000
+    reloaded = MemoryManager(memory_file=str(memory_file), blob_threshold=5_000)
+    entry = reloaded.get_history()[0]
+    assert entry["content"].startswith("jira output: PROJ-1")
+    assert len(entry["content"]) < MemoryManager.BLOB_PREVIEW_CHARS + 100
+    assert entry["metadata"]["blob_chars"] == len(observation)
+    assert reloaded.full_content(entry) == observation
+    assert reloaded.load_blob(entry["metadata"]["blob"]) == observation
+    assert reloaded.full_content(reloaded.get_history()[2]) == "short"
+
+    window = reloaded.get_context_window("SYS", max_messages=5)
+    assert window[1]["content"] == entry["content"]
+
+    # Identical payloads share one blob; clearing memory deletes them
+    blob_dir = tmp_path / "memory.jsonl.blobs"
+    assert len([path for path in blob_dir.rglob("*") if path.is_file()]) == 1
+    reloaded.clear_memory()
+    assert not blob_dir.exists()
+
+
+def test_blob_preview_never_exceeds_a_small_threshold(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.jsonl"), blob_threshold=200)
+    observation = "x" * 600
+    manager.add_entry("tool", observation)
+
+    entry = manager.get_history()[0]
+    assert entry["content"].startswith("x" * 200 + "\n[... 400 more characters")
+    assert len(entry["content"]) < len(observation)
+    assert manager.full_content(entry) == observation
+    manager.close()
+
+
+def test_migrate_streams_json_memory_to_other_backends(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MEMORY_ARCHIVE_SEGMENT_SIZE", 10)
+    source = tmp_path / "agent_memory.json"
+    manager = MemoryManager(memory_file=str(source), archive_horizon=15)
+    for i in range(40):
+        manager.add_entry("user" if i % 2 else "assistant", f"message {i} " + "x" * i, {"turn": i})
+    manager.get_context_window("SYS", max_messages=5)
+    manager.close()
+    expected = MemoryManager(memory_file=str(source), archive_horizon=15).get_history()
+
+    for backend, name in (("sqlite", "agent_memory.db"), ("jsonl", "agent_memory.jsonl")):
+        result = migrate(str(source), "json", str(tmp_path / name), backend, batch_size=7)
+        assert result.entries == 40
+
+        migrated = MemoryManager(memory_file=str(tmp_path / name))
+        assert migrated.get_history() == expected
+        assert migrated.summary_watermark == manager.summary_watermark == 32
+        assert migrated.summary == manager.summary
+
+
+def test_iter_json_history_reads_in_small_chunks(tmp_path):
+    path = tmp_path / "memory.json"
+    backend = JsonFileBackend(str(path))
+    backend.load()
+    for i in range(5):
+        backend.append({"role": "user", "content": f"ünïcode {i} \"quoted\"", "metadata": {"n": i * 1000}})
+    backend.set_summary("summary", 12345)
+    backend.save()
+
+    state = {}
+    entries = list(iter_json_history(str(path), state, chunk_size=3))
+
+    assert [entry["metadata"]["n"] for entry in entries] == [0, 1000, 2000, 3000, 4000]
+    assert entries[0]["content"] == 'ünïcode 0 "quoted"'
+    assert state["summary_watermark"] == 12345
+
+    path.write_text(json.dumps([{"role": "user", "content": "legacy"}]), encoding="utf-8")
+    assert [entry["content"] for entry in iter_json_history(str(path), {}, chunk_size=2)] == ["legacy"]
+
+
+def test_migrate_command_refuses_non_empty_destination(tmp_path, capsys):
+    source = tmp_path / "memory.json"
+    manager = MemoryManager(memory_file=str(source))
+    manager.add_entry("user", "hello")
+    argv = ["migrate", "--from", "json", "--to", "sqlite", "--source", str(source)]
+
+    assert memory_cli.main(argv) == 0
+    assert "Migrated 1 entries" in capsys.readouterr().out
+    assert memory_cli.main(argv) == 1
+    assert "already holds memory" in capsys.readouterr().out
+
+
+def test_count_tail_iter_range_and_since(monkeypatch, tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.jsonl"))
+    # Entries from before timestamps were recorded count as oldest
+    manager.backend.append({"role": "user", "content": "legacy"})
+    clock = iter([100.0, 101.0, 102.0, 103.0, 104.0])
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    for i in range(5):
+        manager.add_entry("user", f"msg {i}")
+
+    assert manager.count() == 6
+    assert [m["content"] for m in manager.tail(2)] == ["msg 3", "msg 4"]
+    assert [m["content"] for m in manager.iter_range(1, 4, page_size=2)] == ["msg 0", "msg 1", "msg 2"]
+    assert [m["content"] for m in manager.iter_range(4)] == ["msg 3", "msg 4"]
+    assert [m["content"] for m in manager.since(102.5)] == ["msg 3", "msg 4"]
+    assert [m["content"] for m in manager.since(102.0)] == ["msg 2", "msg 3", "msg 4"]
+    assert len(list(manager.since(0))) == 5
+    assert list(manager.since(200)) == []
+
+
+def test_fork_shares_history_and_commits_back(tmp_path):
+    memory_file = str(tmp_path / "memory.jsonl")
+    manager = MemoryManager(memory_file=memory_file)
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+
+    branch = manager.fork()
+    branch.add_entry("assistant", "try tool A")
+    branch.add_entry("tool", "A worked")
+
+    # The prefix is shared, not copied; the parent does not see branch entries
+    assert branch.get_history()[0] is manager.get_history()[0]
+    assert branch.count() == 6
+    assert manager.count() == 4
+    assert [m["content"] for m in branch.get_context_window("SYS", max_messages=2)[2:]] == ["try tool A", "A worked"]
+    assert branch.summary_watermark == 4
+    assert manager.summary_watermark == 0
+
+    assert branch.commit() == 2
+    # The parent was unchanged, so it adopts the branch's summary as well
+    assert manager.summary_watermark == 4
+    assert [m["content"] for m in MemoryManager(memory_file=memory_file).get_history()][-2:] == [
+        "try tool A",
+        "A worked",
+    ]
+    try:
+        branch.commit()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("A committed branch must not commit twice")
+
+
+def test_fork_commit_keeps_timestamps_increasing_for_since(monkeypatch, tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.jsonl"))
+    now = {"time": 100.0}
+    monkeypatch.setattr(time, "time", lambda: now["time"])
+    branch = manager.fork()
+    for i in range(5):
+        branch.add_entry("assistant", f"branch {i}")
+        now["time"] += 1
+    for i in range(5):
+        manager.add_entry("user", f"parent {i}")
+        now["time"] += 1
+    now["time"] = 50.0  # The wall clock stepped back before the commit
+    branch.commit()
+
+    stamps = [m["metadata"]["timestamp"] for m in manager.get_history()]
+    assert stamps == sorted(stamps)
+    committed = manager.get_history()[-1]["metadata"]
+    assert (committed["timestamp"], committed["branch_timestamp"]) == (109.0, 104.0)
+    for t in (100.5, 104.5, 108.5, 109.0):
+        expected = [m["content"] for m in manager.get_history() if m["metadata"]["timestamp"] >= t]
+        assert [m["content"] for m in manager.since(t)] == expected
+    assert [m["content"] for m in manager.since(109.0)] == ["parent 4"] + [f"branch {i}" for i in range(5)]
+
+
+def test_fork_discard_and_stale_branches(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    manager.add_entry("user", "task")
+
+    discarded = manager.fork()
+    discarded.add_entry("assistant", "path A")
+    kept = manager.fork()
+    kept.add_entry("assistant", "path B")
+    nested = kept.fork()
+    nested.add_entry("tool", "B output")
+    discarded.discard()
+    nested.commit()
+    manager.add_entry("user", "meanwhile")
+    kept.commit()
+
+    assert [m["content"] for m in manager.get_history()] == ["task", "meanwhile", "path B", "B output"]
+
+    stale = manager.fork()
+    try:
+        stale.clear_memory()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("A branch must not clear its parent's history")
+    manager.clear_memory()
+    try:
+        stale.commit()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Committing onto cleared memory must fail")
+
+
+def test_add_entry_caches_token_count_in_metadata(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    metadata = {"source": "cli"}
+
+    manager.add_entry("user", "x" * 40, metadata)
+
+    stored = dict(manager.get_history()[0]["metadata"])
+    assert isinstance(stored.pop("timestamp"), float)
+    assert stored == {"source": "cli", "tokens": 12}
+    assert metadata == {"source": "cli"}
+
+
+def test_context_window_packs_history_by_token_budget(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"))
+    manager.add_entry("user", "small 0")
+    manager.add_entry("tool", "y" * 400)
+    manager.add_entry("user", "small 1")
+    manager.add_entry("user", "small 2")
+
+    window = manager.get_context_window("SYS", max_messages=10, max_tokens=20)
+
+    assert [m["content"] for m in window[2:]] == ["small 1", "small 2"]
+    assert manager.summary_watermark == 2
+
+
+def test_budget_allocator_gives_headroom_to_history():
+    allocator = TokenBudgetAllocator(total_tokens=1000, output_reserve=0.0)
+
+    small = allocator.allocate(knowledge="k" * 40, tools="t" * 40)
+    huge = allocator.allocate(observation="o" * 40_000)
+
+    assert (small.knowledge, small.tools, small.history) == (10, 10, 980)
+    assert huge.observation == 250
+    assert huge.history == 750
+
+    # A section that may grow before the prompt is built gets its whole cap
+    growing = allocator.allocate(summary="s" * 40, growing=("summary",))
+    assert (growing.summary, growing.history) == (100, 900)
+    assert model_context_tokens("gemini-1.5-pro-002") == 2_097_152
+    assert model_context_tokens("unknown-model") == DEFAULT_CONTEXT_TOKENS
+
+
+def test_truncate_to_tokens_never_exceeds_the_budget():
+    text = "word " * 100
+
+    assert truncate_to_tokens(text, 200) == text
+    assert truncate_to_tokens(text, 4) == text[:16]
+    assert truncate_to_tokens(text, 0) == ""
+    cut = truncate_to_tokens(text, 20)
+    assert cut.startswith("word word") and cut.endswith("truncated to fit the context budget ...]")
+    for max_tokens in range(30):
+        assert estimate_tokens(truncate_to_tokens(text, max_tokens)) <= max_tokens
+
+
+def test_background_summary_serves_last_summary_until_ready(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"), background_summary=True)
+    release = threading.Event()
+
+    def slow_summarizer(old_msgs, prev_summary):
+        release.wait(timeout=5)
+        return "; ".join(msg["content"] for msg in old_msgs)
+
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+    # The worker only runs the summarizer; every backend read happens on the caller's thread
+    reader_threads = set()
+    backend_range = manager.backend.range
+
+    def recording_range(start, stop):
+        reader_threads.add(threading.current_thread().name)
+        return backend_range(start, stop)
+
+    manager.backend.range = recording_range
+
+    pending = manager.get_context_window("SYS", max_messages=2, summarizer=slow_summarizer)
+
+    assert manager.summary == ""
+    assert [m["content"] for m in pending[2:]] == ["msg 0", "msg 1", "msg 2", "msg 3"]
+
+    release.set()
+    manager.wait_for_summary(timeout=5)
+    ready = manager.get_context_window("SYS", max_messages=2, summarizer=slow_summarizer)
+
+    assert manager.summary == "msg 0; msg 1"
+    assert ready[1]["content"] == "Previous Summary: msg 0; msg 1"
+    assert [m["content"] for m in ready[2:]] == ["msg 2", "msg 3"]
+    assert MemoryManager(memory_file=str(tmp_path / "memory.json")).summary_watermark == 2
+    assert reader_threads == {threading.current_thread().name}
+    manager.close()
+
+
+def test_deferred_summary_caps_the_verbatim_tail(tmp_path):
+    from src.memory.budget import entry_tokens
+
+    memory_file = tmp_path / "memory.json"
+    history = [{"role": "user", "content": f"message number {i} " + "z" * 300, "metadata": {}} for i in range(5000)]
+    with open(memory_file, "w", encoding="utf-8") as f:
+        json.dump({"history": history}, f)
+    manager = MemoryManager(memory_file=str(memory_file), background_summary=True)
+    release = threading.Event()
+
+    def slow_summarizer(old_msgs, prev_summary):
+        release.wait(timeout=5)
+        return "digest"
+
+    window = manager.get_context_window("SYS", max_messages=10, summarizer=slow_summarizer, max_tokens=2000)
+    release.set()
+
+    assert len(window) <= 2 + 2 * 10
+    assert sum(entry_tokens(message) for message in window[2:]) <= 2000
+    assert window[-1]["content"].startswith("message number 4999 ")
+    manager.close()
+
+
+def test_background_summary_failure_keeps_previous_summary(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"), background_summary=True)
+
+    def failing_summarizer(old_msgs, prev_summary):
+        raise RuntimeError("model unavailable")
+
+    for i in range(3):
+        manager.add_entry("user", f"msg {i}")
+    manager.get_context_window("SYS", max_messages=1, summarizer=failing_summarizer)
+    manager.wait_for_summary(timeout=5)
+
+    assert manager.summary == ""
+    assert manager.summary_watermark == 0
+    manager.close()
+
+
+def test_write_behind_defers_writes_until_flush(tmp_path):
+    memory_file = tmp_path / "memory.json"
+    manager = MemoryManager(memory_file=str(memory_file), write_behind=True)
+
+    manager.add_entry("user", "Hello")
+    assert not memory_file.exists()
+
+    with manager.turn():
+        manager.add_entry("assistant", "Hi there")
+    assert len(MemoryManager(memory_file=str(memory_file)).get_history()) == 2
+
+    manager.add_entry("user", "Bye")
+    manager.close()
+    assert len(MemoryManager(memory_file=str(memory_file)).get_history()) == 3
+    assert not (tmp_path / "memory.json.tmp").exists()
+
+
+def test_write_behind_flusher_group_commits(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_FLUSH_INTERVAL", 0.01)
+    journal = tmp_path / "memory.jsonl"
+    manager = MemoryManager(memory_file=str(journal), write_behind=True)
+
+    for i in range(20):
+        manager.add_entry("user", f"msg {i}")
+    deadline = time.time() + 5
+    while time.time() < deadline and not journal.exists():
+        time.sleep(0.01)
+    manager.close()
+
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 20
+
+
+def test_session_store_evicts_least_recently_used(tmp_path):
+    store = SessionStore(memory_file=str(tmp_path / "memory.jsonl"), max_hot_sessions=2)
+
+    store.get("alice").add_entry("user", "from alice")
+    store.get("bob").add_entry("user", "from bob")
+    store.get("alice")
+    store.get("carol")
+
+    assert store.hot_sessions() == ["alice", "carol"]
+    assert [m["content"] for m in store.get("bob").get_history()] == ["from bob"]
+    assert store.hot_sessions() == ["carol", "bob"]
+    store.close()
+
+
+def test_session_store_never_closes_leased_sessions(tmp_path):
+    store = SessionStore(memory_file=str(tmp_path / "memory.db"), max_hot_sessions=1)
+
+    with store.lease("alice") as alice:
+        bob = store.get("bob")
+        assert store.hot_sessions() == ["alice", "bob"]
+        assert store.evict("alice") is False
+        alice.add_entry("user", "still open")
+        store.get("carol")
+        assert "bob" not in store.hot_sessions()
+        alice.add_entry("user", "still open")
+
+    assert store.hot_sessions() == ["carol"]
+    assert store.stats()["pinned"] == 0
+    assert bob is not store.get("bob")
+    assert len(store.get("alice").get_history()) == 2
+    try:
+        store.release("alice")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("An unpinned session must not be released")
+    store.close()
+
+
+def test_session_store_paths(tmp_path):
+    json_store = SessionStore(memory_file=str(tmp_path / "memory.json"))
+    sqlite_store = SessionStore(memory_file=str(tmp_path / "memory.db"))
+
+    assert json_store.session_path("user-1") == str(tmp_path / "memory.sessions" / "user-1.json")
+    assert json_store.session_path("a/b") != json_store.session_path("a_b")
+    assert sqlite_store.session_path("user-1") == str(tmp_path / "memory.db")
+
+    sqlite_store.get("user-1").add_entry("user", "hi")
+    sqlite_store.close()
+    reopened = SessionStore(memory_file=str(tmp_path / "memory.db"))
+    assert [m["content"] for m in reopened.get("user-1").get_history()] == ["hi"]
+    assert reopened.get("user-2").get_history() == []
+    reopened.close()
+
+
+def test_recall_injects_relevant_old_messages(tmp_path):
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"), recall=True)
+    manager.add_entry("user", "The staging database host is db-staging-07")
+    for i in range(6):
+        manager.add_entry("user", f"unrelated chatter {i}")
+
+    window = manager.get_context_window(
+        "SYS", max_messages=2, query="which database host is staging on?", recall_k=1
+    )
+
+    assert window[2]["role"] == "system"
+    assert window[2]["content"] == (
+        "Relevant earlier messages:\n- user: The staging database host is db-staging-07"
+    )
+    assert [m["content"] for m in window[3:]] == ["unrelated chatter 4", "unrelated chatter 5"]
+
+
+def test_recall_index_is_saved_and_extended_on_load(tmp_path):
+    memory_file = str(tmp_path / "memory.jsonl")
+    manager = MemoryManager(memory_file=memory_file, recall=True)
+    manager.add_entry("user", "deploy the billing service")
+    manager.close()
+
+    writer = MemoryManager(memory_file=memory_file)
+    writer.add_entry("user", "rotate the vault token")
+    reloaded = MemoryManager(memory_file=memory_file, recall=True)
+
+    assert (tmp_path / "memory.jsonl.vectors.npy").exists()
+    assert [pos for pos, _ in reloaded.recall("vault token", k=1)] == [1]
+    assert [pos for pos, _ in reloaded.recall("billing service", k=1)] == [0]
+
+
+def test_vector_index_search_respects_stop():
+    index = VectorIndex(initial_capacity=1)
+    for text in ["alpha beta", "gamma delta", "alpha gamma"]:
+        index.add(text)
+
+    assert [pos for pos, _ in index.search("alpha", k=5)] in ([0, 2], [2, 0])
+    assert [pos for pos, _ in index.search("alpha", k=5, stop=2)] == [0]
+    assert index.search("zeta", k=5) == []
+
+
+def test_vector_index_search_reads_only_the_rarest_query_features():
+    import numpy as np
+
+    index = VectorIndex()
+    for i in range(3_000):
+        index.add(f"user asked about the weather report number {i % 50}")
+    index.add("user asked about the weather report for PROJ-7 rollout")
+
+    query = "what did the user ask about the weather report for PROJ-7 rollout"
+    indices, _weights = index.encoder.encode_sparse(query)
+    assert len(indices) > VectorIndex.MAX_QUERY_FEATURES
+    assert index.search(query, k=1)[0][0] == 3_000
+
+    # The narrowed top-k is the exact top-k of a full scan
+    query_vector = index.encoder.encode("weather report 17")
+    scores = query_vector @ index._matrix[:, :2_500]
+    found = index.search("weather report 17", k=20, stop=2_500)
+    assert np.allclose([score for _, score in found], np.sort(scores)[::-1][:20])
+    assert all(np.isclose(scores[pos], score) for pos, score in found)
+
+
+def test_bm25_tokenizer_keeps_identifiers_and_parts():
+    assert tokenize("Deploy PROJ-123 to db-staging-07!") == [
+        "deploy", "proj-123", "proj", "123", "to", "db-staging-07", "db", "staging", "07",
+    ]
+
+
+def test_bm25_index_ranks_exact_identifiers():
+    index = BM25Index()
+    index.add("user: what is the status of PROJ-123")
+    index.add("assistant: PROJ-1234 is closed")
+    index.add("user: call get_context_window with a budget")
+
+    assert index.search("PROJ-123", k=1)[0][0] == 0
+    assert index.search("get_context_window", k=1)[0][0] == 2
+    assert index.search("PROJ-123", k=5, stop=0) == []
+
+
+def test_keyword_search_and_context_injection(tmp_path):
+    memory_file = str(tmp_path / "memory.json")
+    manager = MemoryManager(memory_file=memory_file, keyword_recall=True)
+    manager.add_entry("tool", "jira output: INFRA-42 rollback approved for api-eu-3")
+    for i in range(5):
+        manager.add_entry("user", f"unrelated chatter {i}")
+
+    assert [pos for pos, _ in manager.search("api-eu-3", k=1)] == [0]
+    window = manager.get_context_window("SYS", max_messages=2, query="status of INFRA-42?", recall_k=2)
+    assert "INFRA-42 rollback approved" in window[2]["content"]
+
+    manager.close()
+    reloaded = MemoryManager(memory_file=memory_file, keyword_recall=True)
+    assert [pos for pos, _ in reloaded.search("INFRA-42", k=1)] == [0]
+
+
+def test_context_window_counts_summary_and_recall_against_budget(tmp_path):
+    from src.memory.budget import entry_tokens
+
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"), keyword_recall=True)
+    manager.add_entry("tool", "jira output: INFRA-42 rollback approved " + "x" * 2000)
+    for i in range(40):
+        manager.add_entry("user", f"unrelated chatter {i} " + "y" * 100)
+
+    window = manager.get_context_window(
+        "SYS",
+        max_messages=40,
+        summarizer=lambda old, prev: "long summary " * 500,
+        max_tokens=1000,
+        query="status of INFRA-42?",
+        recall_k=2,
+        summary_tokens=50,
+    )
+
+    assert window[1]["content"].startswith("Previous Summary: ")
+    assert entry_tokens(window[1]) <= 60
+    assert "INFRA-42 rollback approved" in window[2]["content"]
+    # The recall block and the verbatim tail share max_tokens
+    assert sum(entry_tokens(message) for message in window[2:]) <= 1000
+
+
+def test_archive_moves_old_entries_to_compressed_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_ARCHIVE_SEGMENT_SIZE", 4)
+    memory_file = tmp_path / "memory.json"
+    manager = MemoryManager(memory_file=str(memory_file), archive_horizon=3)
+    with manager.turn():
+        for i in range(10):
+            manager.add_entry("user", f"message {i}")
+
+    hot = json.loads(memory_file.read_text())
+    assert hot["archived"] == 4
+    assert [m["content"] for m in hot["history"]] == [f"message {i}" for i in range(4, 10)]
+    assert sorted(p.name for p in (tmp_path / "memory.json.archive").iterdir()) == [
+        "manifest.json", "segment-000000000000.jsonl.gz",
+    ]
+
+    reloaded = MemoryManager(memory_file=str(memory_file), archive_horizon=3)
+    assert [m["content"] for m in reloaded.get_history()] == [f"message {i}" for i in range(10)]
+    window = reloaded.get_context_window("SYS", max_messages=2)
+    assert window[1]["content"].startswith("Previous Summary: user: message 0")
+    try:
+        reloaded.backend.drop_head(1)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Archived history must not be dropped")
+
+
+def test_archive_finishes_interrupted_archival_on_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_ARCHIVE_SEGMENT_SIZE", 2)
+    memory_file = str(tmp_path / "memory.jsonl")
+    manager = MemoryManager(memory_file=memory_file)
+    for i in range(5):
+        manager.add_entry("user", f"message {i}")
+    # Simulate a crash after the segment was written but before the hot file was trimmed
+    archive = SegmentArchive(f"{memory_file}.archive")
+    archive.append(manager.get_history()[:2])
+
+    reloaded = MemoryManager(memory_file=memory_file, archive_horizon=1)
+    assert reloaded.backend.hot.archived == 2
+    assert reloaded.backend.hot.count() == 3
+    assert [m["content"] for m in reloaded.get_history()] == [f"message {i}" for i in range(5)]
+
+
+def test_archive_with_sqlite_keeps_absolute_positions(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_ARCHIVE_SEGMENT_SIZE", 3)
+    memory_file = str(tmp_path / "memory.db")
+    manager = MemoryManager(memory_file=memory_file, archive_horizon=2, keyword_recall=True)
+    for i in range(8):
+        manager.add_entry("user", f"ticket OPS-{i} updated")
+    assert manager.archive() == 6
+    manager.add_entry("user", "ticket OPS-8 updated")
+    manager.close()
+
+    reloaded = MemoryManager(memory_file=memory_file, archive_horizon=2, keyword_recall=True)
+    assert reloaded.backend.count() == 9
+    assert reloaded.backend.range(5, 7)[1]["content"] == "ticket OPS-6 updated"
+    assert [(pos, m["content"]) for pos, m in reloaded.search("OPS-4", k=1)] == [(4, "ticket OPS-4 updated")]
+
+
+def test_segment_archive_reads_only_requested_blocks(tmp_path):
+    archive = SegmentArchive(str(tmp_path / "archive"), block_size=10)
+    archive.append([{"role": "user", "content": str(i), "metadata": {}} for i in range(25)])
+    archive.append([{"role": "user", "content": str(i), "metadata": {}} for i in range(25, 30)])
+
+    archive = SegmentArchive(str(tmp_path / "archive"))
+    archive.load()
+    assert archive.count() == 30
+    assert [m["content"] for m in archive.range(18, 27)] == [str(i) for i in range(18, 27)]
+    assert set(archive._blocks) == {
+        ("segment-000000000000.jsonl.gz", 1),
+        ("segment-000000000000.jsonl.gz", 2),
+        ("segment-000000000025.jsonl.gz", 0),
+    }
+
+
+def test_journal_tail_load_pages_older_entries_on_demand(tmp_path):
+    journal = str(tmp_path / "memory.jsonl")
+    writer = JournalBackend(journal, compact_threshold=50)
+    writer.load()
+    for i in range(300):
+        writer.append({"role": "user", "content": f"message {i}", "metadata": {}})
+        if i == 150:
+            writer.set_summary("first half", 100)
+        writer.flush()
+
+    backend = JournalBackend(journal, compact_threshold=50, tail_entries=10)
+    backend.load()
+
+    assert backend.count() == 300
+    assert len(backend._history) == 10
+    assert (backend.summary, backend.summary_watermark) == ("first half", 100)
+    assert [m["content"] for m in backend.tail(3)] == ["message 297", "message 298", "message 299"]
+    assert [m["content"] for m in backend.range(0, 2)] == ["message 0", "message 1"]
+    assert [m["content"] for m in backend.range(288, 292)] == [f"message {i}" for i in range(288, 292)]
+    assert [m["content"] for m in backend.iter_range(0, 300, page_size=64)] == [
+        f"message {i}" for i in range(300)
+    ]
+
+
+def test_journal_tail_load_only_reads_the_end_of_the_file(tmp_path, capsys):
+    journal = tmp_path / "memory.jsonl"
+    writer = JournalBackend(str(journal), compact_threshold=20)
+    writer.load()
+    for i in range(100):
+        writer.append({"role": "user", "content": f"message {i}", "metadata": {}})
+        writer.flush()
+    # Damage the head of the journal; a tail-first load must never look at it
+    journal.write_text("not json\n" + journal.read_text(encoding="utf-8").split("\n", 1)[1], encoding="utf-8")
+
+    backend = JournalBackend(str(journal), compact_threshold=20, tail_entries=5)
+    backend.load()
+
+    assert capsys.readouterr().out == ""
+    assert backend.count() == 100
+    assert backend.tail(1)[0]["content"] == "message 99"
+
+
+def test_journal_tail_load_with_archive_and_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_ARCHIVE_SEGMENT_SIZE", 10)
+    monkeypatch.setattr(settings, "MEMORY_LOAD_TAIL", 4)
+    memory_file = str(tmp_path / "memory.jsonl")
+    manager = MemoryManager(memory_file=memory_file, archive_horizon=5)
+    with manager.turn():
+        for i in range(27):
+            manager.add_entry("user", f"message {i}")
+
+    reloaded = MemoryManager(memory_file=memory_file, archive_horizon=5)
+    assert reloaded.backend.hot.archived == 20
+    assert reloaded.backend.hot._tail_start == 3
+    reloaded.backend.hot.compact()
+    reloaded.add_entry("user", "message 27")
+
+    again = MemoryManager(memory_file=memory_file, archive_horizon=5)
+    assert [m["content"] for m in again.get_history()] == [f"message {i}" for i in range(28)]
+
+
+def test_message_is_an_immutable_mapping_with_interned_roles():
+    message = Message("".join(["us", "er"]), "hello", {"turn": 1})
+
+    assert message.role is sys.intern("user")
+    assert message == {"role": "user", "content": "hello", "metadata": {"turn": 1}}
+    assert message.get("content") == "hello" and message.get("missing") is None
+    assert not hasattr(message, "__dict__")
+    try:
+        message.content = "changed"
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("Message must be immutable")
+    assert json.loads(json.dumps({"m": message}, default=json_default))["m"]["content"] == "hello"
+
+
+def test_context_window_shares_stored_messages(tmp_path):
+    memory_file = str(tmp_path / "memory.json")
+    manager = MemoryManager(memory_file=memory_file)
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+
+    window = manager.get_context_window("SYS", max_messages=2)
+
+    assert isinstance(window, tuple)
+    assert window[-1] is manager.get_history()[-1]
+    assert manager.get_context_window("SYS", max_messages=2) is window
+    reloaded = MemoryManager(memory_file=memory_file).get_history()
+    assert all(isinstance(m, Message) for m in reloaded)
+    assert reloaded[0] == {
+        "role": "user",
+        "content": "msg 0",
+        "metadata": {"tokens": 3, "timestamp": manager.get_history()[0]["metadata"]["timestamp"]},
+    }
+
+
+def test_shared_memory_merges_writes_from_other_processes(tmp_path):
+    for name in ("memory.json", "memory.jsonl", "memory.db"):
+        memory_file = str(tmp_path / name)
+        first = MemoryManager(memory_file=memory_file, shared=True)
+        second = MemoryManager(memory_file=memory_file, shared=True)
+
+        first.add_entry("user", "from first")
+        second.add_entry("user", "from second")
+        first.add_entry("assistant", "first again")
+
+        expected = ["from first", "from second", "first again"]
+        assert [m["content"] for m in second.get_history()] == expected, name
+        assert [m["content"] for m in first.get_context_window("SYS", max_messages=5)[1:]] == expected
+        first.close()
+        second.close()
+        assert [m["content"] for m in MemoryManager(memory_file=memory_file).get_history()] == expected
+
+
+def test_shared_memory_discards_summary_superseded_by_another_process(tmp_path):
+    memory_file = str(tmp_path / "memory.jsonl")
+    first = MemoryManager(memory_file=memory_file, shared=True)
+    second = MemoryManager(memory_file=memory_file, shared=True)
+    for i in range(4):
+        first.add_entry("user", f"msg {i}")
+
+    def slow_summarizer(old_msgs, prev_summary):
+        # The other worker summarizes while this call is in flight
+        second.get_context_window("SYS", max_messages=1, summarizer=lambda msgs, prev: "from second")
+        return "from first"
+
+    first.get_context_window("SYS", max_messages=2, summarizer=slow_summarizer)
+
+    assert (first.summary, first.summary_watermark) == ("from second", 3)
+    reloaded = MemoryManager(memory_file=memory_file)
+    assert (reloaded.summary, reloaded.summary_watermark) == ("from second", 3)
+
+
+def _append_from_worker(memory_file, worker):
+    manager = MemoryManager(memory_file=memory_file, shared=True)
+    for i in range(25):
+        manager.add_entry("user", f"worker {worker} message {i}")
+    manager.close()
+
+
+def test_shared_memory_saves_sidecars_under_the_file_lock(tmp_path, monkeypatch):
+    from contextlib import contextmanager
+
+    manager = MemoryManager(memory_file=str(tmp_path / "memory.json"), shared=True, keyword_recall=True)
+    for i in range(4):
+        manager.add_entry("user", f"msg {i}")
+    held = []
+    file_lock = manager.backend.lock
+
+    @contextmanager
+    def tracking_lock():
+        with file_lock():
+            held.append(True)
+            try:
+                yield
+            finally:
+                held.pop()
+
+    saved = []
+    monkeypatch.setattr(manager.backend, "lock", tracking_lock)
+    monkeypatch.setattr(SummaryTree, "save", lambda tree, path: saved.append(bool(held)))
+    monkeypatch.setattr(BM25Index, "save", lambda index, path: saved.append(bool(held)))
+    with manager.turn():
+        manager.get_context_window("SYS", max_messages=2)
+    manager.close()
+
+    assert saved == [True, True]
+
+
+def test_shared_journal_survives_concurrent_processes(tmp_path):
+    memory_file = str(tmp_path / "memory.jsonl")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append_from_worker, args=(memory_file, w)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    with open(memory_file, encoding="utf-8") as f:
+        seqs = [json.loads(line)["seq"] for line in f if '"op":"entry"' in line]
+    history = MemoryManager(memory_file=memory_file).get_history()
+    assert len(history) == 100
+    assert seqs == list(range(100))
+    for w in range(4):
+        mine = [m["content"] for m in history if m["content"].startswith(f"worker {w} ")]
+        assert mine == [f"worker {w} message {i}" for i in range(25)]